@@ -0,0 +1,274 @@
+"""
+Benchmarks of the hot paths: generating benign trajectories, reporting them, every attack scenario's faulty trajectory
+and rendering compare plots. Every benchmark records its median time per phase, its throughput and its peak memory,
+and every run is appended to a history file, against which the next run flags regressions.
+
+Run from the root of the repository:
+
+    python -m benchmarks.run [--quick] [--repeat 5] [--history benchmarks/history.jsonl] [--tolerance 0.2]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+import format
+from vehicle.attack import Attack, SCENARIOS
+from vehicle.vehicle import Vehicle
+
+# The perturbed values of the attack scenarios that take any.
+PERTURBED = {3: 15, 4: 50, 5: 100, 6: [50, 5, 500], 7: 50, 8: 5, 9: [50, 5]}
+
+# The seeds every benchmark cycles through, some of which make an attack scenario raise.
+SEEDS = range(8)
+
+
+def bench_trajectory(timestep, duration):
+    """
+    Return a benchmark of Vehicle.trajectory.
+
+    :param timestep: The timestep of the trajectories (float).
+    :param duration: The duration of the trajectories, in seconds (int).
+    :return: A function that times one pass over SEEDS (function).
+    """
+    vehicle = Vehicle(70, 4)
+
+    def run():
+        phases = {'trajectory': 0.0}
+        for seed in SEEDS:
+            start = time.perf_counter()
+            try:
+                vehicle.trajectory(1, timestep, duration, ["S,100,20", "RS,100,10,500"], seed=seed)
+            except Exception:
+                pass
+            phases['trajectory'] += time.perf_counter() - start
+        return phases, len(SEEDS)
+    return run
+
+
+def bench_report(timestep, duration):
+    """
+    Return a benchmark of Vehicle.report and Trajectory.to_frame.
+
+    :param timestep: The timestep of the trajectory (float).
+    :param duration: The duration of the trajectory, in seconds (int).
+    :return: A function that times reporting a trajectory 100 times (function).
+    """
+    vehicle = Vehicle(70, 4)
+    seed = next(seed for seed in SEEDS if succeeds(vehicle, timestep, duration, seed))
+
+    def run():
+        start = time.perf_counter()
+        for _ in range(100):
+            trajectory = vehicle.report()
+        reported = time.perf_counter()
+        for _ in range(100):
+            trajectory.to_frame()
+        return {'report': reported - start, 'to_frame': time.perf_counter() - reported}, 100
+    return run
+
+
+def bench_attack(scenario, timestep, duration, decision='random'):
+    """
+    Return a benchmark of an attack scenario, split into its benign and faulty trajectories.
+
+    :param scenario: The attack scenario (int).
+    :param timestep: The timestep of the trajectories (float).
+    :param duration: The duration of the trajectories, in seconds (int).
+    :param decision: How the attacks decide whether the CAV crashes and when, 'random' or 'physics' (str).
+    :return: A function that times one pass over SEEDS (function).
+    """
+    def run():
+        phases = {'benign': 0.0, 'faulty': 0.0}
+        for seed in SEEDS:
+            attack = Attack(70, 4, decision=decision)
+            start = time.perf_counter()
+            try:
+                # Attack.evaluate, timed phase by phase
+                attack.rng.seed(seed)
+                benign = attack.traj(1, timestep, duration, seed)
+                attack.benign_comms = list(attack.vehicle.comms)
+                generated = time.perf_counter()
+                phases['benign'] += generated - start
+                spec = SCENARIOS[scenario]
+                spec.run(attack, benign, 1, spec.check(PERTURBED.get(scenario)), timestep, duration, seed)
+                phases['faulty'] += time.perf_counter() - generated
+            except Exception:
+                phases['benign'] += time.perf_counter() - start
+        return phases, len(SEEDS)
+    return run
+
+
+def bench_render(timestep, duration):
+    """
+    Return a benchmark of rendering compare plots headlessly.
+
+    :param timestep: The timestep of the trajectories (float).
+    :param duration: The duration of the trajectories, in seconds (int).
+    :return: A function that times rendering 5 compare plots (function).
+    """
+    attack = Attack(70, 4)
+    for seed in SEEDS:
+        try:
+            faulty, benign = attack.evaluate(1, timestep, duration, seed, 3, PERTURBED[3])
+            break
+        except Exception:
+            attack = Attack(70, 4)
+    plot = format.ComparePlot()
+    comms = attack.benign_comms
+
+    def run():
+        phases = {'draw': 0.0, 'save': 0.0}
+        for _ in range(5):
+            start = time.perf_counter()
+            plot.draw(faulty, benign, comms)
+            drawn = time.perf_counter()
+            plot.save(io.BytesIO())
+            phases['draw'] += drawn - start
+            phases['save'] += time.perf_counter() - drawn
+        return phases, 5
+    return run
+
+
+def succeeds(vehicle, timestep, duration, seed):
+    """
+    Return whether the benign trajectory of a seed can be generated.
+
+    :param vehicle: The vehicle (Vehicle).
+    :param timestep: The timestep of the trajectory (float).
+    :param duration: The duration of the trajectory, in seconds (int).
+    :param seed: The seed of the trajectory (int).
+    :return: Whether the trajectory was generated (bool).
+    """
+    try:
+        vehicle.trajectory(1, timestep, duration, ["S,100,20", "RS,100,10,500"], seed=seed)
+        return True
+    except Exception:
+        return False
+
+
+def suite(quick=False):
+    """
+    Return the benchmarks of the suite.
+
+    :param quick: Whether to only run the short trajectories (bool).
+    :return: A list of (name, function returning the benchmark) tuples.
+    """
+    timesteps = (1, 0.1) if quick else (1, 0.1, 0.01)
+    durations = (500,) if quick else (500, 2000, 10000)
+    benchmarks = []
+    for timestep in timesteps:
+        for duration in durations:
+            benchmarks.append(('trajectory[tau=%g,T=%d]' % (timestep, duration),
+                               lambda tau=timestep, T=duration: bench_trajectory(tau, T)))
+    benchmarks.append(('report[tau=0.01,T=500]', lambda: bench_report(0.01, 500)))
+    for decision in ('random', 'physics'):
+        for scenario in range(10):
+            benchmarks.append(('attack[%s,scenario=%d,tau=0.1,T=500]' % (decision, scenario),
+                               lambda s=scenario, d=decision: bench_attack(s, 0.1, 500, d)))
+    benchmarks.append(('render[tau=0.01,T=500]', lambda: bench_render(0.01, 500)))
+    return benchmarks
+
+
+def measure(make, repeat):
+    """
+    Return the measures of a benchmark: the median time of every phase over repeat passes after a warm-up pass, the
+    throughput and the peak memory of a separate pass under tracemalloc, which would slow down the timed passes.
+
+    :param make: Return the benchmark (function).
+    :param repeat: The number of timed passes (int).
+    :return: The measures of the benchmark (dict).
+    """
+    run = make()
+    run()
+    passes = [run() for _ in range(repeat)]
+    phases = {phase: statistics.median(timed[phase] for timed, _ in passes) for phase in passes[0][0]}
+    seconds = statistics.median(sum(timed.values()) for timed, _ in passes)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': seconds, 'throughput': passes[0][1] / seconds, 'peak_mb': peak / (1 << 20), 'phases': phases}
+
+
+def environment():
+    """
+    Return what the results of a run depend on besides the code.
+
+    :return: The environment of the run (dict).
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+            'numpy': np.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def previous(history):
+    """
+    Return the last run of the history, if any.
+
+    :param history: The path of the history (str).
+    :return: The last run (dict) or None.
+    """
+    if not os.path.exists(history):
+        return None
+    last = None
+    with open(history) as f:
+        for line in f:
+            if line.strip():
+                last = json.loads(line)
+    return last
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark trajectory generation, attacks and rendering.")
+    parser.add_argument('--quick', action='store_true', help="only run the short trajectories")
+    parser.add_argument('--repeat', type=int, default=5, help="the number of timed passes of every benchmark")
+    parser.add_argument('--history', default=os.path.join(os.path.dirname(__file__), 'history.jsonl'),
+                        help="the file every run is appended to")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="the drop in throughput against the previous run that is a regression")
+    parser.add_argument('--filter', default='', help="only run the benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+
+    last = previous(args.history)
+    baseline = last['results'] if last else {}
+    results = {}
+    regressions = 0
+    print("%-45s %12s %10s %10s  %s" % ('benchmark', 'items/s', 'peak MB', 'change', 'phases (s)'))
+    for name, make in suite(args.quick):
+        if args.filter not in name:
+            continue
+        results[name] = result = measure(make, args.repeat)
+        change = ''
+        if name in baseline:
+            ratio = result['throughput'] / baseline[name]['throughput'] - 1
+            change = '%+.1f%%' % (100 * ratio)
+            if ratio < -args.tolerance:
+                change += ' !'
+                regressions += 1
+        phases = ' '.join('%s=%.4f' % item for item in result['phases'].items())
+        print("%-45s %12.2f %10.2f %10s  %s" % (name, result['throughput'], result['peak_mb'], change, phases))
+
+    with open(args.history, 'a') as f:
+        f.write(json.dumps(dict(environment(), results=results)) + '\n')
+    if regressions:
+        print("%d regression(s) against %s." % (regressions, last.get('commit')))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,5 +1,14 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from vehicle.lod import Pyramid, decimate
 
 
 class MathTextSciFormatter(mticker.Formatter):
@@ -29,64 +38,193 @@ class MathTextSciFormatter(mticker.Formatter):
 
 def plot_trajectory_1D(dataframe):
     """
-    Displays and visualizes the trajectory of the CAV given a Pandas DataFrame.
+    Displays and visualizes the trajectory of the CAV given a Trajectory, a Pyramid or a Pandas DataFrame. Long
+    trajectories are down-sampled to the width of the plots first.
 
     :param dataframe:
     """
-    # Acceleration
-    dataframe.plot(kind='line', x='time', y='acceleration', color='green')
-    plt.gca().yaxis.set_major_formatter(MathTextSciFormatter("%1.2e"))
-    plt.gca().xaxis.set_major_locator(mticker.MaxNLocator(integer=True))
-    plt.xlabel("Time (s)", size=15)
-    plt.ylabel("Acceleration (m/s^2)", size=15)
-    plt.title("Acceleration of CAV", size=20)
-
-    plt.show()
+    for column, label in (('acceleration', "Acceleration (m/s^2)"), ('position', "Position (x-coordinate)"),
+                          ('velocity', "Velocity (m/s)")):
+        fig, axes = plt.subplots()
+        draw_line(axes, dataframe, column, color='green', label=column)
+        axes.yaxis.set_major_formatter(MathTextSciFormatter("%1.2e"))
+        axes.xaxis.set_major_locator(mticker.MaxNLocator(integer=True))
+        axes.set_xlabel("Time (s)", size=15)
+        axes.set_ylabel(label, size=15)
+        axes.set_title("%s of CAV" % column.capitalize(), size=20)
+        axes.legend()
+
+        plt.show()
+        plt.close(fig)
+
+
+def draw_line(axes, trajectory, column, **kwargs):
+    """
+    Draws a column of a trajectory against time on axes, down-sampled to one envelope per pixel of the width of axes.
 
-    # Position
-    dataframe.plot(kind='line', x='time', y='position', color='green')
-    plt.gca().yaxis.set_major_formatter(MathTextSciFormatter("%1.2e"))
-    plt.gca().xaxis.set_major_locator(mticker.MaxNLocator(integer=True))
-    plt.xlabel("Time (s)", size=15)
-    plt.ylabel("Position (x-coordinate)", size=15)
-    plt.title("Position of CAV", size=20)
+    :param axes: The axes to draw on (matplotlib.axes.Axes).
+    :param trajectory: The trajectory (Trajectory, Pyramid or pandas DataFrame).
+    :param column: The name of the column (str).
+    :param kwargs: The keyword arguments of the line (dict).
+    """
+    n_bins = int(np.ceil(axes.bbox.width))
+    if isinstance(trajectory, Pyramid):
+        t, y = trajectory.query(column, n_bins)
+    else:
+        t, y = decimate(trajectory, column, n_bins)
+    axes.plot(t, y, **kwargs)
 
-    plt.show()
 
-    # Velocity
-    dataframe.plot(kind='line', x='time', y='velocity', color='green')
-    plt.gca().yaxis.set_major_formatter(MathTextSciFormatter("%1.2e"))
-    plt.gca().xaxis.set_major_locator(mticker.MaxNLocator(integer=True))
-    plt.xlabel("Time (s)", size=15)
-    plt.ylabel("Velocity (m/s)", size=15)
-    plt.title("Velocity of CAV", size=20)
+def plot_trajectory_compare(faulty, benign, comms=None, path="scenario.png"):
+    """
+    Displays and visualizes the trajectory of the CAV given a Trajectory, a Pyramid or a Pandas DataFrame, and saves
+    the figure.
 
+    :param faulty: Faulty trajectory of the CAV.
+    :param benign: Benign trajectory of the CAV.
+    :param comms: The V2I comms read during the benign trajectory, as in Vehicle.comms, to shade (list).
+    :param path: The path the figure is saved to, if any (str).
+    """
+    fig, axes = plt.subplots(figsize=(12.0, 6.0))
+    draw_compare(axes, faulty, benign, comms)
+    # Saving after plt.show() would save an empty figure once the window is closed.
+    if path is not None:
+        fig.savefig(path)
     plt.show()
+    plt.close(fig)
 
 
-def plot_trajectory_compare(faulty, benign):
+def draw_compare(axes, faulty, benign, comms=None):
     """
-    Displays and visualizes the trajectory of the CAV given a Pandas DataFrame.
+    Draws the velocity of the faulty and benign trajectories of the CAV on axes, shading the V2I comms.
 
+    :param axes: The axes to draw on (matplotlib.axes.Axes).
     :param faulty: Faulty trajectory of the CAV.
     :param benign: Benign trajectory of the CAV.
+    :param comms: The V2I comms read during the benign trajectory, as in Vehicle.comms, to shade (list).
     """
-
     # Velocity
-    fig, axes = plt.subplots(figsize=(12.0, 6.0))
+    draw_line(axes, benign, 'velocity', color='green', label='Ground Truth')
+    draw_line(axes, faulty, 'velocity', color='red', label='Faulty')
+    axes.yaxis.set_major_formatter(MathTextSciFormatter("%1.2e"))
+    axes.xaxis.set_major_locator(mticker.MaxNLocator(integer=True))
+    axes.set_xlabel("Time (s)", size=15)
+    axes.set_ylabel("Velocity (m/s)", size=15)
+    axes.set_title("Velocity of CAV", size=20)
+    shade_comms(axes, np.asarray(benign['time']), comms)
+    axes.legend()
+
+
+def shade_comms(axes, time, comms):
+    """
+    Shades the window of every V2I comm: from when it is passed in up until v = 0 or v = rs (the distance to the WZ),
+    then up until it is done executing.
 
-    benign.plot(ax=axes, kind='line', x='time', y='velocity', color='green', label='Ground Truth')
-    plt.gca().yaxis.set_major_formatter(MathTextSciFormatter("%1.2e"))
-    plt.gca().xaxis.set_major_locator(mticker.MaxNLocator(integer=True))
-    plt.xlabel("Time (s)", size=15)
-    plt.ylabel("Velocity (m/s)", size=15)
-    plt.title("Velocity of CAV", size=20)
-
-    faulty.plot(ax=axes, kind='line', x='time', y='velocity', color='red', label='Faulty')
-    plt.gca().yaxis.set_major_formatter(MathTextSciFormatter("%1.2e"))
-    plt.gca().xaxis.set_major_locator(mticker.MaxNLocator(integer=True))
-    axes.axvspan(255, 256, alpha=0.2, color='b', label='V2I Communication (S)')
-    axes.axvspan(256, 265, alpha=0.2, color='y', label='Distance to WZ')
-    plt.legend()
-    plt.show()
-    plt.savefig("scenario.png")
+    :param axes: The axes to shade (matplotlib.axes.Axes).
+    :param time: The time at each time step, in seconds (np.ndarray).
+    :param comms: The V2I comms and their windows, as in Vehicle.comms (list).
+    """
+    last = len(time) - 1
+    labels = set()
+    for comm, (start, end, i_at_target) in comms or ():
+        for first, stop, color, label in ((start, i_at_target, 'y', 'Distance to WZ'),
+                                          (i_at_target, end, 'b', 'V2I Communication (%s)' % comm.kind)):
+            axes.axvspan(time[min(first, last)], time[min(stop, last)], alpha=0.2, color=color,
+                         label=None if label in labels else label)
+            labels.add(label)
+
+
+class ComparePlot:
+    """
+    A headless compare plot rendered with the Agg backend, without pyplot, so that no GUI window is opened and no
+    figure is left behind. The figure and its axes are created once and redrawn for every pair of trajectories.
+    """
+
+    def __init__(self, figsize=(12.0, 6.0), dpi=100):
+        """
+        The constructor for the compare plot.
+
+        :param figsize: The size of the figure, in inches (tuple).
+        :param dpi: The resolution of the figure, in dots per inch (int).
+        """
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
+
+    def draw(self, faulty, benign, comms=None):
+        """
+        Redraws the plot with the given trajectories.
+
+        :param faulty: Faulty trajectory of the CAV.
+        :param benign: Benign trajectory of the CAV.
+        :param comms: The V2I comms read during the benign trajectory, as in Vehicle.comms, to shade (list).
+        """
+        self.axes.clear()
+        draw_compare(self.axes, faulty, benign, comms)
+
+    def save(self, path):
+        """
+        Saves the plot.
+
+        :param path: The path of the image, whose extension sets its format (str).
+        """
+        self.figure.savefig(path)
+
+
+def render_runs(runs, directory, fmt='png'):
+    """
+    Renders the compare plot of every run to directory with a single ComparePlot.
+
+    :param runs: (name, faulty, benign, comms) tuples (list).
+    :param directory: The directory to render to (str).
+    :param fmt: The format of the images (str).
+    :return: The paths of the images (list).
+    """
+    plot = ComparePlot()
+    paths = []
+    for name, faulty, benign, comms in runs:
+        plot.draw(faulty, benign, comms)
+        paths.append(os.path.join(directory, '%s.%s' % (name, fmt)))
+        plot.save(paths[-1])
+    return paths
+
+
+def render_batch(runs, directory, max_workers=None, chunksize=16, max_pending=None, fmt='png'):
+    """
+    Renders the compare plots of many runs to directory headlessly, over a pool of processes. Runs are submitted in
+    chunks of chunksize and at most max_pending chunks are in flight at once, so runs may be a lazy iterable of any
+    size. Every worker reuses one figure for its whole chunk.
+
+    :param runs: (name, faulty, benign, comms) tuples, where comms are the V2I comms read during the benign trajectory,
+                 as in Vehicle.comms, or None (iterable).
+    :param directory: The directory to render to, created if missing (str).
+    :param max_workers: The number of worker processes, defaults to the number of CPUs (int).
+    :param chunksize: The number of runs rendered by a worker at once (int).
+    :param max_pending: The number of chunks in flight, defaults to twice the number of workers (int).
+    :param fmt: The format of the images (str).
+    :return: The paths of the images, in the order of the runs (list).
+    """
+    os.makedirs(directory, exist_ok=True)
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    runs = iter(runs)
+    chunks = {}
+    pending = set()
+    exhausted = False
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                chunk = list(itertools.islice(runs, chunksize))
+                if chunk:
+                    future = pool.submit(render_runs, chunk, directory, fmt)
+                    chunks[future] = len(chunks)
+                    pending.add(future)
+                else:
+                    exhausted = True
+
+            if not pending:
+                break
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    return [path for future in sorted(chunks, key=chunks.get) for path in future.result()]
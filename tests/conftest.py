@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import the packages of the repository from its root, whichever way pytest is run.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+"""
+Tests of the adaptive-step trips: without a comm to execute, an adaptive trip takes the decisions of the trip
+Vehicle.trajectory generates with the same arguments and stays within the rounding of float32 of it.
+"""
+import numpy as np
+import pytest
+
+from vehicle import adaptive
+from vehicle.message import RS
+from vehicle.vehicle import Vehicle
+
+V_MAX, A_MAX, V_INIT = 70, 4, 1
+SEEDS = range(40)
+# The duration of the trips of each timestep.
+DURATIONS = {1: 500, 0.1: 200, 0.01: 60}
+
+
+@pytest.mark.parametrize('timestep', sorted(DURATIONS))
+@pytest.mark.parametrize('comms', [[], [None, None]], ids=['no comm', 'ignored comms'])
+def test_trip_without_comms_matches_trajectory(timestep, comms):
+    duration = DURATIONS[timestep]
+    reference, vehicle = Vehicle(V_MAX, A_MAX), Vehicle(V_MAX, A_MAX)
+    for seed in SEEDS:
+        try:
+            reference.trajectory(V_INIT, timestep, duration, comms, seed=seed)
+        except TypeError:
+            with pytest.raises(TypeError):
+                adaptive.trajectory(vehicle, V_INIT, timestep, duration, comms, seed=seed)
+            continue
+        knots, read = adaptive.trajectory(vehicle, V_INIT, timestep, duration, comms, seed=seed)
+        assert read == []
+        # The same decisions draw the same random numbers.
+        assert vehicle.rng.getstate() == reference.rng.getstate()
+        assert vehicle.prev_action == reference.prev_action
+
+        trip, expected = adaptive.resample(knots, timestep), reference.cache
+        ran_t_start, ran_t_end = reference.trip['ran_t_start'], reference.trip['ran_t_end']
+        decisions = slice(ran_t_start, ran_t_end, 20)
+        assert np.array_equal(trip.a[decisions], expected['a'][decisions])
+        assert np.allclose(trip.v, expected['v'], rtol=1e-3, atol=1e-2)
+        # Stopped while decelerating, the CAV of Vehicle.trajectory still moves by 0.5 * a * tau ** 2 every timestep,
+        # where the exact one stands still.
+        stopped = np.flatnonzero((expected['v'] == 0) & (expected['a'] < 0))
+        n = stopped[0] if stopped.size else len(trip.x)
+        assert np.allclose(trip.x[:n], expected['x'][:n], rtol=1e-4, atol=0.5)
+
+
+def test_stopped_at_an_rswz_raises_as_trajectory():
+    comms = [RS(50, 0, 100)]
+    reference, vehicle = Vehicle(V_MAX, A_MAX), Vehicle(V_MAX, A_MAX)
+    raised = 0
+    for seed in range(10):
+        try:
+            reference.trajectory(V_INIT, 0.1, 200, comms, seed=seed)
+        except TypeError:
+            continue
+        except IndexError:
+            with pytest.raises(IndexError):
+                adaptive.trajectory(vehicle, V_INIT, 0.1, 200, comms, seed=seed)
+            raised += 1
+    assert raised > 0
+
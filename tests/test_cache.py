@@ -0,0 +1,94 @@
+"""
+Tests of the trajectory cache on disk: a hit restores the vehicle as if it had just generated the trajectory, and the
+size of the cache stays that of its entries as entries are saved, saved again and evicted.
+"""
+import os
+
+import numpy as np
+
+from vehicle.cache import TrajectoryCache
+from vehicle.message import RS, S
+from vehicle.stats import Stats
+from vehicle.vehicle import Vehicle
+
+V_MAX, A_MAX = 70, 4
+V_INIT, TIMESTEP, DURATION = 1, 0.1, 200
+COMMS = [S(100, 20), RS(100, 10, 500)]
+
+
+def drive(vehicle):
+    """
+    Generate the trip of the first seed whose trip can be generated and that reads a V2I comm, and return that seed.
+    """
+    for seed in range(100):
+        try:
+            vehicle.trajectory(V_INIT, TIMESTEP, DURATION, COMMS, seed=seed)
+        except (TypeError, IndexError):
+            continue
+        if vehicle.comms:
+            return seed
+    raise AssertionError("No seed reads a V2I comm.")
+
+
+def test_load_restores_the_trip(tmp_path):
+    cache = TrajectoryCache(str(tmp_path))
+    generated = Vehicle(V_MAX, A_MAX, disk_cache=cache)
+    seed = drive(generated)
+
+    stats = Stats()
+    restored = Vehicle(V_MAX, A_MAX, disk_cache=cache, stats=stats)
+    restored.trajectory(V_INIT, TIMESTEP, DURATION, COMMS, seed=seed)
+    assert stats.cached == 1
+    for col in ('t', 'x', 'v', 'a'):
+        assert np.array_equal(generated.cache[col].view(np.uint8), restored.cache[col].view(np.uint8))
+    assert restored.comms == generated.comms
+    assert restored.ids == generated.ids
+    assert restored.windows == generated.windows
+    assert restored.trip == generated.trip
+    assert restored.checkpoints == generated.checkpoints
+    assert restored.rng.getstate() == generated.rng.getstate()
+
+    # A restored trip is retraced as the generated one.
+    k = min(generated.windows)
+    tampered = list(COMMS)
+    tampered[k] = None
+    for vehicle in (generated, restored):
+        vehicle.retrace(k, tampered)
+    for col in ('t', 'x', 'v', 'a'):
+        assert np.array_equal(generated.cache[col].view(np.uint8), restored.cache[col].view(np.uint8))
+
+
+def test_size_counts_an_entry_saved_again_once(tmp_path):
+    cache = TrajectoryCache(str(tmp_path))
+    vehicle = Vehicle(V_MAX, A_MAX)
+    drive(vehicle)
+    for key in ('a', 'b', 'a', 'a', 'b'):
+        cache.save(vehicle, key)
+    assert cache.size == sum(size for _, _, size in cache.entries())
+    assert TrajectoryCache(str(tmp_path)).size == cache.size
+
+
+def test_eviction_drops_the_least_recently_used_entries(tmp_path):
+    vehicle = Vehicle(V_MAX, A_MAX)
+    drive(vehicle)
+    cache = TrajectoryCache(str(tmp_path))
+    cache.save(vehicle, 'probe')
+    size = cache.size
+    os.remove(cache.path('probe'))
+
+    # Every entry holds the same trip, so the cache holds three of them.
+    cache = TrajectoryCache(str(tmp_path), max_bytes=3 * size)
+    for used, key in enumerate(('a', 'b', 'c')):
+        cache.save(vehicle, key)
+        os.utime(cache.path(key), (1000 * (used + 1), 1000 * (used + 1)))
+
+    # Saving an entry again does not grow the cache, so nothing is evicted.
+    for _ in range(5):
+        cache.save(vehicle, 'c')
+    assert sorted(os.listdir(str(tmp_path))) == ['a.npz', 'b.npz', 'c.npz']
+
+    # Loading an entry uses it, so the least recently used one is now b.
+    assert cache.load(Vehicle(V_MAX, A_MAX), 'a')
+    cache.save(vehicle, 'd')
+    assert sorted(os.listdir(str(tmp_path))) == ['a.npz', 'c.npz', 'd.npz']
+    assert cache.size == sum(size for _, _, size in cache.entries()) <= cache.max_bytes
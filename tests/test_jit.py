@@ -0,0 +1,109 @@
+"""
+Equivalence tests of the JIT backend: the kernel of vehicle.jit gives the same trips as the numpy backend, both as plain
+Python, which runs everywhere, and compiled, which needs numba.
+"""
+import numpy as np
+import pytest
+
+from vehicle import jit
+from vehicle.message import RS, S
+from vehicle.vehicle import Vehicle
+
+V_MAX, A_MAX, V_INIT = 70, 4, 1
+COMMS = [S(100, 5), RS(100, 10, 100), S(50, 2)]
+SEEDS = range(30)
+# The duration of the trips of each timestep, long enough for the comms to be read.
+DURATIONS = {1: 500, 0.1: 200, 0.01: 60}
+
+# The kernel as plain Python, whether or not numba compiled it.
+PY_STEPS = getattr(jit.integrate_steps, 'py_func', jit.integrate_steps)
+
+
+def integrate_py(x, v, a, start, stop, tau, clamp=False):
+    """
+    jit.integrate with the kernel run as plain Python.
+    """
+    PY_STEPS(x, v, a, start, stop, np.float32(tau), np.float32(tau ** 2), clamp)
+
+
+def drive(vehicle, timestep, seed):
+    """
+    Return the trip of a CAV, or the type of the exception if the trip cannot be generated.
+    """
+    try:
+        vehicle.trajectory(V_INIT, timestep, DURATIONS[timestep], COMMS, seed=seed)
+    except (TypeError, IndexError) as e:
+        return type(e)
+    return dict(vehicle.cache), list(vehicle.comms), dict(vehicle.windows)
+
+
+def assert_same_trips(expected, actual):
+    assert type(expected) == type(actual)
+    if not isinstance(expected, tuple):
+        assert expected == actual
+        return
+    (cache, comms, windows), (other_cache, other_comms, other_windows) = expected, actual
+    for col in ('t', 'x', 'v', 'a'):
+        assert cache[col].dtype == other_cache[col].dtype
+        assert np.array_equal(cache[col].view(np.uint8), other_cache[col].view(np.uint8))
+    assert comms == other_comms
+    assert windows == other_windows
+
+
+def kernel(backend, overlap):
+    """
+    Return a CAV whose trips are integrated by the kernel, as plain Python or compiled.
+    """
+    if backend == 'python':
+        vehicle = Vehicle(V_MAX, A_MAX, overlap=overlap)
+        vehicle.integrate = integrate_py
+        return vehicle
+    if jit.numba is None:
+        pytest.skip("numba is not installed")
+    return Vehicle(V_MAX, A_MAX, backend='numba', overlap=overlap)
+
+
+@pytest.mark.parametrize('backend', ['python', 'numba'])
+@pytest.mark.parametrize('overlap', ['drop', 'queue'])
+@pytest.mark.parametrize('timestep', sorted(DURATIONS))
+def test_kernel_matches_numpy(backend, overlap, timestep):
+    vehicle = kernel(backend, overlap)
+    reference = Vehicle(V_MAX, A_MAX, overlap=overlap)
+    read = 0
+    for seed in SEEDS:
+        expected = drive(reference, timestep, seed)
+        assert_same_trips(expected, drive(vehicle, timestep, seed))
+        if isinstance(expected, tuple):
+            read += len(expected[1])
+    # The trips must exercise the comms, not only the random trajectory phase.
+    assert read > 0
+
+
+@pytest.mark.parametrize('backend', ['python', 'numba'])
+def test_kernel_matches_numpy_on_retrace(backend):
+    vehicle = kernel(backend, 'drop')
+    reference = Vehicle(V_MAX, A_MAX)
+    tampered = [S(20, 5), RS(300, 3, 100), None]
+    for seed in SEEDS:
+        trips = []
+        for cav in (reference, vehicle):
+            if not isinstance(drive(cav, 0.1, seed), tuple):
+                trips.append(None)
+                continue
+            snapshot = cav.snapshot()
+            retraced = []
+            for k, comm in enumerate(tampered):
+                cav.restore(snapshot)
+                comms = list(COMMS)
+                comms[k] = comm
+                try:
+                    cav.retrace(k, comms)
+                    retraced.append((dict(cav.cache), list(cav.comms), dict(cav.windows)))
+                except IndexError as e:
+                    retraced.append(type(e))
+            trips.append(retraced)
+        if trips[0] is None:
+            assert trips[1] is None
+            continue
+        for expected, actual in zip(*trips):
+            assert_same_trips(expected, actual)
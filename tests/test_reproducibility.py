@@ -0,0 +1,167 @@
+"""
+Regression tests of reproducibility: every trajectory depends on its seed alone, so generating trajectories in batches,
+threads or processes gives bit-identical results to generating them one at a time.
+
+Run from the root of the repository:
+
+    python -m pytest tests
+"""
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from vehicle.attack import Attack
+from vehicle.campaign import campaign, grid
+from vehicle.message import RS, S
+from vehicle.vehicle import FLEET_MIN, Vehicle
+
+V_MAX, A_MAX = 70, 4
+V_INIT, TIMESTEP, DURATION = 1, 0.1, 200
+COMMS = [S(100, 20), RS(100, 10, 500)]
+SEEDS = range(60)
+
+# The perturbed values of the attack scenarios that take any.
+PERTURBED = {3: [15], 4: [50], 5: [100], 6: [(50, 5, 500)], 7: [50], 8: [5], 9: [(50, 5)]}
+
+
+def drive(seed):
+    """
+    Return the trip of a new CAV with the given seed.
+
+    :param seed: The seed of the trip (int).
+    :return: Tuple containing the arrays of the trip (dict) and the comms the CAV read (list), or (None, None) if the
+             trip cannot be generated.
+    """
+    vehicle = Vehicle(V_MAX, A_MAX)
+    try:
+        vehicle.trajectory(V_INIT, TIMESTEP, DURATION, COMMS, seed=seed)
+    except (TypeError, IndexError):
+        return None, None
+    return vehicle.cache, vehicle.comms
+
+
+def assert_identical(expected, actual):
+    """
+    Assert that two arrays hold the same bits.
+    """
+    assert expected.dtype == actual.dtype
+    assert np.array_equal(expected.view(np.uint8), actual.view(np.uint8))
+
+
+def assert_same_trips(expected, actual):
+    """
+    Assert that two lists of trips, as returned by drive, are bit-identical.
+    """
+    assert len(expected) == len(actual)
+    for (cache, comms), (other_cache, other_comms) in zip(expected, actual):
+        assert (cache is None) == (other_cache is None)
+        if cache is None:
+            continue
+        for col in ('t', 'x', 'v', 'a'):
+            assert_identical(cache[col], other_cache[col])
+        assert comms == other_comms
+
+
+@pytest.fixture(scope='module')
+def serial():
+    return [drive(seed) for seed in SEEDS]
+
+
+def test_serial_is_repeatable(serial):
+    assert_same_trips(serial, [drive(seed) for seed in SEEDS])
+
+
+def test_one_vehicle_matches_new_vehicles(serial):
+    # A CAV reseeds its own generator at every trip, so its earlier trips do not matter.
+    vehicle = Vehicle(V_MAX, A_MAX)
+    trips = []
+    for seed in reversed(SEEDS):
+        try:
+            vehicle.trajectory(V_INIT, TIMESTEP, DURATION, COMMS, seed=seed)
+            trips.append((vehicle.cache, vehicle.comms))
+        except (TypeError, IndexError):
+            trips.append((None, None))
+    assert_same_trips(serial, trips[::-1])
+
+
+def test_global_generator_is_untouched():
+    random.seed(1234)
+    expected = random.random()
+    random.seed(1234)
+    drive(0)
+    assert random.random() == expected
+
+
+def test_random_comm_is_drawn_over_every_comm():
+    attack = Attack(V_MAX, A_MAX)
+    attack.v2i_comms = [S(100, 20), None, RS(100, 10, 500), S(100, 20), RS(60, 15, 200)]
+    picked = set()
+    for seed in range(40):
+        try:
+            attack.vehicle.trajectory(V_INIT, TIMESTEP, DURATION, attack.v2i_comms, seed=seed)
+        except (TypeError, IndexError):
+            continue
+        for kind in ('S', 'RS', 'S', 'RS'):
+            # The draws of the rejection sampling every attack scenario has always picked its comm with.
+            reference = random.Random()
+            reference.setstate(attack.rng.getstate())
+            k = reference.choice(np.arange(len(attack.v2i_comms)))
+            while attack.v2i_comms[k] is None or attack.v2i_comms[k].kind != kind:
+                k = reference.choice(np.arange(len(attack.v2i_comms)))
+            comm, idx, window = attack.get_random_comm(kind)
+            assert (comm, idx) == (attack.v2i_comms[k], k)
+            assert attack.rng.getstate() == reference.getstate()
+            assert window == attack.vehicle.windows.get(k)
+            assert window is None or all(type(i) is int for i in window)
+            picked.add(idx)
+    # The duplicate S comms are told apart by their index.
+    assert picked == {0, 2, 3, 4}
+
+
+# A fleet below FLEET_MIN vehicles is driven one vehicle at a time, a larger one in lockstep.
+@pytest.mark.parametrize('size', [FLEET_MIN - 1, len(SEEDS)])
+def test_trajectories_match_serial(serial, size):
+    fleet, comms = Vehicle(V_MAX, A_MAX).trajectories([V_INIT] * size, list(SEEDS[:size]), TIMESTEP, DURATION, COMMS)
+    batched = []
+    for k in range(size):
+        if comms[k] is None:
+            assert np.isnan(fleet['x'][k]).all()
+            batched.append((None, None))
+        else:
+            batched.append(({col: values[k] for col, values in fleet.items()}, comms[k]))
+    assert_same_trips(serial[:size], batched)
+
+
+def test_threads_match_serial(serial):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert_same_trips(serial, list(pool.map(drive, SEEDS)))
+
+
+def test_processes_match_serial(serial):
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        assert_same_trips(serial, list(pool.map(drive, SEEDS, chunksize=8)))
+
+
+@pytest.mark.parametrize('decision', ['random', 'physics'])
+def test_campaign_matches_evaluate(decision):
+    jobs = list(grid(range(10), range(12), [V_INIT], [TIMESTEP], [DURATION], PERTURBED))
+    results = {result.job: result for result in campaign(jobs, V_MAX, A_MAX, max_workers=2, chunksize=7,
+                                                          decision=decision)}
+    assert len(results) == len(jobs)
+
+    for job in jobs:
+        result = results[job]
+        attack = Attack(V_MAX, A_MAX, decision=decision)
+        try:
+            faulty, benign = attack.evaluate(job.v_init, job.timestep, job.duration, job.seed, job.scenario,
+                                             job.perturbed)
+        except Exception as e:
+            assert result.error == repr(e)
+            continue
+        assert result.error is None
+        for col in ('t', 'x', 'v', 'a'):
+            assert_identical(benign[col], result.benign[col])
+            assert_identical(faulty[col], result.faulty[col])
+        assert attack.benign_comms == result.comms
@@ -0,0 +1,134 @@
+"""
+Tests of the schedule of V2I comms: the corridors of schedule.corridor, the overlap policies of a CAV reading comms
+passed in together, and the speed_up option of a CAV that reads an RS comm while stopped.
+"""
+import numpy as np
+import pytest
+
+from vehicle.cache import TrajectoryCache
+from vehicle.message import RS, S
+from vehicle.schedule import corridor
+from vehicle.stream import Stream
+from vehicle.vehicle import FLEET_MIN, Vehicle
+
+V_MAX, A_MAX = 70, 4
+V_INIT, TIMESTEP, DURATION = 1, 0.1, 200
+# A stop followed by an RSWZ passed in at the same time step, so that with 'queue' the CAV reads the RS comm stopped.
+STOP_THEN_RS = [S(50, 5), RS(50, 10, 200)]
+OFFSETS = [100, 100]
+
+
+def drive(vehicle, seed, comms=STOP_THEN_RS, offsets=OFFSETS):
+    """
+    Return the trip of the CAV, or the type of the exception if the trip cannot be generated.
+    """
+    try:
+        vehicle.trajectory(V_INIT, TIMESTEP, DURATION, comms, seed=seed, offsets=offsets)
+    except (TypeError, IndexError) as e:
+        return type(e)
+    return dict(vehicle.cache), list(vehicle.comms)
+
+
+def test_corridor_is_drawn_from_its_seed():
+    comms, offsets = corridor(500, seed=7, share_rs=0.3, spacing=(10, 20), speed_limit=(5, 5))
+    again, again_offsets = corridor(500, seed=7, share_rs=0.3, spacing=(10, 20), speed_limit=(5, 5))
+    assert comms == again and np.array_equal(offsets, again_offsets)
+    assert comms != corridor(500, seed=8, share_rs=0.3, spacing=(10, 20), speed_limit=(5, 5))[0]
+
+    assert len(comms) == len(offsets) == 500
+    steps = np.diff(offsets, prepend=0)
+    assert steps.min() >= 10 and steps.max() <= 20
+    rs = [comm for comm in comms if isinstance(comm, RS)]
+    stops = [comm for comm in comms if isinstance(comm, S)]
+    assert len(rs) + len(stops) == 500 and 100 < len(rs) < 200
+    assert all(comm.speed_limit == 5 and 100 <= comm.len_of_WZ <= 1000 for comm in rs)
+    assert all(50 <= comm.dist_to_WZ <= 200 and 5 <= comm.duration <= 30 for comm in stops)
+
+
+def test_corridor_drives_with_its_offsets():
+    comms, offsets = corridor(20, seed=3)
+    vehicle = Vehicle(V_MAX, A_MAX, overlap='queue', speed_up=True)
+    read = 0
+    for seed in range(10):
+        try:
+            vehicle.trajectory(V_INIT, TIMESTEP, 1500, comms, seed=seed, offsets=offsets)
+        except (TypeError, IndexError):
+            continue
+        # Queued comms are read in the order they are passed in, each once the previous one is done.
+        assert [comm for comm, _ in vehicle.comms] == comms[:len(vehicle.comms)]
+        ends = [window[1] for _, window in vehicle.comms]
+        starts = [window[0] for _, window in vehicle.comms]
+        assert all(start >= end for start, end in zip(starts[1:], ends))
+        read += len(vehicle.comms)
+    assert read > 20
+
+
+@pytest.mark.parametrize('overlap', ['drop', 'queue'])
+def test_overlap_policy(overlap):
+    vehicle = Vehicle(V_MAX, A_MAX, overlap=overlap, speed_up=True)
+    comms = [S(50, 5), RS(50, 10, 200), S(80, 2)]
+    read = 0
+    for seed in range(20):
+        trip = drive(vehicle, seed, comms, [100, 100, 101])
+        if not isinstance(trip, tuple):
+            continue
+        read += 1
+        ids = {kind: list(k) for kind, k in vehicle.ids.items()}
+        if overlap == 'drop':
+            # Only the last comm passed in at a time step is read, and none while it executes.
+            assert trip[1] == [(RS(50, 10, 200), vehicle.windows[1])]
+            assert ids == {'RS': [1]}
+        else:
+            assert [comm for comm, _ in trip[1]] == comms
+            assert ids == {'S': [0, 2], 'RS': [1]}
+            windows = [vehicle.windows[k] for k in range(len(comms))]
+            assert windows[1][0] == windows[0][1] and windows[2][0] == windows[1][1]
+    assert read > 0
+
+
+def test_speed_up():
+    slow, fast = Vehicle(V_MAX, A_MAX, overlap='queue'), Vehicle(V_MAX, A_MAX, overlap='queue', speed_up=True)
+    sped_up = 0
+    for seed in range(20):
+        expected, trip = drive(slow, seed), drive(fast, seed)
+        if trip is TypeError:
+            assert expected is TypeError
+            continue
+        # Stopped by the S comm when it reads the RS comm, the CAV never traverses the WZ unless it speeds up.
+        assert expected is IndexError
+        start, end, at_target = fast.windows[1]
+        cache = trip[0]
+        assert cache['v'][start - 1] == 0 and start < at_target < end
+        assert np.all(cache['a'][start:at_target] == A_MAX)
+        assert cache['v'][at_target - 1] >= 10 and np.all(cache['v'][at_target:end] == cache['v'][at_target - 1])
+        sped_up += 1
+    assert sped_up > 0
+
+
+@pytest.mark.parametrize('speed_up', [False, True])
+def test_speed_up_fleet_and_stream_match_serial(speed_up):
+    vehicle = Vehicle(V_MAX, A_MAX, overlap='queue', speed_up=speed_up)
+    seeds = list(range(FLEET_MIN))
+    fleet, comms = vehicle.trajectories([V_INIT] * len(seeds), seeds, TIMESTEP, DURATION, STOP_THEN_RS,
+                                        offsets=OFFSETS)
+    for k, seed in enumerate(seeds):
+        trip = drive(vehicle, seed)
+        if not isinstance(trip, tuple):
+            assert comms[k] is None
+            continue
+        for col in ('t', 'x', 'v', 'a'):
+            assert np.array_equal(fleet[col][k].view(np.uint8), trip[0][col].view(np.uint8))
+        assert comms[k] == trip[1]
+
+        stream = Stream(vehicle, V_INIT, TIMESTEP, 997, STOP_THEN_RS, seed=seed, duration=DURATION, offsets=OFFSETS)
+        chunks = list(stream)
+        for col in ('t', 'x', 'v', 'a'):
+            assert np.array_equal(np.concatenate([chunk[col] for chunk in chunks]), trip[0][col])
+        assert stream.comms == trip[1]
+
+
+def test_speed_up_is_part_of_the_cache_key(tmp_path):
+    cache = TrajectoryCache(str(tmp_path))
+    keys = {cache.key(Vehicle(V_MAX, A_MAX, speed_up=speed_up), V_INIT, TIMESTEP, DURATION, STOP_THEN_RS, 0)
+            for speed_up in (False, True)}
+    assert len(keys) == 2
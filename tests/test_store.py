@@ -0,0 +1,116 @@
+"""
+Round-trip tests of the trajectory store: the runs appended whole or streamed are read back as they were written, also
+through maps taken before later writes, and a store reopened after a run that never reached the index drops its values.
+"""
+import numpy as np
+import pytest
+
+from vehicle.campaign import Job
+from vehicle.message import RS, S
+from vehicle.store import COLUMNS, TrajectoryStore
+from vehicle.stream import Stream
+from vehicle.vehicle import Vehicle
+
+V_MAX, A_MAX = 70, 4
+V_INIT, TIMESTEP, DURATION = 1, 0.1, 60
+COMMS = [S(100, 5), RS(100, 10, 100)]
+
+
+def trips(n):
+    """
+    Return the benign and faulty trips of the first n seeds whose trips can be generated.
+    """
+    vehicle = Vehicle(V_MAX, A_MAX)
+    pairs = []
+    for seed in range(100):
+        try:
+            vehicle.trajectory(V_INIT, TIMESTEP, DURATION, COMMS, seed=seed)
+            benign = dict(vehicle.cache)
+            vehicle.trajectory(V_INIT, TIMESTEP, DURATION, COMMS[:1] + [S(1, 0)], seed=seed)
+            faulty = dict(vehicle.cache)
+        except (TypeError, IndexError):
+            continue
+        pairs.append((seed, benign, faulty))
+        if len(pairs) == n:
+            return pairs
+    raise AssertionError("Too few seeds give a trip.")
+
+
+def streamed(seed, chunk_size=97):
+    """
+    Return the chunks of the benign and faulty streams of a seed, paired.
+    """
+    benign = Stream(Vehicle(V_MAX, A_MAX), V_INIT, TIMESTEP, chunk_size, COMMS, seed=seed, duration=DURATION)
+    faulty = Stream(Vehicle(V_MAX, A_MAX), V_INIT, TIMESTEP, chunk_size, COMMS[:1] + [S(1, 0)], seed=seed,
+                    duration=DURATION)
+    return [(b.copy(), f.copy()) for b, f in zip(benign, faulty)]
+
+
+def assert_run(run, benign, faulty):
+    for kind, trip in (('benign', benign), ('faulty', faulty)):
+        for short, long in COLUMNS:
+            expected = np.asarray(trip[short] if short in trip else trip[long], dtype=np.float32)
+            assert np.array_equal(run[kind][short].view(np.uint8), expected.view(np.uint8))
+
+
+def concatenate(chunks):
+    return {short: np.concatenate([chunk[short] if short in chunk else chunk[long] for chunk in chunks])
+            for short, long in COLUMNS}
+
+
+@pytest.mark.parametrize('chunk_size', [1 << 24, 1000])
+def test_runs_read_back_as_written(tmp_path, chunk_size):
+    pairs = trips(4)
+    with TrajectoryStore(str(tmp_path), chunk_size=chunk_size) as store:
+        for k, (seed, benign, faulty) in enumerate(pairs):
+            assert store.append(benign, faulty, Job(1, seed, V_INIT, TIMESTEP, DURATION, None)) == k
+            # A run is read back through the map of its chunk, which the next write must not leave stale.
+            assert_run(store[k], benign, faulty)
+        first = store[0]
+        seed = pairs[0][0]
+        chunks = streamed(seed)
+        assert store.append_stream(chunks) == len(pairs)
+        last = store.runs()[-1]
+        assert store.tail() == (int(last['chunk']), int(last['offset'] + last['length']))
+        assert int(last['length']) == sum(len(benign) for benign, _ in chunks)
+        assert_run(first, pairs[0][1], pairs[0][2])
+        assert_run(store[len(pairs)], concatenate([b for b, _ in chunks]), concatenate([f for _, f in chunks]))
+
+    with TrajectoryStore(str(tmp_path), chunk_size=chunk_size) as store:
+        assert len(store) == len(pairs) + 1
+        assert list(store.runs()['seed'][:len(pairs)]) == [seed for seed, _, _ in pairs]
+        for k, (_, benign, faulty) in enumerate(pairs):
+            assert_run(store[k], benign, faulty)
+        if chunk_size < len(pairs[0][1]['t']) * 2:
+            assert len(set(store.runs()['chunk'])) > 1
+
+
+def test_unfinished_runs_are_dropped(tmp_path):
+    (_, benign, faulty), (_, other_benign, other_faulty) = trips(2)
+    chunks = streamed(0)
+
+    def interrupted():
+        yield chunks[0]
+        raise KeyboardInterrupt
+
+    with TrajectoryStore(str(tmp_path)) as store:
+        store.append(benign, faulty)
+        with pytest.raises(KeyboardInterrupt):
+            store.append_stream(interrupted())
+        store.append(other_benign, other_faulty)
+        assert_run(store[1], other_benign, other_faulty)
+
+    # A crash after the columns of a run are written but before its record reaches the index.
+    with TrajectoryStore(str(tmp_path)) as store:
+        chunk, _ = store.tail()
+        store.write(chunk, [np.ones(7, dtype=np.float32)] * 4, [np.ones(7, dtype=np.float32)] * 4)
+        store.close()
+    with open(str(tmp_path / 'index.bin'), 'ab') as f:
+        f.write(b'\0' * 5)
+
+    with TrajectoryStore(str(tmp_path)) as store:
+        assert len(store) == 2
+        store.append(benign, faulty)
+        assert_run(store[1], other_benign, other_faulty)
+        assert_run(store[2], benign, faulty)
+        assert int(store.runs()['offset'][2]) == len(benign['t']) + len(other_benign['t'])
@@ -0,0 +1,67 @@
+"""
+Equivalence tests of the batched sweep: faulty trajectories driven in lockstep are the ones retrace drives one by one.
+"""
+import numpy as np
+import pytest
+
+from vehicle import attack
+from vehicle.attack import Attack
+from vehicle.message import RS, S
+from vehicle.vehicle import Vehicle
+
+V_MAX, A_MAX, V_INIT = 70, 4, 1
+COMMS = [S(100, 20), RS(100, 10, 500), S(50, 5)]
+TAMPERED = [None, S(1, 0), S(300, 3), S(20, 300), RS(100, 0, 100), RS(5, 3, 50), RS(300, 60, 1000), RS(1, 70, 0)]
+SEEDS = range(12)
+
+# A grid of perturbed values of every attack scenario that takes any.
+AXES = {3: [np.arange(0, 71, 7)], 4: [np.arange(1, 301, 30)], 5: [np.arange(0, 1001, 100)],
+        6: [np.array([1, 50, 150]), np.array([0, 10, 30]), np.array([100, 500])], 7: [np.arange(1, 301, 30)],
+        8: [np.arange(0, 60, 6)], 9: [np.array([1, 50, 200]), np.array([0, 5, 40])]}
+
+
+@pytest.mark.parametrize('overlap', ['drop', 'queue'])
+@pytest.mark.parametrize('timestep, duration', [(1, 500), (0.1, 200)])
+def test_retrace_many_matches_retrace(overlap, timestep, duration):
+    vehicle = Vehicle(V_MAX, A_MAX, overlap=overlap)
+    for seed in SEEDS:
+        try:
+            vehicle.trajectory(V_INIT, timestep, duration, COMMS, seed=seed)
+        except (TypeError, IndexError):
+            continue
+        snapshot = vehicle.snapshot()
+        for k in range(len(COMMS)):
+            fleet_comms = [COMMS[:k] + [comm] + COMMS[k + 1:] for comm in TAMPERED]
+            vehicle.restore(snapshot)
+            fleet, comms, rngs = vehicle.retrace_many(k, fleet_comms)
+            for j, v2i_comms in enumerate(fleet_comms):
+                vehicle.restore(snapshot)
+                try:
+                    vehicle.retrace(k, v2i_comms)
+                except IndexError:
+                    assert comms[j] is None and np.isnan(fleet['x'][j]).all()
+                    continue
+                for col in ('t', 'x', 'v', 'a'):
+                    assert np.array_equal(vehicle.cache[col].view(np.uint8), fleet[col][j].view(np.uint8))
+                assert comms[j] == vehicle.comms
+                assert rngs[j].getstate() == vehicle.rng.getstate()
+
+
+@pytest.mark.parametrize('decision', ['random', 'physics'])
+def test_lockstep_sweep_matches_serial_sweep(monkeypatch, decision):
+    for seed in range(8):
+        for scenario, axes in AXES.items():
+            sweeps = []
+            for lockstep_min in (1, np.inf):
+                monkeypatch.setattr(attack, 'LOCKSTEP_MIN', lockstep_min)
+                try:
+                    sweeps.append(Attack(V_MAX, A_MAX, decision=decision).sweep(V_INIT, 1, 500, seed, scenario, *axes,
+                                                                                 batch_size=16))
+                except (TypeError, IndexError) as e:
+                    sweeps.append(repr(e))
+            lockstep, serial = sweeps
+            if isinstance(serial, str):
+                assert lockstep == serial
+                continue
+            assert lockstep.outcome.tobytes() == serial.outcome.tobytes()
+            assert np.array_equal(lockstep.failed, serial.failed)
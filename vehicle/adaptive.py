@@ -0,0 +1,256 @@
+import numpy as np
+
+from vehicle.message import RS, S, parse
+from vehicle.trajectory import Trajectory
+from vehicle.vehicle import NO_ACTION
+
+# Two times closer than this, in seconds, are the same time.
+EPS = 1e-9
+
+
+class Knots:
+    """
+    A trip as the knots of its segments of constant acceleration: from knot k to knot k + 1 the CAV drives at
+    acceleration a[k], so its position and velocity in between follow exactly from x[k] and v[k]. The last knot is the
+    end of the trip.
+    """
+
+    def __init__(self, t, x, v):
+        """
+        The constructor for a trip starting at one knot.
+
+        :param t: The time of the first knot, in seconds (float).
+        :param x: The position of the first knot, in meters (float).
+        :param v: The velocity of the first knot, in m/s (float).
+        """
+        self.t, self.x, self.v, self.a = [t], [x], [v], []
+
+    def drive(self, acc, dt):
+        """
+        Drives the CAV at a constant acceleration for dt seconds, adding a knot at the end.
+
+        :param acc: The acceleration, in m/s^2 (float).
+        :param dt: The duration of the segment, in seconds (float).
+        """
+        acc, dt = float(acc), float(dt)
+        if dt <= EPS:
+            return
+        t, x, v = self.t[-1], self.x[-1], self.v[-1]
+        self.a.append(acc)
+        self.t.append(t + dt)
+        self.x.append(x + v * dt + 0.5 * acc * dt ** 2)
+        self.v.append(v + acc * dt)
+
+    def set_v(self, v):
+        """
+        Sets the velocity of the last knot to the exact value of the event that ends a segment.
+
+        :param v: The velocity, in m/s (float).
+        """
+        self.v[-1] = float(v)
+
+    def to_trajectory(self):
+        """
+        Return the knots as a Trajectory, in float64, where a[k] is the acceleration from knot k to knot k + 1.
+
+        :return: The knots (Trajectory).
+        """
+        return Trajectory(np.array(self.t), np.array(self.x), np.array(self.v), np.array(self.a + [0.0]))
+
+
+def trajectory(vehicle, v_init, timestep, duration, v2i_comms, seed=0, offsets=None):
+    """
+    Generates a trip of a CAV with adaptive steps: rather than every timestep, the trip is integrated exactly from one
+    event to the next. The events are the decision points of the random trajectory phase, the V2I comms and the ends of
+    the phases of their execution, localized exactly: the time the velocity reaches the RSWZ speed limit or 0 and the
+    time the position reaches the end of the work zone. A trip takes as many steps as it has segments of constant
+    acceleration, and a CAV slowing down to a stop stops exactly at the distance to the work zone.
+
+    The timestep only sets the clock of the trip, as in Vehicle.trajectory: the decision points every 20 timesteps and
+    the time steps the comms are passed in at. The random draws are taken in the same order, and up until the first
+    comm the CAV executes, every decision is taken on the float32 velocity Vehicle.trajectory integrates one timestep
+    at a time, so the trip takes the decisions of the trip Vehicle.trajectory generates with the same arguments, within
+    the rounding of float32, until then. From then on, the exact events set them apart. A comm still executing at the
+    start of the deceleration phase is cut off there (see Stream), and, as in Vehicle.trajectory, a trip raises an
+    IndexError if a stop runs past its end or if the CAV is stopped when it reaches an RSWZ (say, one whose speed limit
+    is 0), as it never traverses it.
+
+    :param vehicle: The CAV (Vehicle).
+    :param v_init: The initial velocity of the vehicle, in m/s (int).
+    :param timestep: The timestep of the clock of the trip (float).
+    :param duration: The duration of the trip, in seconds (int).
+    :param v2i_comms: V2I communications, where None is a comm the CAV ignores (list).
+    :param seed: The seed of the trip (int).
+    :param offsets: The time steps after the start of the random trajectory phase at which each comm is passed in,
+                    drawn at random if None (list).
+    :return: Tuple containing the knots of the trip (Trajectory) and the comms the CAV read, as
+             [(message, (start, end, time when v = 0 or v = rs))] in seconds (list).
+    """
+    tau = timestep
+    N = int(duration / tau) + 1
+    vehicle.rng.seed(seed)
+    vehicle.prev_action = NO_ACTION
+    acc_t_end, acc, arrivals = vehicle.plan(np.float32(v_init), tau, duration, N, v2i_comms, offsets)
+    messages = [parse(comm) for comm in v2i_comms]
+    # Time step i of Vehicle.trajectory ends at time i * tau, and its acceleration applies from time (i - 1) * tau.
+    end = (N - 1) * tau
+    ran_start = (acc_t_end - 1) * tau
+    dec_start = int((9 / 10) * N) * tau
+    order = np.argsort(arrivals, kind='stable')
+    times = [(int(arrivals[k]) - 1) * tau for k in order]
+
+    # ACCELERATION PHASE: the acceleration scenarios switch value at most once, halfway through.
+    knots = Knots(0.0, 0.0, float(v_init))
+    # The velocity of the trip Vehicle.trajectory generates, up until the first comm the CAV executes.
+    discrete = np.float32(v_init)
+    if acc_t_end > 1:
+        half = int((acc_t_end - 1) / 2)
+        knots.drive(acc(1), half * tau)
+        knots.drive(acc(acc_t_end - 1), ran_start - half * tau)
+        discrete = accelerate(discrete, acc(1), half, tau)
+        discrete = accelerate(discrete, acc(acc_t_end - 1), acc_t_end - 1 - half, tau)
+
+    # RANDOM TRAJECTORY PHASE
+    comms = []
+    cursor, left, acc = 0, 0.0, 0.0  # left = the timesteps until the next decision point
+    while knots.t[-1] < dec_start - EPS:
+        t = knots.t[-1]
+        if vehicle.overlap == 'drop':
+            # V2I comms passed in while another comm was executing are never read.
+            while cursor < len(times) and times[cursor] < t - EPS:
+                cursor += 1
+
+        if cursor < len(times) and times[cursor] <= t + EPS:
+            last = cursor
+            if vehicle.overlap == 'drop':
+                # Of the V2I comms passed in at the same time step, only the last one is read.
+                while last + 1 < len(times) and times[last + 1] <= t + EPS:
+                    last += 1
+            comm = messages[int(order[last])]
+            cursor = last + 1
+            if comm is not None:
+                discrete = None
+                window = execute(vehicle, knots, comm, end, dec_start)
+                if window is not None:
+                    comms.append((comm, window))
+            continue
+
+        if left <= EPS:
+            acc = vehicle.ran_policy(np.float32(knots.v[-1]) if discrete is None else discrete, tau,
+                                     abs(t - ran_start) <= EPS)
+            left = 20.0
+        dt = min(left * tau, dec_start - t)
+        if cursor < len(times):
+            dt = min(dt, times[cursor] - t)
+        if discrete is not None:
+            discrete = accelerate(discrete, acc, int(round(dt / tau)), tau, clamp=True)
+        v = knots.v[-1]
+        if acc < 0 and v + acc * dt < 0:
+            # The CAV stops within the segment and stays stopped.
+            knots.drive(acc, v / -acc)
+            knots.set_v(0.0)
+            knots.drive(0, t + dt - knots.t[-1])
+        else:
+            knots.drive(acc if v > 0 or acc > 0 else 0, dt)
+        left -= dt / tau
+
+    # DECELERATION PHASE: the CAV comes to a stop at the end of the trip.
+    t = knots.t[-1]
+    if end - t > EPS:
+        knots.drive(-knots.v[-1] / (end - t), end - t)
+        knots.set_v(0.0)
+    return knots.to_trajectory(), comms
+
+
+def execute(vehicle, knots, comm, end, dec_start):
+    """
+    Executes a V2I comm from the last knot, localizing the end of every phase exactly (see Vehicle.drive).
+
+    :param vehicle: The CAV (Vehicle).
+    :param knots: The knots of the trip (Knots).
+    :param comm: The V2I comm (RS or S).
+    :param end: The time of the end of the trip, in seconds (float).
+    :param dec_start: The time the deceleration phase starts at, in seconds (float).
+    :return: The start, end and time when v = 0 or v = rs of the comm, in seconds, or None if it was cut off by the
+             deceleration phase.
+    """
+    def drive(acc, dt, v_end=None):
+        # Drives up until the event, unless the deceleration phase comes first.
+        cut = knots.t[-1] + dt > dec_start
+        knots.drive(acc, min(dt, dec_start - knots.t[-1]))
+        if not cut and v_end is not None:
+            knots.set_v(v_end)
+        return not cut
+
+    start, v = knots.t[-1], knots.v[-1]
+    if isinstance(comm, RS):
+        des_v = comm.speed_limit
+        if v > des_v:
+            dec = ((des_v ** 2) - (v ** 2)) / (2 * comm.dist_to_WZ)
+            if not drive(dec, (des_v - v) / dec, des_v):
+                return None
+        elif vehicle.speed_up and v * (end - start) < comm.len_of_WZ < des_v * (end - start):
+            # A CAV too slow to traverse the WZ before the end of the trip (say, a stopped one) first speeds up to the
+            # RSWZ speed limit.
+            if not drive(vehicle.a_max, (des_v - v) / vehicle.a_max, des_v):
+                return None
+        at_target = knots.t[-1]
+        v = knots.v[-1]
+        if v <= 0:
+            raise IndexError("The CAV stopped at the RSWZ read at %g s never traverses it." % start)
+        if not drive(0, comm.len_of_WZ / v):
+            return None
+        return start, knots.t[-1], at_target
+
+    if isinstance(comm, S):
+        if v > 0:
+            dec = -(v ** 2) / (2 * comm.dist_to_WZ)
+            if not drive(dec, v / -dec, 0.0):
+                return None
+        at_target = knots.t[-1]
+        if at_target + comm.duration > end + EPS:
+            raise IndexError("The stop at %g s runs past the end of the trip." % at_target)
+        # Now we hold the stop over the duration of the stop
+        if not drive(0, comm.duration):
+            return None
+        return start, knots.t[-1], at_target
+
+
+def accelerate(v, acc, n, tau, clamp=False):
+    """
+    Return the velocity after n timesteps at a constant acceleration from velocity v, integrated one timestep at a time
+    in float32 as Vehicle.trajectory does (see vehicle.vehicle.accelerate).
+
+    :param v: The velocity, in m/s (np.float32).
+    :param acc: The acceleration, in m/s^2 (float).
+    :param n: The number of timesteps (int).
+    :param tau: The timestep of the trip (float).
+    :param clamp: Whether a velocity that is not positive is set to 0 to represent a stop (bool).
+    :return: The velocity, in m/s (np.float32).
+    """
+    ramp = np.multiply(np.full(n + 1, acc, dtype=np.float32), tau)
+    ramp[0] = v
+    np.add.accumulate(ramp, out=ramp)
+    if clamp and acc < 0 and not ramp[-1] > 0:
+        return np.float32(0)
+    return ramp[-1]
+
+
+def resample(knots, timestep):
+    """
+    Return a trip given by its knots on a uniform grid of timesteps, evaluated exactly at every time step. The
+    acceleration of a time step is the one it ends with, as in Vehicle.trajectory.
+
+    :param knots: The knots of the trip (Trajectory).
+    :param timestep: The timestep of the grid (float).
+    :return: The trip on the grid, in float32 (Trajectory).
+    """
+    n = int(round((knots.t[-1] - knots.t[0]) / timestep)) + 1
+    t = knots.t[0] + np.arange(n) * timestep
+    k = np.clip(np.searchsorted(knots.t, t, side='right') - 1, 0, len(knots.t) - 1)
+    dt = t - knots.t[k]
+    x = knots.x[k] + knots.v[k] * dt + 0.5 * knots.a[k] * dt ** 2
+    v = knots.v[k] + knots.a[k] * dt
+    ending = np.searchsorted(knots.t, t, side='left') - 1
+    a = np.where(ending >= 0, knots.a[np.clip(ending, 0, len(knots.t) - 1)], 0)
+    return Trajectory(t.astype(np.float32), x.astype(np.float32), v.astype(np.float32), a.astype(np.float32))
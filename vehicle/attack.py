@@ -1,35 +1,151 @@
-import random
+import itertools
+from collections import namedtuple
+
 import format
+from vehicle import metrics
+from vehicle.message import RS, S
 from vehicle.vehicle import *
 
+# A perturbed value of an attack scenario: the field of the tampered message it replaces, the prompt compare asks for
+# it with and the inclusive range of its values, where a high of None is no upper bound.
+Param = namedtuple('Param', ['field', 'prompt', 'low', 'high'])
+
+DIST_TO_WZ = Param('dist_to_WZ', "Input perturbed distance to work zone: ", 1, None)
+SPEED_LIMIT = Param('speed_limit', "Input perturbed reduced speed in work zone: ", 0, None)
+LEN_OF_WZ = Param('len_of_WZ', "Input perturbed length of work zone: ", 0, None)
+DURATION = Param('duration', "Input perturbed duration of work zone: ", 0, None)
+
+
+class Scenario(namedtuple('Scenario', ['number', 'name', 'kind', 'params'])):
+    """
+    The declaration of an attack scenario: its number, the name of the Attack method that runs it, the kind of message
+    it tampers with (None if it tampers with none) and its perturbed values, in the order the method takes them. The
+    method is only looked up on an Attack as the scenario is run, so the registry holds no Attack.
+    """
+
+    __slots__ = ()
+
+    def check(self, perturbed):
+        """
+        Return the perturbed values of the scenario as its method takes them, checked against their ranges.
+
+        :param perturbed: The perturbed value (int) or values (list) of the scenario, or None if it takes none.
+        :return: None, the perturbed value (int) or the perturbed values (tuple).
+        """
+        if not self.params:
+            if perturbed is not None:
+                raise ValueError("Scenario %d takes no perturbed value, got %r." % (self.number, perturbed))
+            return None
+        values = np.atleast_1d(np.asarray(perturbed, dtype=object)) if perturbed is not None else ()
+        if len(values) != len(self.params):
+            raise ValueError("Scenario %d takes %d perturbed values, got %r." % (self.number, len(self.params),
+                                                                                  perturbed))
+        checked = []
+        for param, value in zip(self.params, values):
+            if int(value) != value or not param.low <= value <= (value if param.high is None else param.high):
+                raise ValueError("The perturbed %s of scenario %d must be an integer in [%s, %s], got %r."
+                                 % (param.field, self.number, param.low, param.high, value))
+            checked.append(int(value))
+        return checked[0] if len(checked) == 1 else tuple(checked)
+
+    def ask(self):
+        """
+        Return the perturbed values of the scenario, prompted for one at a time.
+
+        :return: None, the perturbed value (int) or the perturbed values (tuple).
+        """
+        values = [int(input(param.prompt)) for param in self.params]
+        return self.check(values if values else None)
+
+    def run(self, attack, truth, v_init, perturbed, timestep, duration, seed):
+        """
+        Return the faulty trajectory of the scenario on an Attack whose vehicle just generated the benign trajectory.
+
+        :param attack: The attack (Attack).
+        :param truth: The benign trajectory of the CAV (Trajectory).
+        :param v_init: The initial velocity of the vehicle, in m/s (int).
+        :param perturbed: The perturbed values of the scenario, as returned by check.
+        :param timestep: The timestep of the benign trajectory (int).
+        :param duration: The duration of the benign trajectory, in seconds (int).
+        :param seed: The seed of the benign trajectory (int).
+        :return: The faulty trajectory.
+        """
+        method = getattr(attack, self.name)
+        if self.kind is None:
+            return method(truth)
+        if not self.params:
+            return method(truth, v_init, timestep, duration, seed)
+        return method(truth, v_init, perturbed, timestep, duration, seed)
+
+
+# The attack scenarios by number.
+SCENARIOS = {scenario.number: scenario for scenario in (
+    Scenario(0, 'eq', None, ()),
+    Scenario(1, 'ignore_stop', S.kind, ()),
+    Scenario(2, 'ignore_rs', RS.kind, ()),
+    Scenario(3, 'swz_rs', RS.kind, (SPEED_LIMIT,)),
+    Scenario(4, 'dwz_rs', RS.kind, (DIST_TO_WZ,)),
+    Scenario(5, 'lwz_rs', RS.kind, (LEN_OF_WZ,)),
+    Scenario(6, 'rswz', RS.kind, (DIST_TO_WZ, SPEED_LIMIT, LEN_OF_WZ)),
+    Scenario(7, 'dwz_stop', S.kind, (DIST_TO_WZ,)),
+    Scenario(8, 'dur_wz_stop', S.kind, (DURATION,)),
+    Scenario(9, 'stop', S.kind, (DIST_TO_WZ, DURATION)),
+)}
+
+# The number of perturbed values of each attack scenario that takes any.
+N_PERTURBED = {number: len(scenario.params) for number, scenario in SCENARIOS.items() if scenario.params}
+
+# The number of faulty trajectories of a tampered comm from which a sweep drives them in lockstep rather than one at a
+# time: below 10 to 20 trajectories, depending on the timestep, the rounds of lockstep cost more than the trajectories.
+LOCKSTEP_MIN = 24
+
+# The outcomes of an attack scenario over a grid of perturbed values, indexed like the grid: OUTCOME records, their
+# severity, and whether the scenario raised.
+Sweep = namedtuple('Sweep', ['axes', 'outcome', 'severity', 'failed'])
+
 
 class Attack:
     """
     An object that represents the various attack scenarios that can come about from V2I/V2X communication.
+
+    An attack has no generator of its own: it draws from the generator of its vehicle (Vehicle.rng), which every trip
+    reseeds with the seed of the trip, so the draws of an attack are the stream of random.Random(seed) right after the
+    draws of the benign trajectory. An attack is therefore reproducible from its seed alone and independent of any other
+    Attack or Vehicle, whether attacks run in threads, processes or batches.
     """
 
-    def __init__(self, v_max, a_max):
+    def __init__(self, v_max, a_max, disk_cache=None, backend='numpy', decision='random'):
         """
         The constructor for the Attack module.
 
         :param v_max: The maximum velocity of the vehicle, in m/s (int).
         :param a_max: The maximum acceleration of the vehicle, in m/s^2 (int).
+        :param disk_cache: An optional cache of benign trajectories on disk (TrajectoryCache).
+        :param backend: How the trajectories of the vehicle are integrated, 'numpy' or 'numba' (str).
+        :param decision: How the attacks decide whether the CAV crashes and when (str). With 'random', by chance as
+                         each attack describes. With 'physics', from the kinematics of the faulty trajectory against the
+                         actual work zone (see collide).
         """
-        self.vehicle = Vehicle(v_max, a_max)
-        self.v2i_comms = ["S,100,20", "RS,100,10,500"]
-        self.attack_panel = \
-            {
-                0: self.eq,
-                1: self.ignore_stop,
-                2: self.ignore_rs,
-                3: self.swz_rs,
-                4: self.dwz_rs,
-                5: self.lwz_rs,
-                6: self.rswz,
-                7: self.dwz_stop,
-                8: self.dur_wz_stop,
-                9: self.stop
-            }
+        self.vehicle = Vehicle(v_max, a_max, disk_cache, backend)
+        if decision not in ('random', 'physics'):
+            raise ValueError("Unknown decision mode %r." % decision)
+        self.decision = decision
+        # The generator of the vehicle (see the class docstring).
+        self.rng = self.vehicle.rng
+        self.v2i_comms = [S(100, 20), RS(100, 10, 500)]
+        # The V2I comms read during the most recent benign trajectory and their windows, as in Vehicle.comms.
+        self.benign_comms = []
+        # The faulty trajectories of the batch of a sweep by their tampered comms, None outside of a sweep (see sweep).
+        self.batch = None
+
+    @property
+    def attack_panel(self):
+        """
+        The method of every attack scenario, bound from SCENARIOS.
+
+        :return: A dictionary of scenario number to method.
+        """
+        return {number: getattr(self, scenario.name) for number, scenario in SCENARIOS.items()}
 
     def traj(self, v_init, timestep, duration, seed):
         """
@@ -44,6 +160,82 @@ class Attack:
         self.vehicle.trajectory(v_init, timestep, duration, self.v2i_comms, seed=seed)
         return self.vehicle.report()
 
+    def retrace(self, idx, v_init, timestep, duration, seed):
+        """
+        Return the trajectory of the vehicle after the V2I communication at index idx of self.v2i_comms was tampered
+        with. If the most recent trip of the vehicle is the benign trajectory with the same parameters, the trajectory
+        is resumed from the time step at which the tampered communication was passed into the vehicle, as everything
+        before it is the same as the benign trajectory. Otherwise, the trajectory is generated from the start.
+
+        :param idx: The index i within self.v2i_comms of the tampered communication (int).
+        :param v_init: The initial velocity of the vehicle, in m/s (int).
+        :param timestep: The timestep of the benign trajectory (int).
+        :param duration: The duration of the benign trajectory, in seconds (int).
+        :param seed: The seed of the benign trajectory (int).
+        :return: The faulty trajectory of the object's vehicle.
+        """
+        trip = self.vehicle.trip
+        benign = self.vehicle.cache is not None and trip is not None \
+            and len(trip['arrivals']) == len(self.v2i_comms) \
+            and (trip['v_init'], trip['timestep'], trip['duration'], trip['seed']) == (v_init, timestep, duration, seed)
+        if not benign:
+            return self.traj(v_init, timestep, duration, seed)
+        if self.batch is not None:
+            return self.batched(idx)
+
+        self.vehicle.retrace(idx, self.v2i_comms)
+        return self.vehicle.report()
+
+    def batched(self, idx):
+        """
+        Return the faulty trajectory of the batch of a sweep after the V2I communication at index idx of self.v2i_comms
+        was tampered with. The vehicle is left as retrace leaves it. Until the batch is driven (see drive_batch), the
+        tampered comms are only collected and the benign trajectory stands in for the faulty one.
+
+        :param idx: The index i within self.v2i_comms of the tampered communication (int).
+        :return: The faulty trajectory of the object's vehicle.
+        """
+        key = (idx, tuple(self.v2i_comms))
+        driven = self.batch.setdefault(key, None)
+        if driven is None:
+            return self.vehicle.report().copy()
+
+        trip, state = driven
+        if trip is None:
+            raise IndexError("The faulty trajectory cannot be generated as a V2I comm runs past the end of the trip.")
+        self.vehicle.cache = {col: values.copy() for col, values in trip.items()}
+        self.vehicle.rng.setstate(state)
+        return self.vehicle.report()
+
+    def drive_batch(self, snapshot):
+        """
+        Drives every faulty trajectory collected in the batch of a sweep from the benign trajectory of the vehicle. The
+        faulty trajectories of each tampered comm are driven at once, in lockstep from its checkpoint (see
+        Vehicle.retrace_many), unless there are fewer than LOCKSTEP_MIN of them, which retrace drives faster one at a
+        time. Both give the same faulty trajectories.
+
+        :param snapshot: The state of the vehicle right after the benign trajectory (tuple).
+        """
+        for idx in sorted({idx for idx, _ in self.batch}):
+            keys = [key for key in self.batch if key[0] == idx]
+            if len(keys) < LOCKSTEP_MIN:
+                for key in keys:
+                    self.vehicle.restore(snapshot)
+                    try:
+                        self.vehicle.retrace(idx, list(key[1]))
+                        self.batch[key] = (self.vehicle.cache, self.vehicle.rng.getstate())
+                    except IndexError:
+                        self.batch[key] = (None, None)
+                continue
+
+            self.vehicle.restore(snapshot)
+            fleet, comms, rngs = self.vehicle.retrace_many(idx, [list(v2i_comms) for _, v2i_comms in keys])
+            for j, key in enumerate(keys):
+                if comms[j] is None:
+                    self.batch[key] = (None, None)
+                else:
+                    self.batch[key] = ({col: values[j] for col, values in fleet.items()}, rngs[j].getstate())
+
     def compare(self, v_init, timestep, duration, seed, scenario=1):
         """
         A function that compares the benign trajectory with a faulty trajectory that was under a specific attack
@@ -54,47 +246,147 @@ class Attack:
         :param duration: The duration of the benign trajectory, in seconds (int).
         :param seed: The seed of the benign trajectory (int).
         :param scenario: Which attack scenario to execute (int).
+        :return: Tuple containing the faulty and benign trajectories.
+        """
+        assert scenario in SCENARIOS, "Choose a valid attack mechanism ranging from 0-9"
+
+        perturbed = SCENARIOS[scenario].ask()
+        faulty_traj, benign_traj = self.evaluate(v_init, timestep, duration, seed, scenario, perturbed)
+        format.plot_trajectory_compare(faulty_traj, benign_traj, self.benign_comms)
+        return faulty_traj, benign_traj
+
+    def evaluate(self, v_init, timestep, duration, seed, scenario=1, perturbed=None):
+        """
+        Return the benign trajectory and a faulty trajectory that was under a specific attack scenario without
+        prompting for input or displaying anything.
+
+        :param v_init: The initial velocity of the vehicle, in m/s (int).
+        :param timestep: The timestep of the benign trajectory (int).
+        :param duration: The duration of the benign trajectory, in seconds (int).
+        :param seed: The seed of the benign trajectory (int).
+        :param scenario: Which attack scenario to execute (int).
+        :param perturbed: The perturbed value of scenarios 3-5 and 7-8 (int) or values of scenarios 6 and 9 (list).
+        :return: Tuple containing the faulty and benign trajectories.
+        """
+        assert scenario in SCENARIOS, "Choose a valid attack mechanism ranging from 0-9"
+        perturbed = SCENARIOS[scenario].check(perturbed)
+
+        self.rng.seed(seed)
+        benign_traj = self.traj(v_init, timestep, duration, seed=seed)
+        self.benign_comms = list(self.vehicle.comms)
+
+        faulty_traj = SCENARIOS[scenario].run(self, benign_traj, v_init, perturbed, timestep, duration, seed)
+        return faulty_traj, benign_traj
+
+    def evaluate_many(self, v_init, timestep, duration, seed, points):
+        """
+        Return the benign trajectory and the faulty trajectory of every attack scenario of points. The benign
+        trajectory is generated once, and every point resumes from the state of the vehicle right after it, so each
+        point gives the same faulty trajectory as evaluate.
+
+        :param v_init: The initial velocity of the vehicle, in m/s (int).
+        :param timestep: The timestep of the benign trajectory (int).
+        :param duration: The duration of the benign trajectory, in seconds (int).
+        :param seed: The seed of the benign trajectory (int).
+        :param points: (scenario, perturbed) tuples, as taken by evaluate (iterable).
+        :return: Tuple containing the benign trajectory and a (faulty trajectory, None) or (None, exception) tuple per
+                 point (list).
         """
-        assert scenario in self.attack_panel, "Choose a valid attack mechanism ranging from 0-9"
+        self.rng.seed(seed)
+        benign_traj = self.traj(v_init, timestep, duration, seed=seed)
+        self.benign_comms = list(self.vehicle.comms)
+        v2i_comms = list(self.v2i_comms)
+        snapshot = self.vehicle.snapshot()
+
+        faulty = []
+        for scenario, perturbed in points:
+            self.vehicle.restore(snapshot)
+            self.v2i_comms = list(v2i_comms)
+            try:
+                assert scenario in SCENARIOS, "Choose a valid attack mechanism ranging from 0-9"
+                spec = SCENARIOS[scenario]
+                faulty.append((spec.run(self, benign_traj, v_init, spec.check(perturbed), timestep, duration, seed),
+                               None))
+            except Exception as e:
+                faulty.append((None, e))
+
+        self.vehicle.restore(snapshot)
+        self.v2i_comms = v2i_comms
+        return benign_traj, faulty
+
+    def sweep(self, v_init, timestep, duration, seed, scenario, *axes, batch_size=1024):
+        """
+        Return the outcomes of an attack scenario over every point of a grid of perturbed values, such as every
+        perturbed reduced speed crossed with every perturbed distance to the work zone for scenario 6. The benign
+        trajectory is generated once and the grid is evaluated a batch of points at a time: the tampered comms of every
+        point of a batch are collected first, then the faulty trajectories of the whole batch are driven at once, in
+        lockstep from the checkpoint of the tampered comm (see drive_batch), so the benign prefix is shared by the whole
+        grid. Each point gives the same faulty trajectory as evaluate with its perturbed values, and the outcomes of a
+        batch are computed at once.
 
-        random.seed(seed)
+        :param v_init: The initial velocity of the vehicle, in m/s (int).
+        :param timestep: The timestep of the benign trajectory (int).
+        :param duration: The duration of the benign trajectory, in seconds (int).
+        :param seed: The seed of the benign trajectory (int).
+        :param scenario: Which attack scenario to execute, ranging from 3-9 (int).
+        :param axes: The values of every perturbed value of the scenario, in the order the scenario takes them (list).
+        :param batch_size: The number of points, and of faulty trajectories kept, per batch (int).
+        :return: The outcomes of the grid (Sweep), whose arrays have one dimension per axis.
+        """
+        assert scenario in N_PERTURBED, "Choose an attack scenario with perturbed values ranging from 3-9"
+        assert len(axes) == N_PERTURBED[scenario], \
+            "Scenario %d takes %d perturbed values" % (scenario, N_PERTURBED[scenario])
+        axes = [np.asarray(values) for values in axes]
+        shape = tuple(len(values) for values in axes)
+        spec = SCENARIOS[scenario]
+
+        self.rng.seed(seed)
         benign_traj = self.traj(v_init, timestep, duration, seed=seed)
-        faulty_traj = None
-
-        if scenario == 0:
-            faulty_traj = self.eq(benign_traj)
-        elif scenario == 1:
-            faulty_traj = self.ignore_stop(benign_traj, v_init, timestep, duration, seed)
-        elif scenario == 2:
-            faulty_traj = self.ignore_rs(benign_traj)
-        elif scenario == 3:
-            perturbed_v = int(input("Input perturbed reduced speed in work zone: "))
-            faulty_traj = self.swz_rs(benign_traj, v_init, perturbed_v, timestep, duration, seed)
-        elif scenario == 4:
-            perturbed_dist = int(input("Input perturbed distance to work zone: "))
-            faulty_traj = self.dwz_rs(benign_traj, v_init, perturbed_dist, timestep, duration, seed)
-        elif scenario == 5:
-            perturbed_len = int(input("Input perturbed length of work zone: "))
-            faulty_traj = self.lwz_rs(benign_traj, v_init, perturbed_len, timestep, duration, seed)
-        elif scenario == 6:
-            perturbed = input(
-                "Input perturbed distance to, reduced speed of, and length of work zone as csv in that order: ").split(
-                ",")
-            perturbed = list(map(int, perturbed))
-            faulty_traj = self.rswz(benign_traj, v_init, perturbed, timestep, duration, seed)
-        elif scenario == 7:
-            perturbed_dist = int(input("Input perturbed distance to work zone: "))
-            faulty_traj = self.dwz_stop(benign_traj, perturbed_dist)
-        elif scenario == 8:
-            perturbed_dur = int(input("Input perturbed duration of work zone: "))
-            faulty_traj = self.dur_wz_stop(benign_traj, v_init, perturbed_dur, timestep, duration, seed)
-        elif scenario == 9:
-            perturbed = input("Input perturbed distance to and duration of stop at work zone as csv in that order: ") \
-                .split(",")
-            perturbed = list(map(int, perturbed))
-            faulty_traj = self.stop(benign_traj, v_init, perturbed, timestep, duration, seed)
-
-        format.plot_trajectory_compare(faulty_traj, benign_traj)
+        self.benign_comms = list(self.vehicle.comms)
+        v2i_comms = list(self.v2i_comms)
+        snapshot = self.vehicle.snapshot()
+
+        def run(perturbed):
+            # Every point starts from the state of the vehicle right after the benign trajectory.
+            self.vehicle.restore(snapshot)
+            self.v2i_comms = list(v2i_comms)
+            return spec.run(self, benign_traj, v_init, spec.check(perturbed), timestep, duration, seed)
+
+        outcome = np.zeros(int(np.prod(shape)), dtype=metrics.OUTCOME)
+        failed = np.zeros(len(outcome), dtype=bool)
+        benign = metrics.stack([benign_traj])
+        points = itertools.product(*axes)
+        try:
+            for first in range(0, len(outcome), batch_size):
+                batch = [[int(value) for value in point] for point in itertools.islice(points, batch_size)]
+                self.batch = {}
+                for perturbed in batch:
+                    try:
+                        run(perturbed)
+                    except Exception:
+                        pass
+                self.drive_batch(snapshot)
+
+                faulty = []
+                for n, perturbed in enumerate(batch, first):
+                    try:
+                        faulty.append(run(perturbed))
+                    except Exception:
+                        failed[n] = True
+                        faulty.append(benign_traj)
+                outcome[first:first + len(batch)] = metrics.outcomes(
+                    {col: np.broadcast_to(values, (len(batch), values.shape[1])) for col, values in benign.items()},
+                    metrics.stack(faulty), timestep, metrics.zones([self.benign_comms] * len(batch)))
+        finally:
+            self.batch = None
+            self.vehicle.restore(snapshot)
+            self.v2i_comms = v2i_comms
+
+        # The points that raised have no outcome.
+        outcome[failed] = np.zeros(1, dtype=metrics.OUTCOME)
+        outcome['crash_step'][failed] = outcome['divergence_step'][failed] = -1
+        outcome, failed = outcome.reshape(shape), failed.reshape(shape)
+        return Sweep(axes, outcome, metrics.severity(outcome), failed)
 
     # Attack panel
 
@@ -102,13 +394,15 @@ class Attack:
         """
         Return a perturbed trajectory where a V2I s communication is ignored which ultimately results in a crash.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
+        :param truth: The benign trajectory of the CAV (Trajectory).
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param timestep: The timestep of the benign trajectory (int).
         :param duration: The duration of the benign trajectory, in seconds (int).
         :param seed: The seed of the benign trajectory. (int)
         :return: The perturbed trajectory.
         """
+        if self.decision == 'physics':
+            return self.collide(truth, S.kind, lambda comm: None, v_init, timestep, duration, seed)
 
         # Get a random S comm randomly within v2i_comms
         _, stop_idx, window, _, _ = self.get_random_S_info()
@@ -119,13 +413,15 @@ class Attack:
         """
         Return a perturbed trajectory where a V2I rs communication is ignored which ultimately results in a crash.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
+        :param truth: The benign trajectory of the CAV (Trajectory).
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param timestep: The timestep of the benign trajectory (int).
         :param duration: The duration of the benign trajectory, in seconds (int).
         :param seed: The seed of the benign trajectory. (int)
         :return: The perturbed trajectory.
         """
+        if self.decision == 'physics':
+            return self.collide(truth, RS.kind, lambda comm: None, v_init, timestep, duration, seed)
 
         # Get a random RS comm randomly within v2i_comms
         _, rs_idx, window, _, _, _ = self.get_random_RS_info()
@@ -140,7 +436,7 @@ class Attack:
         1. Crash/no crash because the perturbed reduced speed in the work zone may or may not cause a crash thus we
            randomize the outcome using pseudo-randomness.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
+        :param truth: The benign trajectory of the CAV (Trajectory).
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param perturbed_v: The perturbed reduced speed in the work zone (int).
         :param timestep: The timestep of the benign trajectory (int).
@@ -148,20 +444,24 @@ class Attack:
         :param seed: The seed of the benign trajectory. (int)
         :return: The perturbed trajectory.
         """
+        if self.decision == 'physics':
+            return self.collide(truth, RS.kind,
+                                lambda comm: self.perturb_rs_comm(comm.dist_to_WZ, perturbed_v, comm.len_of_WZ),
+                                v_init, timestep, duration, seed)
 
-        outcome = random.choice([0, 1])
+        outcome = self.rng.choice([0, 1])
         rs_comm, rs_idx, window, dist_to_WZ, reduced_speed, len_of_WZ = self.get_random_RS_info()
 
         if outcome == 0:
             # (1): Find one RS comm and perturb it. Everything other comm stays the same.
             # Create our perturbed v2i_comms
             self.v2i_comms[rs_idx] = self.perturb_rs_comm(dist_to_WZ, perturbed_v, len_of_WZ)
-            faulty = self.traj(v_init, timestep, duration, seed)
+            faulty = self.retrace(rs_idx, v_init, timestep, duration, seed)
             return faulty
         elif outcome == 1:
             # (2): Crash
             # If our perturbed v is less than the actual reduce speed in the work zone, no crash should happen.
-            if rs_comm.split(",")[2] >= perturbed_v:
+            if rs_comm.speed_limit >= perturbed_v:
                 return self.eq(truth)
             else:
                 return self.simulate_crash_rs(truth, window, rs_idx, v_init, timestep, duration, seed)
@@ -179,7 +479,7 @@ class Attack:
         3. The actual distance to the work zone is larger than the perturbed distance and this
            may or may not cause a crash thus we randomize the outcome.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
+        :param truth: The benign trajectory of the CAV (Trajectory).
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param perturbed_dist: The perturbed distance to the work zone (int).
         :param timestep: The timestep of the benign trajectory (int).
@@ -187,8 +487,12 @@ class Attack:
         :param seed: The seed of the benign trajectory. (int)
         :return: The perturbed trajectory.
         """
+        if self.decision == 'physics':
+            return self.collide(truth, RS.kind,
+                                lambda comm: self.perturb_rs_comm(perturbed_dist, comm.speed_limit, comm.len_of_WZ),
+                                v_init, timestep, duration, seed)
 
-        outcome = random.choice([0, 1])
+        outcome = self.rng.choice([0, 1])
         rs_comm, rs_idx, window, dist_to_WZ, reduced_speed, len_of_WZ = self.get_random_RS_info()
 
         if dist_to_WZ <= perturbed_dist or abs(dist_to_WZ - perturbed_dist - len_of_WZ) <= 10 or outcome == 0:
@@ -196,7 +500,7 @@ class Attack:
         else:
             # No crash but our trajectory is perturbed
             self.v2i_comms[rs_idx] = self.perturb_rs_comm(perturbed_dist, reduced_speed, len_of_WZ)
-            faulty = self.traj(v_init, timestep, duration, seed)
+            faulty = self.retrace(rs_idx, v_init, timestep, duration, seed)
             return faulty
 
     def lwz_rs(self, truth, v_init, perturbed_len, timestep, duration, seed):
@@ -207,7 +511,7 @@ class Attack:
         1. Crash because the perturbed distance/length is less than the actual distance/length.
         2. No crash because the perturbed distance/length is greater than the actual distance/length.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
+        :param truth: The benign trajectory of the CAV (Trajectory).
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param perturbed_len: The perturbed distance/length of the work zone (int).
         :param timestep: The timestep of the benign trajectory (int).
@@ -215,6 +519,10 @@ class Attack:
         :param seed: The seed of the benign trajectory (int).
         :return: The perturbed trajectory.
         """
+        if self.decision == 'physics':
+            return self.collide(truth, RS.kind,
+                                lambda comm: self.perturb_rs_comm(comm.dist_to_WZ, comm.speed_limit, perturbed_len),
+                                v_init, timestep, duration, seed)
 
         rs_comm, rs_idx, window, dist_to_WZ, reduced_speed, len_of_WZ = self.get_random_RS_info()
 
@@ -223,7 +531,7 @@ class Attack:
         else:
             # No crash but our trajectory is perturbed
             self.v2i_comms[rs_idx] = self.perturb_rs_comm(dist_to_WZ, reduced_speed, perturbed_len)
-            faulty = self.traj(v_init, timestep, duration, seed)
+            faulty = self.retrace(rs_idx, v_init, timestep, duration, seed)
             return faulty
 
     def rswz(self, truth, v_init, perturbed, timestep, duration, seed):
@@ -234,7 +542,7 @@ class Attack:
         1. Crash because the perturbed V2I communication is incorrect in every way.
         2. No crash by chance.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
+        :param truth: The benign trajectory of the CAV (Trajectory).
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param perturbed: The perturbed communication (list).
         :param timestep: The timestep of the benign trajectory (int).
@@ -242,7 +550,11 @@ class Attack:
         :param seed: The seed of the benign trajectory (int).
         :return: The perturbed trajectory.
         """
-        outcome = random.choice([0, 1])
+        if self.decision == 'physics':
+            return self.collide(truth, RS.kind, lambda comm: self.perturb_rs_comm(*perturbed),
+                                v_init, timestep, duration, seed)
+
+        outcome = self.rng.choice([0, 1])
         rs_comm, rs_idx, window, dist_to_WZ, reduced_speed, len_of_WZ = self.get_random_RS_info()
 
         if outcome == 0:
@@ -251,7 +563,7 @@ class Attack:
             # Unpack perturbed values
             perturbed_dist, perturbed_v, perturbed_len = perturbed
             self.v2i_comms[rs_idx] = self.perturb_rs_comm(perturbed_dist, perturbed_v, perturbed_len)
-            faulty = self.traj(v_init, timestep, duration, seed)
+            faulty = self.retrace(rs_idx, v_init, timestep, duration, seed)
             return faulty
 
     def dwz_stop(self, truth, v_init, perturbed_dist, timestep, duration, seed):
@@ -265,7 +577,7 @@ class Attack:
         3. Crash because the difference between the distances to the work zone is non-trivial.
 
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
+        :param truth: The benign trajectory of the CAV (Trajectory).
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param perturbed_dist: The perturbed distance to the work zone, in meters (int).
         :param timestep: The timestep of the benign trajectory (int).
@@ -273,6 +585,10 @@ class Attack:
         :param seed: The seed of the benign trajectory (int).
         :return: The perturbed trajectory.
         """
+        if self.decision == 'physics':
+            return self.collide(truth, S.kind, lambda comm: self.perturb_s_comm(perturbed_dist, comm.duration),
+                                v_init, timestep, duration, seed)
+
         _, stop_idx, window, dist_to_WZ, _ = self.get_random_S_info()
 
         if 0 < abs(dist_to_WZ - perturbed_dist) < 5:
@@ -289,7 +605,7 @@ class Attack:
         2. The perturbed duration of the stop is greater than the actual duration of the stop and 
         that may or may not cause a crash, so we decide the outcome randomly.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
+        :param truth: The benign trajectory of the CAV (Trajectory).
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param perturbed_dur: The perturbed duration of the stop at the work zone, in seconds (int).
         :param timestep: The timestep of the benign trajectory (int).
@@ -297,13 +613,17 @@ class Attack:
         :param seed: The seed of the benign trajectory (int).
         :return: The perturbed trajectory.
         """
-        outcome = random.choice([0, 1])
+        if self.decision == 'physics':
+            return self.collide(truth, S.kind, lambda comm: self.perturb_s_comm(comm.dist_to_WZ, perturbed_dur),
+                                v_init, timestep, duration, seed)
+
+        outcome = self.rng.choice([0, 1])
         stop_comm, stop_idx, window, dist_to_WZ, dur_of_WZ = self.get_random_S_info()
         if dur_of_WZ < perturbed_dur or perturbed_dur > dur_of_WZ and outcome == 0:
             return self.simulate_crash_s(truth, window, stop_idx, v_init, timestep, duration, seed)
         else:
             self.v2i_comms[stop_idx] = self.perturb_s_comm(dist_to_WZ, perturbed_dur)
-            faulty = self.traj(v_init, timestep, duration, seed)
+            faulty = self.retrace(stop_idx, v_init, timestep, duration, seed)
             return faulty
 
     def stop(self, truth, v_init, perturbed, timestep, duration, seed):
@@ -314,7 +634,7 @@ class Attack:
         1. Crash because the perturbed V2I communication is incorrect in every way.
         2. No crash by chance.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
+        :param truth: The benign trajectory of the CAV (Trajectory).
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param perturbed: The perturbed communications (list).
         :param timestep: The timestep of the benign trajectory (int).
@@ -322,8 +642,11 @@ class Attack:
         :param seed: The seed of the benign trajectory. (int)
         :return: The perturbed trajectory.
         """
+        if self.decision == 'physics':
+            return self.collide(truth, S.kind, lambda comm: self.perturb_s_comm(*perturbed),
+                                v_init, timestep, duration, seed)
 
-        outcome = random.choice([0, 1])
+        outcome = self.rng.choice([0, 1])
         stop_comm, stop_idx, window, dist_to_WZ, dur_of_WZ = self.get_random_S_info()
 
         if outcome == 0:
@@ -332,15 +655,15 @@ class Attack:
             # Unpack perturbed values
             perturbed_dist, perturbed_dur = perturbed
             self.v2i_comms[stop_idx] = self.perturb_s_comm(perturbed_dist, perturbed_dur)
-            faulty = self.traj(v_init, timestep, duration, seed)
+            faulty = self.retrace(stop_idx, v_init, timestep, duration, seed)
             return faulty
 
     def eq(self, truth):
         """
-        Return a copy of the truth trajectory as the faulty trajectory ends up becoming benign.
+        Return the truth trajectory as the faulty trajectory ends up becoming benign.
         
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
-        :return: Copy of the benign trajectory.
+        :param truth: The benign trajectory of the CAV (Trajectory).
+        :return: A copy of the benign trajectory, which shares no memory with it.
         """
 
         return truth.copy()
@@ -352,24 +675,27 @@ class Attack:
         Simulate a crash any time step i in between the time step values in window = (start, end) because of a faulty s
         communication. This selection will be random.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
-        :param window: The start and end time step of the V2I comm and the index where v = 0 (tuple).
+        :param truth: The benign trajectory of the CAV (Trajectory).
+        :param window: The start and end time step of the V2I comm and the index where v = 0, or None if the vehicle
+                       never read it (tuple).
         :param stop_idx: The index i within self.v2i_comms that contains a specific s communication.
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param timestep: The timestep of the benign trajectory (int).
         :param duration: The duration of the benign trajectory, in seconds (int).
         :param seed: The seed of the benign trajectory. (int)
-        :return: A pandas dataframe equal to the truth trajectory up until i when the crash occurs.
-        """
-        self.v2i_comms.pop(stop_idx)
-        faulty = self.traj(v_init, timestep, duration, seed)
+        :return: A trajectory equal to the truth trajectory up until i when the crash occurs, or a copy of the truth
+                 trajectory if the vehicle never read the communication.
+        """
+        # The vehicle ignores the s communication
+        self.v2i_comms[stop_idx] = None
+        faulty = self.retrace(stop_idx, v_init, timestep, duration, seed)
+        if window is None:
+            # The vehicle never read the communication, so ignoring it leaves the trajectory benign.
+            return faulty
         start, end, i_when_v_is_0 = window
-        i = random.randint(i_when_v_is_0, end)
+        i = self.rng.randint(i_when_v_is_0, end)
 
-        faulty.iloc[i:, 2] = 0
-        faulty.iloc[i:, 3] = 0
-        x_prev = truth.at[i - 1, "position"]
-        faulty.iloc[i:, 1] = x_prev
+        faulty.crash(i, truth.x[i - 1])
         return faulty
 
     def simulate_crash_rs(self, truth, window, rs_idx, v_init, timestep, duration, seed):
@@ -377,24 +703,71 @@ class Attack:
         Simulate a crash any time step i in between the time step values in window = (start, end) because of a faulty rs
         communication. This selection will be random.
 
-        :param truth: The benign trajectory of the CAV (Pandas DataFrame).
-        :param window: The start and end time step of the V2I comm and the index where v = 0 (tuple).
+        :param truth: The benign trajectory of the CAV (Trajectory).
+        :param window: The start and end time step of the V2I comm and the index where v = 0, or None if the vehicle
+                       never read it (tuple).
         :param rs_idx: The index i within self.v2i_comms that contains a specific s communication.
         :param v_init: The initial velocity of the vehicle, in m/s (int).
         :param timestep: The timestep of the benign trajectory (int).
         :param duration: The duration of the benign trajectory, in seconds (int).
         :param seed: The seed of the benign trajectory. (int)
-        :return: A pandas dataframe equal to the truth trajectory up until i when the crash occurs.
-        """
-        self.v2i_comms.pop(rs_idx)
-        faulty = self.traj(v_init, timestep, duration, seed)
+        :return: A trajectory equal to the truth trajectory up until i when the crash occurs, or a copy of the truth
+                 trajectory if the vehicle never read the communication.
+        """
+        # The vehicle ignores the rs communication
+        self.v2i_comms[rs_idx] = None
+        faulty = self.retrace(rs_idx, v_init, timestep, duration, seed)
+        if window is None:
+            # The vehicle never read the communication, so ignoring it leaves the trajectory benign.
+            return faulty
         start, end, i_when_v_is_des_v = window
-        i = random.randint(i_when_v_is_des_v, end)
+        i = self.rng.randint(i_when_v_is_des_v, end)
+
+        faulty.crash(i, truth.x[i - 1])
+        return faulty
+
+    def collide(self, truth, kind, tamper, v_init, timestep, duration, seed):
+        """
+        Return the faulty trajectory of the CAV after a random comm of the given kind was tampered with, where whether
+        and when the CAV crashes follow from its kinematics instead of chance. The CAV drives as the tampered comm tells
+        it to, while the actual work zone is where the benign CAV met it:
+
+        1. RS: the work zone starts where the benign CAV reached the speed limit and is len_of_WZ long. The CAV crashes
+           at the first time step it is within the work zone faster than the speed limit, or than the benign CAV ever
+           is within it, as at coarse timesteps the benign CAV itself may overshoot the limit.
+        2. S: the stop line is the farthest point the benign CAV reaches before the end of the stop. The CAV crashes at
+           the first time step it is past the stop line before the end of the stop, whether it did not slow down in
+           time or left too early.
+
+        Otherwise, the faulty trajectory is perturbed but safe. A comm the CAV never read leaves the trajectory benign.
+
+        :param truth: The benign trajectory of the CAV (Trajectory).
+        :param kind: The kind of communication, 'RS' or 'S' (str).
+        :param tamper: Return the tampered comm of the actual comm, None for a comm the CAV ignores (function).
+        :param v_init: The initial velocity of the vehicle, in m/s (int).
+        :param timestep: The timestep of the benign trajectory (int).
+        :param duration: The duration of the benign trajectory, in seconds (int).
+        :param seed: The seed of the benign trajectory (int).
+        :return: The perturbed trajectory.
+        """
+        comm, idx, window = self.get_random_comm(kind)
+        self.v2i_comms[idx] = tamper(comm)
+        faulty = self.retrace(idx, v_init, timestep, duration, seed)
+        if window is None:
+            return faulty
 
-        faulty.iloc[i:, 2] = 0
-        faulty.iloc[i:, 3] = 0
-        x_prev = truth.at[i - 1, "position"]
-        faulty.iloc[i:, 1] = x_prev
+        start, end, i_at_target = window
+        if isinstance(comm, RS):
+            x_start = truth.x[i_at_target - 1]
+            inside = (truth.x > x_start) & (truth.x < x_start + comm.len_of_WZ)
+            limit = max(comm.speed_limit, truth.v[inside].max(initial=0))
+            crashes = (faulty.x > x_start) & (faulty.x < x_start + comm.len_of_WZ) & (faulty.v > limit)
+        else:
+            crashes = faulty.x[:end] > truth.x[:end].max()
+
+        if crashes.any():
+            i = int(crashes.argmax())
+            faulty.crash(i, faulty.x[i - 1])
         return faulty
 
     def get_random_RS_comm(self):
@@ -404,21 +777,7 @@ class Attack:
         
         :return: Tuple containing all 3 values about the random rs communication.
         """
-        # Iteratively find an RS comm randomly within the v2i_comms
-        rs_comm = "_,_,_,_"
-        rs_idx_in_v2i = -1
-        window = None
-        while rs_comm.split(",")[0] != 'RS':
-            rs_idx_in_v2i = random.choice(np.arange(len(self.v2i_comms)))
-            rs_comm = self.v2i_comms[rs_idx_in_v2i]
-
-        # Find the respective start and end time of this comm within self.vehicle
-        for comm in self.vehicle.comms:
-            if comm[0] == rs_comm:
-                window = comm[1]
-                break
-
-        return rs_comm, rs_idx_in_v2i, window
+        return self.get_random_comm(RS.kind)
 
     def get_random_S_comm(self):
         """
@@ -427,22 +786,26 @@ class Attack:
         
         :return: Tuple containing all 3 values about the random s communication.
         """
-        # Iteratively find an S comm randomly within the v2i_comms
-        # WE ASSUME THERE EXIST ONE S comm within v2i_comms
-        stop_comm = "_,_,_"
-        stop_idx_in_v2i = -1
-        window = None
-        while stop_comm.split(",")[0] != 'S':
-            stop_idx_in_v2i = random.choice(np.arange(len(self.v2i_comms)))
-            stop_comm = self.v2i_comms[stop_idx_in_v2i]
+        return self.get_random_comm(S.kind)
 
-        # Find the respective index of this comm within self.vehicle
-        for comm in self.vehicle.comms:
-            if comm[0] == stop_comm:
-                window = comm[1]
-                break
+    def get_random_comm(self, kind):
+        """
+        Retrieve a random communication of the given kind within self.v2i_comms, alongside its respective time steps.
+        The comm is drawn as it always was, over every comm until one of the given kind comes up, so that the draws of
+        a seed are unchanged, and its window is looked up by its index in the windows the vehicle indexes as it reads
+        the comms (Vehicle.windows), so that duplicate comms keep their own window.
 
-        return stop_comm, stop_idx_in_v2i, window
+        :param kind: The kind of communication, 'RS' or 'S' (str).
+        :return: Tuple containing the communication, its index i in self.v2i_comms and its window, which is None if
+                 the vehicle never read that communication.
+        """
+        if not any(comm is not None and comm.kind == kind for comm in self.v2i_comms):
+            raise ValueError("There is no %s comm within v2i_comms." % kind)
+        comm = None
+        while comm is None or comm.kind != kind:
+            idx_in_v2i = self.rng.choice(range(len(self.v2i_comms)))
+            comm = self.v2i_comms[idx_in_v2i]
+        return comm, idx_in_v2i, self.vehicle.windows.get(idx_in_v2i)
 
     def get_random_RS_info(self):
         """
@@ -460,7 +823,7 @@ class Attack:
         # Get a random RS com randomly within v2i comms
         rs_comm, rs_idx_in_v2i, window = self.get_random_RS_comm()
         # Get information from rs_comm
-        dist_to_WZ, reduced_speed, len_of_WZ = map(int, rs_comm.split(",")[1:])
+        dist_to_WZ, reduced_speed, len_of_WZ = rs_comm
         return rs_comm, rs_idx_in_v2i, window, dist_to_WZ, reduced_speed, len_of_WZ
 
     def get_random_S_info(self):
@@ -478,7 +841,7 @@ class Attack:
         # Get a random RS com randomly within v2i comms
         stop_comm, stop_idx_in_v2i, window = self.get_random_S_comm()
         # Get information from stop_comm
-        dist_to_WZ, dur_of_WZ, = map(int, stop_comm.split(",")[1:])
+        dist_to_WZ, dur_of_WZ = stop_comm
         return stop_comm, stop_idx_in_v2i, window, dist_to_WZ, dur_of_WZ
 
     def perturb_rs_comm(self, dist_to_WZ, reduced_speed_of_WZ, len_of_WZ):
@@ -492,10 +855,9 @@ class Attack:
         :param dist_to_WZ: The distance to the work zone, in meters (int).
         :param reduced_speed_of_WZ: The reduced speed in the work zone, in m/s (int).
         :param len_of_WZ: The length/distance of the work zone, in meters (int).
-        :return: Perturbed V2I RS communication
+        :return: Perturbed V2I RS communication (RS).
         """
-        perturbed_comm = 'RS,' + str(dist_to_WZ) + ',' + str(reduced_speed_of_WZ) + ',' + str(len_of_WZ)
-        return perturbed_comm
+        return RS(dist_to_WZ, reduced_speed_of_WZ, len_of_WZ)
 
     def perturb_s_comm(self, dist_to_WZ, dur_of_WZ):
         """
@@ -506,7 +868,6 @@ class Attack:
 
         :param dist_to_WZ: The distance to the work zone, in meters (int).
         :param dur_of_WZ: The duration of the stop at the work zone, in seconds (int).
-        :return: The perturbed V2I s communication
+        :return: The perturbed V2I s communication (S).
         """
-        perturbed_comm = 'RS,' + str(dist_to_WZ) + ',' + str(dur_of_WZ)
-        return perturbed_comm
+        return S(dist_to_WZ, dur_of_WZ)
@@ -0,0 +1,192 @@
+import ast
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from vehicle.message import from_array, parse, to_array
+from vehicle.vehicle import NO_ACTION
+
+
+class TrajectoryCache:
+    """
+    A persistent cache of trajectories on disk. Every entry is addressed by a hash of all the parameters that generate
+    a trajectory and holds everything a Vehicle knows after generating it, so a hit restores the Vehicle as if the
+    trajectory had just been generated. Entries are .npz files, evicted least recently used first once the cache grows
+    beyond max_bytes.
+    """
+
+    # Bump whenever the trajectories generated for the same parameters, or the layout of the entries, change.
+    version = 6
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        """
+        The constructor for the trajectory cache.
+
+        :param directory: The directory the entries are stored in, created if missing (str).
+        :param max_bytes: The maximum size of the cache, in bytes (int).
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = sum(size for _, _, size in self.entries())
+
+    def key(self, vehicle, v_init, timestep, duration, v2i_comms, seed, offsets=None):
+        """
+        Return the key of a trajectory of the vehicle.
+
+        :param vehicle: The vehicle of the trajectory (Vehicle).
+        :param v_init: The initial velocity of the vehicle, in m/s (int).
+        :param timestep: The timestep of the trip (int).
+        :param duration: The duration of the trip, in seconds (int).
+        :param v2i_comms: V2I communications, as strings or messages (list).
+        :param seed: The seed of the trip (int).
+        :param offsets: The time steps at which the V2I comms are passed in, if not drawn at random (list).
+        :return: The hex digest of the parameters (str).
+        """
+        if offsets is not None:
+            offsets = tuple(int(offset) for offset in offsets)
+        params = (self.version, vehicle.v_max, vehicle.a_max, vehicle.overlap, vehicle.speed_up, v_init, timestep,
+                  duration, tuple(map(parse, v2i_comms)), seed, offsets)
+        return hashlib.sha256(repr(params).encode()).hexdigest()
+
+    def path(self, key):
+        """
+        Return the path of the entry with the given key.
+
+        :param key: The key of the entry (str).
+        :return: The path of the entry (str).
+        """
+        return os.path.join(self.directory, key + '.npz')
+
+    def entries(self):
+        """
+        Return every entry of the cache.
+
+        :return: A list of (time of last use, path, size in bytes) tuples.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def load(self, vehicle, key):
+        """
+        Restore the trajectory with the given key into the vehicle.
+
+        :param vehicle: The vehicle to restore the trajectory into (Vehicle).
+        :param key: The key of the trajectory (str).
+        :return: Whether the trajectory was in the cache (bool).
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                entry = dict(data)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return False
+
+        vehicle.cache = dict({'t': entry['t'], 'x': entry['x'], 'v': entry['v'], 'a': entry['a']})
+        vehicle.comms, vehicle.ids, vehicle.windows = [], {}, {}
+        for k, comm, window in zip(entry['ids'], from_array(entry['comms']), entry['windows']):
+            vehicle.record(int(k), comm, tuple(int(i) for i in window))
+        v_init, timestep, duration, seed = (ast.literal_eval(str(param)) for param in entry['params'])
+        vehicle.trip = dict({'v_init': v_init, 'timestep': timestep, 'duration': duration, 'seed': seed,
+                             'ran_t_start': int(entry['phases'][0]),
+                             'ran_t_end': int(entry['phases'][1]), 'arrivals': entry['arrivals'].tolist()})
+        vehicle.checkpoints = {}
+        for (k, i, counter, n_comms, cursor), action, state in zip(entry['checkpoints'], entry['actions'],
+                                                                   entry['states']):
+            vehicle.checkpoints[int(k)] = (int(i), int(counter), int(action), unpack_state(state), int(n_comms),
+                                           int(cursor))
+        vehicle.prev_action = NO_ACTION
+        vehicle.rng.setstate(unpack_state(entry['rng']))
+        return True
+
+    def save(self, vehicle, key):
+        """
+        Store the most recent trajectory of the vehicle under the given key and evict the least recently used entries
+        if the cache grew beyond its maximum size.
+
+        :param vehicle: The vehicle whose most recent trajectory to store (Vehicle).
+        :param key: The key of the trajectory (str).
+        """
+        trip = vehicle.trip
+        checkpoints = [(k,) + vehicle.checkpoints[k] for k in sorted(vehicle.checkpoints)]
+        ids = {window: k for k, window in vehicle.windows.items()}
+        entry = dict({
+            't': vehicle.cache['t'],
+            'x': vehicle.cache['x'],
+            'v': vehicle.cache['v'],
+            'a': vehicle.cache['a'],
+            'comms': to_array([comm for comm, _ in vehicle.comms]),
+            'windows': np.array([window for _, window in vehicle.comms], dtype=np.int64).reshape(-1, 3),
+            'ids': np.array([ids[window] for _, window in vehicle.comms], dtype=np.int64),
+            'params': np.array([repr(trip[name]) for name in ('v_init', 'timestep', 'duration', 'seed')]),
+            'phases': np.array([trip['ran_t_start'], trip['ran_t_end']], dtype=np.int64),
+            'arrivals': np.array(trip['arrivals'], dtype=np.int64),
+            'checkpoints': np.array([(k, i, counter, n_comms, cursor)
+                                     for k, i, counter, _, _, n_comms, cursor in checkpoints],
+                                    dtype=np.int64).reshape(-1, 5),
+            'actions': np.array([action for _, _, _, action, _, _, _ in checkpoints], dtype=np.int64),
+            'states': np.array([pack_state(state) for _, _, _, _, state, _, _ in checkpoints],
+                               dtype=np.uint32).reshape(-1, 625),
+            'rng': pack_state(vehicle.rng.getstate()),
+        })
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **entry)
+        path = self.path(key)
+        # An entry saved again under the same key replaces the one already counted in the size of the cache.
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp, path)
+
+        self.size += os.path.getsize(path) - replaced
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits within its maximum size.
+        """
+        entries = sorted(self.entries())
+        self.size = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+
+def pack_state(state):
+    """
+    Return the state of a random.Random as an array of 625 uint32.
+
+    :param state: The state returned by random.Random.getstate (tuple).
+    :return: The internal state of the Mersenne Twister (np.ndarray).
+    """
+    return np.array(state[1], dtype=np.uint32)
+
+
+def unpack_state(packed):
+    """
+    Return the state of a random.Random from an array packed by pack_state.
+
+    :param packed: The internal state of the Mersenne Twister (np.ndarray).
+    :return: The state to pass to random.Random.setstate (tuple).
+    """
+    return 3, tuple(int(word) for word in packed), None
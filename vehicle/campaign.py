@@ -0,0 +1,130 @@
+import itertools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from vehicle.attack import Attack, SCENARIOS
+from vehicle.cache import TrajectoryCache
+from vehicle.stats import Stats
+
+# A single attack scenario to evaluate and its outcome, with the V2I comms read during the benign trajectory and the
+# stats of the vehicle if it was instrumented (see Stats.total to aggregate them).
+Job = namedtuple('Job', ['scenario', 'seed', 'v_init', 'timestep', 'duration', 'perturbed'])
+Result = namedtuple('Result', ['job', 'faulty', 'benign', 'error', 'comms', 'stats'], defaults=(None, None))
+
+
+def grid(scenarios, seeds, v_inits, timesteps, durations, perturbations=None):
+    """
+    Yields every job of the cartesian product of the given parameters.
+
+    :param scenarios: The attack scenarios to execute (list).
+    :param seeds: The seeds of the benign trajectories (list).
+    :param v_inits: The initial velocities of the vehicle, in m/s (list).
+    :param timesteps: The timesteps of the benign trajectories (list).
+    :param durations: The durations of the benign trajectories, in seconds (list).
+    :param perturbations: The perturbed values to try for each scenario, scenarios without an entry are run once with
+                          no perturbed value (dict).
+    :return: A generator of jobs.
+    """
+    perturbations = perturbations or {}
+    for scenario, seed, v_init, timestep, duration in itertools.product(scenarios, seeds, v_inits, timesteps,
+                                                                        durations):
+        for perturbed in perturbations.get(scenario, [None]):
+            yield Job(scenario, seed, v_init, timestep, duration, perturbed)
+
+
+def plan(jobs):
+    """
+    Return the jobs of a campaign ready to be batched: their perturbed values are checked against the declaration of
+    their scenario (see SCENARIOS), duplicates are dropped and the jobs that share a benign trajectory are put next to
+    each other, in the order their benign trajectories first appear. The jobs are read all at once.
+
+    :param jobs: The jobs to plan (iterable).
+    :return: The planned jobs (list).
+    """
+    groups = {}
+    for job in jobs:
+        if job.scenario not in SCENARIOS:
+            raise ValueError("Unknown attack scenario %r." % (job.scenario,))
+        job = job._replace(perturbed=SCENARIOS[job.scenario].check(job.perturbed))
+        groups.setdefault((job.seed, job.v_init, job.timestep, job.duration), {})[job] = None
+    return [job for group in groups.values() for job in group]
+
+
+def run_jobs(v_max, a_max, jobs, cache_dir=None, cache_bytes=1 << 30, decision='random', instrument=False):
+    """
+    Evaluates a chunk of jobs within a worker. Consecutive jobs that share a benign trajectory are evaluated together
+    from a single benign trajectory (see Attack.evaluate_many), so planned jobs (see plan) are batched. Every batch
+    builds its own Attack, and therefore its own Vehicle, and the stats of a batch go with its first result.
+
+    :param v_max: The maximum velocity of the vehicle, in m/s (int).
+    :param a_max: The maximum acceleration of the vehicle, in m/s^2 (int).
+    :param jobs: The jobs to evaluate (list).
+    :param cache_dir: An optional directory of benign trajectories cached on disk (str).
+    :param cache_bytes: The maximum size of the cache on disk, in bytes (int).
+    :param decision: How the attacks decide whether the CAV crashes and when, 'random' or 'physics' (str).
+    :param instrument: Whether to record the Stats of the vehicle of every job (bool).
+    :return: The results of the jobs (list).
+    """
+    disk_cache = TrajectoryCache(cache_dir, cache_bytes) if cache_dir is not None else None
+    results = []
+    for (seed, v_init, timestep, duration), batch in itertools.groupby(
+            jobs, lambda job: (job.seed, job.v_init, job.timestep, job.duration)):
+        batch = list(batch)
+        attack = Attack(v_max, a_max, disk_cache, decision=decision)
+        stats = attack.vehicle.stats = Stats() if instrument else None
+        try:
+            benign, faulty = attack.evaluate_many(v_init, timestep, duration, seed,
+                                                  [(job.scenario, job.perturbed) for job in batch])
+        except Exception as e:
+            results.extend(Result(job, None, None, repr(e), None, stats if k == 0 else None)
+                           for k, job in enumerate(batch))
+            continue
+        for k, (job, (trajectory, error)) in enumerate(zip(batch, faulty)):
+            if error is None:
+                results.append(Result(job, trajectory, benign, None, attack.benign_comms, stats if k == 0 else None))
+            else:
+                results.append(Result(job, None, None, repr(error), None, stats if k == 0 else None))
+    return results
+
+
+def campaign(jobs, v_max, a_max, max_workers=None, chunksize=64, max_pending=None, cache_dir=None,
+             cache_bytes=1 << 30, decision='random', instrument=False):
+    """
+    Evaluates the jobs of an attack campaign over a pool of processes and yields the results as they finish, in no
+    particular order. Jobs are submitted in chunks of chunksize and at most max_pending chunks are in flight at once,
+    so jobs may be a lazy iterable of any size. A job that raises is reported with its error instead of trajectories.
+
+    :param jobs: The jobs to evaluate (iterable).
+    :param v_max: The maximum velocity of the vehicle, in m/s (int).
+    :param a_max: The maximum acceleration of the vehicle, in m/s^2 (int).
+    :param max_workers: The number of worker processes, defaults to the number of CPUs (int).
+    :param chunksize: The number of jobs submitted to a worker at once (int).
+    :param max_pending: The number of chunks in flight, defaults to twice the number of workers (int).
+    :param cache_dir: An optional directory of benign trajectories cached on disk and shared by the workers (str).
+    :param cache_bytes: The maximum size of the cache on disk, in bytes (int).
+    :param decision: How the attacks decide whether the CAV crashes and when, 'random' or 'physics' (str).
+    :param instrument: Whether to record the Stats of the vehicle of every job (bool).
+    :return: A generator of results.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    jobs = iter(jobs)
+    exhausted = False
+    pending = set()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                chunk = list(itertools.islice(jobs, chunksize))
+                if chunk:
+                    pending.add(pool.submit(run_jobs, v_max, a_max, chunk, cache_dir, cache_bytes, decision,
+                                             instrument))
+                else:
+                    exhausted = True
+
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
@@ -0,0 +1,230 @@
+import asyncio
+import itertools
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from vehicle.message import parse
+from vehicle.stream import Stream
+from vehicle.vehicle import Vehicle
+
+# A V2I comm as broadcast by an RSU: its sequence number, the time of the trip it is passed in at, in seconds, the comm
+# and when it was first published, from time.perf_counter. A broadcast of None ends the feed.
+Broadcast = namedtuple('Broadcast', ['seq', 'time', 'comm', 'sent'])
+
+# The measures of a feed: the number of vehicles, of comms published by the RSU, of comms dropped as the queue of a
+# vehicle was full and of comms delivered to and handled by the vehicles, the wall time and throughput (comms handled
+# per second) of the feed, and the 50th, 90th, 99th percentile and maximum latencies, in seconds, from publishing a
+# comm to its delivery and to the vehicle driving past it.
+Report = namedtuple('Report', ['vehicles', 'published', 'dropped', 'delivered', 'handled', 'seconds', 'throughput',
+                               'delivery', 'handling'])
+
+PERCENTILES = (50, 90, 99, 100)
+
+
+class RSU:
+    """
+    An in-process stand-in for a roadside unit: every comm it publishes is broadcast to every subscriber's queue, with
+    the time of the trip it applies at.
+    """
+
+    def __init__(self):
+        """
+        The constructor for an RSU without subscribers.
+        """
+        self.subscribers = []  # self.subscribers = [(queue, maxsize)]
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, maxsize=0):
+        """
+        Return a queue the broadcasts of the RSU are put in.
+
+        :param maxsize: The number of broadcasts the queue holds before they are dropped, 0 for no limit (int).
+        :return: The queue (asyncio.Queue).
+        """
+        queue = asyncio.Queue()
+        self.subscribers.append((queue, maxsize))
+        return queue
+
+    def publish(self, broadcast):
+        """
+        Broadcast to every subscriber, dropping the broadcast for subscribers whose queue is full.
+
+        :param broadcast: The broadcast (Broadcast).
+        """
+        self.published += 1
+        for queue, maxsize in self.subscribers:
+            if maxsize and queue.qsize() >= maxsize:
+                self.dropped += 1
+            else:
+                queue.put_nowait(broadcast)
+
+    async def serve(self, comms, times, period=0):
+        """
+        Publishes V2I comms in order, then ends the feed.
+
+        :param comms: The V2I comms (list).
+        :param times: The time of the trip each comm is passed in at, in seconds (list).
+        :param period: The wall time between two comms, in seconds (float).
+        """
+        assert len(comms) == len(times), "Every V2I comm needs a time."
+        for seq, (comm, at) in enumerate(zip(comms, times)):
+            self.publish(Broadcast(seq, float(at), parse(comm), time.perf_counter()))
+            await asyncio.sleep(period)
+        self.close()
+
+    def close(self):
+        """
+        Ends the feed of every subscriber, even one whose queue is full.
+        """
+        for queue, _ in self.subscribers:
+            queue.put_nowait(Broadcast(None, None, None, time.perf_counter()))
+
+
+def tampering(kind=None, **fields):
+    """
+    A HoF that will return a man-in-the-middle tampering of the comms: every field of fields is set on the comms that
+    have it, such as the speed limit of an RS comm or the distance to the work zone of any comm.
+
+    :param kind: The kind of comm to tamper with, 'RS' or 'S', or None for both (str).
+    :param fields: The tampered values by field name.
+    :return: A function of a comm to its tampered comm.
+    """
+    def tamper(comm):
+        if kind is not None and comm.kind != kind:
+            return comm
+        return comm._replace(**{field: value for field, value in fields.items() if field in comm._fields})
+    return tamper
+
+
+async def mitm(upstream, downstream, tamper):
+    """
+    A man in the middle between an RSU and the vehicles: every broadcast of the RSU is tampered with and published again
+    on a rogue RSU, keeping when it was first published so that the latencies cover both hops. A comm tampered into
+    None is withheld from the vehicles.
+
+    :param upstream: The subscription to the RSU (asyncio.Queue).
+    :param downstream: The rogue RSU the vehicles subscribe to (RSU).
+    :param tamper: A function of a comm to its tampered comm or None (function).
+    """
+    while True:
+        broadcast = await upstream.get()
+        if broadcast.comm is None:
+            downstream.close()
+            return
+        comm = tamper(broadcast.comm)
+        if comm is not None:
+            downstream.publish(broadcast._replace(comm=comm))
+
+
+async def consume(stream, inbox, delivery, handling):
+    """
+    A vehicle consuming the feed: it drives its stream one chunk at a time and passes every comm it is delivered in at
+    the time step of the comm, or at its next time step if it is already past it. A comm is handled once the vehicle
+    has driven past its time step. A vehicle with a trip of a given duration drives until the end of its trip, and any
+    other until the feed ends and it has handled every comm.
+
+    :param stream: The trip of the vehicle (Stream).
+    :param inbox: The subscription of the vehicle to its RSU (asyncio.Queue).
+    :param delivery: The delivery latencies, appended to (list).
+    :param handling: The handling latencies, appended to (list).
+    """
+    pending = []  # pending = [(time step, when the comm was published)]
+    ended = False
+    while True:
+        while not inbox.empty():
+            broadcast = inbox.get_nowait()
+            if broadcast.comm is None:
+                ended = True
+                continue
+            delivery.append(time.perf_counter() - broadcast.sent)
+            step = max(int(round(broadcast.time / stream.tau)), stream.i)
+            stream.inject(broadcast.comm, step)
+            pending.append((step, broadcast.sent))
+
+        if ended and not pending and stream.N is None:
+            return
+        try:
+            next(stream)
+        except StopIteration:
+            return
+
+        if pending:
+            now = time.perf_counter()
+            handling.extend(now - sent for step, sent in pending if step < stream.i)
+            pending = [(step, sent) for step, sent in pending if step >= stream.i]
+        # Let the RSU and the other vehicles run.
+        await asyncio.sleep(0)
+
+
+async def simulate(n_vehicles, comms, times, v_max=70, a_max=4, timestep=0.1, duration=None, chunk_size=1000,
+                   tamper=None, period=0, maxsize=0, seed=0):
+    """
+    Feeds V2I comms from an RSU to many concurrent vehicles, through a man in the middle if there is a tampering, and
+    measures the latency and throughput of the feed.
+
+    :param n_vehicles: The number of vehicles (int).
+    :param comms: The V2I comms the RSU publishes (list).
+    :param times: The time of the trip each comm is passed in at, in seconds (list).
+    :param v_max: The maximum velocity of the vehicles (int).
+    :param a_max: The maximum acceleration of the vehicles (int).
+    :param timestep: The timestep of the trips (float).
+    :param duration: The duration of the trips, in seconds, or None for trips that last as long as the feed (int).
+    :param chunk_size: The number of time steps a vehicle drives between two reads of its queue (int).
+    :param tamper: A function of a comm to its tampered comm or None, run as a man in the middle (function).
+    :param period: The wall time between two comms of the RSU, in seconds (float).
+    :param maxsize: The number of broadcasts the queue of a vehicle holds before they are dropped, 0 for no limit (int).
+    :param seed: The seed of the first vehicle, the others taking the next ones that can be driven (int).
+    :return: The measures of the feed (Report).
+    """
+    rsu = RSU()
+    vehicles = rsu
+    tasks = []
+    if tamper is not None:
+        vehicles = RSU()
+        tasks.append(mitm(rsu.subscribe(), vehicles, tamper))
+    delivery, handling = [], []
+    seeds = itertools.count(seed)
+    for _ in range(n_vehicles):
+        stream = None
+        while stream is None:
+            try:
+                stream = Stream(Vehicle(v_max, a_max), 1, timestep, chunk_size, seed=next(seeds), duration=duration)
+            except TypeError:
+                # The acceleration scenario of some seeds cannot be drawn (see Vehicle.acc_acc).
+                pass
+        inbox = vehicles.subscribe(maxsize)
+        tasks.append(consume(stream, inbox, delivery, handling))
+
+    start = time.perf_counter()
+    await asyncio.gather(rsu.serve(comms, times, period), *tasks)
+    seconds = time.perf_counter() - start
+    return Report(n_vehicles, rsu.published, vehicles.dropped, len(delivery), len(handling), seconds,
+                  len(handling) / seconds, percentiles(delivery), percentiles(handling))
+
+
+def percentiles(latencies):
+    """
+    Return the PERCENTILES of latencies.
+
+    :param latencies: The latencies, in seconds (list).
+    :return: The percentiles, NaN without any latency (np.ndarray).
+    """
+    if not latencies:
+        return np.full(len(PERCENTILES), np.nan)
+    return np.percentile(latencies, PERCENTILES)
+
+
+def run(n_vehicles, comms, times, **kwargs):
+    """
+    Runs simulate in a new event loop.
+
+    :param n_vehicles: The number of vehicles (int).
+    :param comms: The V2I comms the RSU publishes (list).
+    :param times: The time of the trip each comm is passed in at, in seconds (list).
+    :param kwargs: The keyword arguments of simulate.
+    :return: The measures of the feed (Report).
+    """
+    return asyncio.run(simulate(n_vehicles, comms, times, **kwargs))
@@ -0,0 +1,51 @@
+import numpy as np
+
+# Numba is optional: without it, the kernels below run as plain Python and Vehicle falls back to its numpy backend.
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def integrate_steps(x, v, a, start, stop, tau, tau_sq, clamp):
+    """
+    Integrates the trajectory over time steps [start, stop) one time step at a time, with
+    x[i] = x[i - 1] + tau * v[i - 1] + (0.5 * a[i] * (tau ** 2)) and v[i] = v[i - 1] + tau * a[i]. Every operand is a
+    float32, so the result is identical to the numpy backend (see vehicle.vehicle.integrate).
+
+    :param x: The position array of the trip (np.ndarray).
+    :param v: The velocity array of the trip (np.ndarray).
+    :param a: The acceleration array of the trip (np.ndarray).
+    :param start: The first time step to integrate (int).
+    :param stop: The time step after the last one to integrate (int).
+    :param tau: The timestep of the trip (np.float32).
+    :param tau_sq: The square of the timestep of the trip (np.float32).
+    :param clamp: Whether a velocity that is not positive is set to 0 to represent a stop (bool).
+    """
+    half = np.float32(0.5)
+    for i in range(start, stop):
+        v_i = v[i - 1] + tau * a[i]
+        if clamp and not v_i > 0:
+            v_i = np.float32(0)
+        x[i] = (x[i - 1] + tau * v[i - 1]) + (half * a[i]) * tau_sq
+        v[i] = v_i
+
+
+if numba is not None:
+    integrate_steps = numba.njit(cache=True, nogil=True)(integrate_steps)
+
+
+def integrate(x, v, a, start, stop, tau, clamp=False):
+    """
+    Integrates the trajectory over time steps [start, stop) with the compiled kernel. Takes the same arguments as
+    vehicle.vehicle.integrate.
+
+    :param x: The position array of the trip (np.ndarray).
+    :param v: The velocity array of the trip (np.ndarray).
+    :param a: The acceleration array of the trip (np.ndarray).
+    :param start: The first time step to integrate (int).
+    :param stop: The time step after the last one to integrate (int).
+    :param tau: The timestep of the trip (int).
+    :param clamp: Whether a velocity that is not positive is set to 0 to represent a stop (bool).
+    """
+    integrate_steps(x, v, a, start, stop, np.float32(tau), np.float32(tau ** 2), clamp)
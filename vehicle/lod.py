@@ -0,0 +1,142 @@
+import numpy as np
+
+
+def envelope(y, n_bins, start=0, stop=None):
+    """
+    Return the time steps of y over [start, stop) to draw at a resolution of n_bins, typically one bin per pixel. Every
+    bin keeps its first, last, smallest and largest values, which is all a line drawn over a single pixel column shows,
+    and both sides of its steepest step, so that a crash or a stop keeps the exact time step it happens at.
+
+    :param y: The values of a column of a trajectory (np.ndarray).
+    :param n_bins: The number of bins (int).
+    :param start: The first time step (int).
+    :param stop: The time step after the last one, defaults to the end of y (int).
+    :return: The sorted time steps to keep (np.ndarray).
+    """
+    stop = len(y) if stop is None else stop
+    n = stop - start
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+    size = -(-n // max(int(n_bins), 1))
+    if size <= 3:
+        return np.arange(start, stop)
+
+    n_bins = -(-n // size)
+    # The last bin is padded with its last value, which then never adds a time step of its own.
+    values = np.empty(n_bins * size, dtype=y.dtype)
+    values[:n] = y[start:stop]
+    values[n:] = y[stop - 1]
+    values = values.reshape(n_bins, size)
+    steps = np.zeros(n_bins * size, dtype=values.dtype)
+    steps[:n - 1] = np.abs(np.diff(y[start:stop]))
+    steps = steps.reshape(n_bins, size)
+
+    offsets = np.arange(n_bins) * size
+    steepest = offsets + steps.argmax(axis=1)
+    kept = np.concatenate((offsets, offsets + (size - 1), offsets + values.argmin(axis=1),
+                           offsets + values.argmax(axis=1), steepest, steepest + 1))
+    return start + np.unique(np.minimum(kept, n - 1))
+
+
+def decimate(trajectory, column, n_bins, start=0, stop=None):
+    """
+    Return the time and the values of a column of a trajectory over [start, stop), down-sampled to n_bins envelopes.
+
+    :param trajectory: The trajectory (Trajectory or pandas DataFrame).
+    :param column: The name of the column (str).
+    :param n_bins: The number of bins (int).
+    :param start: The first time step (int).
+    :param stop: The time step after the last one (int).
+    :return: Tuple containing the time (np.ndarray) and the values (np.ndarray) to draw.
+    """
+    t, y = np.asarray(trajectory['time']), np.asarray(trajectory[column])
+    kept = envelope(y, n_bins, start, stop)
+    return t[kept], y[kept]
+
+
+class Pyramid:
+    """
+    Multi-resolution envelopes of the columns of a trajectory, so that any time window of a long, fine-timestep
+    trajectory can be drawn at the resolution of a screen without walking all of its time steps. Level k keeps the
+    envelope of every bin of factor ** k time steps. A pyramid can be saved next to its trajectory and loaded back.
+    """
+
+    def __init__(self, trajectory, columns=('position', 'velocity', 'acceleration'), factor=4, min_bins=256,
+                 levels=None):
+        """
+        The constructor for the pyramid.
+
+        :param trajectory: The trajectory (Trajectory or pandas DataFrame).
+        :param columns: The names of the columns to build envelopes of (tuple).
+        :param factor: The number of bins of a level per bin of the next, coarser level (int).
+        :param min_bins: The number of bins under which there are no coarser levels (int).
+        :param levels: The time steps kept by each level, as built by a pyramid, instead of building them (list).
+        """
+        assert factor >= 2, "The factor of a pyramid must be at least 2"
+        self.trajectory = trajectory
+        self.t = np.asarray(trajectory['time'])
+        self.factor = factor
+        if levels is None:
+            levels = []
+            size = factor
+            while len(self.t) // size >= min_bins:
+                levels.append({column: envelope(np.asarray(trajectory[column]), -(-len(self.t) // size))
+                               for column in columns})
+                size *= factor
+        self.levels = levels
+
+    def __getitem__(self, name):
+        return self.trajectory[name]
+
+    def query(self, column, n_bins, t_start=None, t_end=None):
+        """
+        Return the time and the values of a column to draw over [t_start, t_end] at a resolution of n_bins, from the
+        coarsest level that still has a bin per bin of the window.
+
+        :param column: The name of the column (str).
+        :param n_bins: The number of bins, typically the width of the plot in pixels (int).
+        :param t_start: The start of the window, in seconds, defaults to the start of the trajectory (float).
+        :param t_end: The end of the window, in seconds, defaults to the end of the trajectory (float).
+        :return: Tuple containing the time (np.ndarray) and the values (np.ndarray) to draw.
+        """
+        # The time steps just outside the window are kept, so that the line runs up to its edges.
+        start = 0 if t_start is None else max(int(np.searchsorted(self.t, t_start, side='right')) - 1, 0)
+        stop = len(self.t) if t_end is None else min(int(np.searchsorted(self.t, t_end, side='left')) + 1, len(self.t))
+        y = np.asarray(self.trajectory[column])
+
+        level = 0
+        while level < len(self.levels) and self.factor ** (level + 1) * n_bins <= stop - start:
+            level += 1
+        if level == 0:
+            kept = envelope(y, n_bins, start, stop)
+        else:
+            steps = self.levels[level - 1][column]
+            steps = steps[np.searchsorted(steps, start):np.searchsorted(steps, stop)]
+            kept = steps[envelope(y[steps], n_bins)]
+        return self.t[kept], y[kept]
+
+    def save(self, path):
+        """
+        Saves the levels of the pyramid.
+
+        :param path: The path of the .npz file (str).
+        """
+        arrays = {'%d/%s' % (k, column): steps for k, level in enumerate(self.levels) for column, steps in level.items()}
+        np.savez(path, factor=self.factor, n_levels=len(self.levels), **arrays)
+
+    @classmethod
+    def load(cls, path, trajectory):
+        """
+        Return the pyramid of a trajectory saved with save.
+
+        :param path: The path of the .npz file (str).
+        :param trajectory: The trajectory of the pyramid (Trajectory or pandas DataFrame).
+        :return: The pyramid (Pyramid).
+        """
+        with np.load(path) as data:
+            levels = [{} for _ in range(int(data['n_levels']))]
+            for name in data.files:
+                if '/' in name:
+                    k, column = name.split('/')
+                    levels[int(k)][column] = data[name]
+            return cls(trajectory, factor=int(data['factor']), levels=levels)
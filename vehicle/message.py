@@ -0,0 +1,128 @@
+from collections import namedtuple
+
+import numpy as np
+
+# The V2I messages as records of integers, one row per message, for consumers that work on arrays. Fields a kind of
+# message does not have are 0.
+MESSAGE = np.dtype([('kind', 'U2'), ('dist_to_WZ', '<i8'), ('speed_limit', '<i8'), ('len_of_WZ', '<i8'),
+                    ('duration', '<i8')])
+
+
+class RS(namedtuple('RS', ['dist_to_WZ', 'speed_limit', 'len_of_WZ'])):
+    """
+    A V2I message announcing a reduced speed work zone (RSWZ): the CAV slows down to the speed limit before the work
+    zone and traverses it at that speed. Written "RS,dist_to_WZ,speed_limit,len_of_WZ" as a string.
+    """
+
+    __slots__ = ()
+
+    kind = 'RS'
+
+    def __new__(cls, dist_to_WZ, speed_limit, len_of_WZ):
+        """
+        The constructor for the message.
+
+        :param dist_to_WZ: The distance to the work zone, in meters (int).
+        :param speed_limit: The reduced speed in the work zone, in m/s (int).
+        :param len_of_WZ: The length of the work zone, in meters (int).
+        """
+        return super().__new__(cls, as_int('dist_to_WZ', dist_to_WZ, 1), as_int('speed_limit', speed_limit, 0),
+                               as_int('len_of_WZ', len_of_WZ, 0))
+
+    def __str__(self):
+        return '%s,%d,%d,%d' % ((self.kind,) + tuple(self))
+
+
+class S(namedtuple('S', ['dist_to_WZ', 'duration'])):
+    """
+    A V2I message announcing a stop at a work zone: the CAV comes to a stop before the work zone and stands still for
+    the duration of the stop. Written "S,dist_to_WZ,duration" as a string.
+    """
+
+    __slots__ = ()
+
+    kind = 'S'
+
+    def __new__(cls, dist_to_WZ, duration):
+        """
+        The constructor for the message.
+
+        :param dist_to_WZ: The distance to the work zone, in meters (int).
+        :param duration: The duration of the stop, in seconds (int).
+        """
+        return super().__new__(cls, as_int('dist_to_WZ', dist_to_WZ, 1), as_int('duration', duration, 0))
+
+    def __str__(self):
+        return '%s,%d,%d' % ((self.kind,) + tuple(self))
+
+
+# The kinds of V2I messages by their prefix.
+KINDS = {RS.kind: RS, S.kind: S}
+
+
+def as_int(name, value, minimum):
+    """
+    Return a field of a message as an int, checking that it is a whole number of at least minimum.
+
+    :param name: The name of the field (str).
+    :param value: The value of the field.
+    :param minimum: The smallest value the field may take (int).
+    :return: The value of the field (int).
+    """
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("%s must be an integer, got %r." % (name, value)) from None
+    if number != value and not isinstance(value, str):
+        raise ValueError("%s must be an integer, got %r." % (name, value))
+    if number < minimum:
+        raise ValueError("%s must be at least %d, got %r." % (name, minimum, value))
+    return number
+
+
+def parse(comm):
+    """
+    Return a V2I message parsed from its string, such as "RS,100,10,500" or "S,100,20". Messages and None (a comm the
+    CAV ignores) are returned as they are.
+
+    :param comm: The V2I communication (str, RS, S or None).
+    :return: The V2I message (RS, S or None).
+    """
+    if comm is None or isinstance(comm, (RS, S)):
+        return comm
+    kind, *fields = comm.split(",")
+    if kind not in KINDS:
+        raise ValueError("Unknown V2I message %r." % comm)
+    cls = KINDS[kind]
+    if len(fields) != len(cls._fields):
+        raise ValueError("A %s message has %d fields, got %r." % (kind, len(cls._fields), comm))
+    return cls(*fields)
+
+
+def to_array(messages):
+    """
+    Return V2I messages as an array of MESSAGE records.
+
+    :param messages: The V2I messages (list).
+    :return: The records of the messages (np.ndarray).
+    """
+    records = np.zeros(len(messages), dtype=MESSAGE)
+    for k, message in enumerate(map(parse, messages)):
+        records[k]['kind'] = message.kind
+        for field, value in zip(message._fields, message):
+            records[k][field] = value
+    return records
+
+
+def from_array(records):
+    """
+    Return the V2I messages of an array of MESSAGE records.
+
+    :param records: The records of the messages (np.ndarray).
+    :return: The V2I messages (list).
+    """
+    messages = []
+    for record in records:
+        cls = KINDS[str(record['kind'])]
+        messages.append(cls(*(int(record[field]) for field in cls._fields)))
+    return messages
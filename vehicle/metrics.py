@@ -0,0 +1,263 @@
+import numpy as np
+
+from vehicle.message import RS, S
+
+# The work zones announced to the CAV during a benign trajectory, one record per V2I comm it read. Steps [start, end)
+# are when the CAV is at the speed limit of an RSWZ or stopped before an S work zone.
+ZONE = np.dtype([('run', '<i8'), ('kind', 'U2'), ('start', '<i8'), ('end', '<i8'), ('speed_limit', '<f4'),
+                 ('len_of_WZ', '<f4')])
+
+# The outcome of a faulty trajectory against its benign trajectory. Steps are -1 where there is none.
+OUTCOME = np.dtype([('crash_step', '<i4'), ('impact_speed', '<f4'), ('divergence_step', '<i4'),
+                    ('max_divergence', '<f4'), ('time_over_limit', '<f4'), ('stop_violations', '<i4')])
+
+# The outcomes of a group of runs, such as an attack scenario.
+SUMMARY = np.dtype([('group', '<i8'), ('runs', '<i8'), ('crashes', '<i8'), ('crash_rate', '<f8'),
+                    ('mean_impact_speed', '<f8'), ('mean_max_divergence', '<f8'), ('time_over_limit', '<f8'),
+                    ('stop_violations', '<i8'), ('mean_severity', '<f8')])
+
+
+def zones(comms):
+    """
+    Return the work zones of many runs.
+
+    :param comms: The V2I comms read during the benign trajectory of each run, as in Vehicle.comms (list).
+    :return: A structured array of ZONE records.
+    """
+    records = []
+    for run, run_comms in enumerate(comms):
+        for comm, (start, end, i_at_target) in run_comms or ():
+            if isinstance(comm, RS):
+                records.append((run, RS.kind, i_at_target, end, comm.speed_limit, comm.len_of_WZ))
+            elif isinstance(comm, S):
+                records.append((run, S.kind, i_at_target, end, 0, 0))
+    return np.array(records, dtype=ZONE)
+
+
+def stack(trajectories):
+    """
+    Return trajectories of the same length as a single trajectory of 2D columns, one row per trajectory.
+
+    :param trajectories: Trajectories with columns t/x/v/a or time/position/velocity/acceleration (list).
+    :return: A dictionary of column ('t', 'x', 'v', 'a') to array of shape (runs, time steps).
+    """
+    return {short: np.stack([column(trajectory, short, long) for trajectory in trajectories])
+            for short, long in (('t', 'time'), ('x', 'position'), ('v', 'velocity'), ('a', 'acceleration'))}
+
+
+def column(trajectory, short, long):
+    """
+    Return a column of a trajectory.
+
+    :param trajectory: A trajectory with columns t/x/v/a or time/position/velocity/acceleration.
+    :param short: The short name of the column (str).
+    :param long: The long name of the column (str).
+    :return: The column (np.ndarray).
+    """
+    return np.asarray(trajectory[short] if short in trajectory else trajectory[long])
+
+
+def outcomes(benign, faulty, timestep, work_zones=None, tolerance=0.1):
+    """
+    Return the outcome of every faulty trajectory against its benign trajectory, over a whole batch of runs at once.
+
+    A crash (Trajectory.crash) is where the CAV stands still up until the end of the trip although, at its previous
+    acceleration, it would still be moving faster than tolerance, which a CAV that stops by itself never does: it
+    slows down to a stop. The impact speed is its velocity right before the crash.
+
+    A work zone is a place: the CAV is over the speed limit of an RSWZ for every time step it drives faster than the
+    limit past where the benign CAV reaches the limit and up until the end of the work zone, and violates a stop if it
+    drives past the farthest point the benign CAV reaches before it leaves the stop. At coarse timesteps the benign CAV
+    itself may overshoot a speed limit: outcomes(benign, benign, ...) gives the baseline of a batch.
+
+    :param benign: The benign trajectories, with 2D columns t/x/v/a or time/position/velocity/acceleration of shape
+                   (runs, time steps), as made by stack.
+    :param faulty: The faulty trajectories, of the same shape as the benign trajectories.
+    :param timestep: The timestep of the runs (float or np.ndarray).
+    :param work_zones: The work zones of the benign trajectories, as made by zones, without which no time is over a
+                       speed limit and no stop is violated (np.ndarray).
+    :param tolerance: The velocity a CAV may be left with as it slows down to a stop, in m/s (float).
+    :return: A structured array of OUTCOME records, one per run.
+    """
+    x, v = column(benign, 'x', 'position'), column(benign, 'v', 'velocity')
+    fx, fv, fa = column(faulty, 'x', 'position'), column(faulty, 'v', 'velocity'), column(faulty, 'a', 'acceleration')
+    n_runs, n_steps = fx.shape
+    rows = np.arange(n_runs)
+    result = np.zeros(n_runs, dtype=OUTCOME)
+
+    # Crashes
+    frozen = (fv == 0) & (fa == 0) & (fx == fx[:, -1:])
+    n_frozen = np.logical_and.accumulate(frozen[:, ::-1], axis=1).sum(axis=1)
+    i = n_steps - n_frozen
+    impact = np.where(i > 0, fv[rows, np.maximum(i - 1, 0)], 0)
+    moving = impact + np.broadcast_to(timestep, n_runs) * fa[rows, np.maximum(i - 1, 0)]
+    crashed = (n_frozen > 0) & (i > 0) & (moving > tolerance)
+    result['crash_step'] = np.where(crashed, i, -1)
+    result['impact_speed'] = np.where(crashed, impact, 0)
+
+    # Divergence
+    divergent = (fx != x) | (fv != v)
+    result['divergence_step'] = np.where(divergent.any(axis=1), divergent.argmax(axis=1), -1)
+    result['max_divergence'] = np.abs(fx - x).max(axis=1)
+
+    if work_zones is not None and len(work_zones):
+        run = work_zones['run']
+
+        rs = work_zones['kind'] == RS.kind
+        if rs.any():
+            zx, zv, zone = fx[run[rs]], fv[run[rs]], work_zones[rs]
+            # Where the benign CAV is as it reaches the speed limit
+            x_start = x[run[rs], np.maximum(zone['start'] - 1, 0)]
+            inside = (zx > x_start[:, None]) & (zx < (x_start + zone['len_of_WZ'])[:, None])
+            over = (inside & (zv > zone['speed_limit'][:, None])).sum(axis=1)
+            result['time_over_limit'] = np.bincount(run[rs], over, minlength=n_runs) * timestep
+
+        s = work_zones['kind'] == S.kind
+        if s.any():
+            zx, zone = fx[run[s]], work_zones[s]
+            # A CAV slowing down to a stop may drift backwards (see integrate), so the stop line is the farthest point.
+            x_stop = np.maximum.accumulate(x, axis=1)[run[s], np.maximum(zone['end'] - 1, 0)]
+            past = (zx > x_stop[:, None]) & (np.arange(n_steps) < zone['end'][:, None])
+            result['stop_violations'] = np.bincount(run[s], past.any(axis=1), minlength=n_runs)
+
+    return result
+
+
+class Accumulator:
+    """
+    The outcome of a faulty trajectory against its benign trajectory, accumulated chunk by chunk, such as the chunks of
+    two Streams, without ever holding the whole pair. Crashes and divergence are as in outcomes. Work zones are only
+    known as the trip goes, so the time over a speed limit and the stop violations are left at 0: use outcomes on the
+    whole trajectories for those.
+    """
+
+    def __init__(self, timestep, tolerance=0.1):
+        """
+        The constructor for an empty outcome.
+
+        :param timestep: The timestep of the run (float).
+        :param tolerance: The velocity a CAV may be left with as it slows down to a stop, in m/s (float).
+        """
+        self.timestep = timestep
+        self.tolerance = tolerance
+        self.steps = 0
+        self.divergence_step = -1
+        self.max_divergence = np.float32(0)
+        # The time step the CAV has been standing still since, the velocity and acceleration right before it, and the
+        # position, velocity and acceleration of the last time step.
+        self.frozen = None
+        self.before = None
+        self.last = None
+
+    def update(self, benign, faulty):
+        """
+        Adds the next chunks of the pair.
+
+        :param benign: The chunk of the benign trajectory, with columns t/x/v/a or time/position/velocity/acceleration.
+        :param faulty: The chunk of the faulty trajectory, of the same length.
+        :return: This outcome (Accumulator).
+        """
+        x, v = column(benign, 'x', 'position'), column(benign, 'v', 'velocity')
+        fx, fv = column(faulty, 'x', 'position'), column(faulty, 'v', 'velocity')
+        fa = column(faulty, 'a', 'acceleration')
+        n = len(fx)
+        if not n:
+            return self
+
+        divergent = np.flatnonzero((fx != x) | (fv != v))
+        if self.divergence_step < 0 and divergent.size:
+            self.divergence_step = self.steps + int(divergent[0])
+        self.max_divergence = max(self.max_divergence, np.abs(fx - x).max())
+
+        frozen = (fv == 0) & (fa == 0) & (fx == fx[-1])
+        moving = np.flatnonzero(~frozen)
+        s = int(moving[-1]) + 1 if moving.size else 0
+        if s == n:
+            self.frozen = None
+        elif s > 0:
+            self.frozen, self.before = self.steps + s, (fv[s - 1], fa[s - 1])
+        elif self.frozen is None or fx[-1] != self.last[0]:
+            # The whole chunk stands still, but not since the previous chunk.
+            self.frozen = self.steps
+            self.before = None if self.last is None else self.last[1:]
+        self.last = (fx[-1], fv[-1], fa[-1])
+        self.steps += n
+        return self
+
+    def result(self):
+        """
+        Return the outcome of the run so far.
+
+        :return: An OUTCOME record.
+        """
+        result = np.zeros((), dtype=OUTCOME)
+        result['crash_step'] = -1
+        if self.frozen is not None and self.before is not None:
+            impact, acc = self.before
+            if float(impact) + self.timestep * float(acc) > self.tolerance:
+                result['crash_step'], result['impact_speed'] = self.frozen, impact
+        result['divergence_step'] = self.divergence_step
+        result['max_divergence'] = self.max_divergence
+        return result
+
+
+def severity(outcome, impact=1.0, speeding=0.1, violation=10.0):
+    """
+    Return a severity score of every run: the kinetic energy per unit of mass at the impact, plus the seconds over a
+    speed limit and the violated stops, with the given weights.
+
+    :param outcome: A structured array of OUTCOME records.
+    :param impact: The weight of the impact (float).
+    :param speeding: The weight of a second over a speed limit (float).
+    :param violation: The weight of a violated stop (float).
+    :return: The severity of every run (np.ndarray).
+    """
+    return impact * 0.5 * outcome['impact_speed'].astype(np.float64) ** 2 \
+        + speeding * outcome['time_over_limit'] + violation * outcome['stop_violations']
+
+
+def summarize(outcome, groups, **weights):
+    """
+    Return the outcomes of every group of runs, such as the attack scenarios of a campaign, from the most to the least
+    severe.
+
+    :param outcome: A structured array of OUTCOME records.
+    :param groups: The group of every run (np.ndarray).
+    :param weights: The weights of severity (dict).
+    :return: A structured array of SUMMARY records, one per group.
+    """
+    keys, inverse = np.unique(groups, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    runs = np.bincount(inverse, minlength=len(keys))
+    crashed = outcome['crash_step'] >= 0
+
+    summary = np.zeros(len(keys), dtype=SUMMARY)
+    summary['group'] = keys
+    summary['runs'] = runs
+    summary['crashes'] = np.bincount(inverse, crashed, minlength=len(keys))
+    summary['crash_rate'] = summary['crashes'] / runs
+    summary['mean_impact_speed'] = np.bincount(inverse, outcome['impact_speed'], minlength=len(keys)) / np.maximum(
+        summary['crashes'], 1)
+    summary['mean_max_divergence'] = np.bincount(inverse, outcome['max_divergence'], minlength=len(keys)) / runs
+    summary['time_over_limit'] = np.bincount(inverse, outcome['time_over_limit'], minlength=len(keys))
+    summary['stop_violations'] = np.bincount(inverse, outcome['stop_violations'], minlength=len(keys))
+    summary['mean_severity'] = np.bincount(inverse, severity(outcome, **weights), minlength=len(keys)) / runs
+    return summary[np.argsort(-summary['mean_severity'], kind='stable')]
+
+
+def campaign_outcomes(results):
+    """
+    Return the outcome of every successful result of a campaign. Runs of the same length are evaluated as one batch.
+
+    :param results: The results of a campaign (list).
+    :return: Tuple containing the successful results (list) and a structured array of their OUTCOME records.
+    """
+    results = [result for result in results if result.error is None]
+    result = np.zeros(len(results), dtype=OUTCOME)
+    lengths = np.array([len(column(r.benign, 't', 'time')) for r in results], dtype=np.int64)
+    for length in np.unique(lengths):
+        batch = np.flatnonzero(lengths == length)
+        timestep = np.array([results[k].job.timestep for k in batch])
+        result[batch] = outcomes(stack([results[k].benign for k in batch]), stack([results[k].faulty for k in batch]),
+                                 timestep, zones([results[k].comms for k in batch]))
+    return results, result
@@ -0,0 +1,33 @@
+import numpy as np
+
+from vehicle.message import RS, S
+
+
+def corridor(n_events, seed=0, share_rs=0.5, spacing=(50, 150), dist_to_WZ=(50, 200), speed_limit=(5, 20),
+             len_of_WZ=(100, 1000), duration=(5, 30)):
+    """
+    Generates the V2I comms of a long corridor with many work zones, ready to be passed into Vehicle.trajectory with
+    their offsets. Every work zone is either a reduced speed work zone (RS) or a stop (S), and the work zones follow each
+    other at a random spacing. Every range is inclusive.
+
+    :param n_events: The number of work zones of the corridor (int).
+    :param seed: The seed of the corridor (int).
+    :param share_rs: The probability of a work zone being a reduced speed work zone (float).
+    :param spacing: The range of time steps between the V2I comms of consecutive work zones (tuple).
+    :param dist_to_WZ: The range of distances to the work zones, in meters (tuple).
+    :param speed_limit: The range of reduced speeds in the work zones, in m/s (tuple).
+    :param len_of_WZ: The range of lengths of the work zones, in meters (tuple).
+    :param duration: The range of durations of the stops, in seconds (tuple).
+    :return: Tuple containing the V2I comms (list) and the time steps after the start of the random trajectory phase
+             at which they are passed in (np.ndarray).
+    """
+    rng = np.random.default_rng(seed)
+    offsets = np.cumsum(rng.integers(spacing[0], spacing[1], n_events, endpoint=True))
+    is_rs = rng.random(n_events) < share_rs
+    dists = rng.integers(dist_to_WZ[0], dist_to_WZ[1], n_events, endpoint=True)
+    limits = rng.integers(speed_limit[0], speed_limit[1], n_events, endpoint=True)
+    lengths = rng.integers(len_of_WZ[0], len_of_WZ[1], n_events, endpoint=True)
+    durations = rng.integers(duration[0], duration[1], n_events, endpoint=True)
+
+    comms = [RS(dists[k], limits[k], lengths[k]) if is_rs[k] else S(dists[k], durations[k]) for k in range(n_events)]
+    return comms, offsets
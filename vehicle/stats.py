@@ -0,0 +1,108 @@
+import time
+
+import numpy as np
+
+from vehicle.message import KINDS
+from vehicle.vehicle import NO_ACC, NOTHING
+
+# The phases of a trip: the acceleration phase, the random trajectory phase, the execution of RS and S comms within
+# it, and the deceleration phase.
+PHASES = ('acceleration', 'random', 'RS', 'S', 'deceleration')
+
+
+class Stats:
+    """
+    Opt-in instrumentation of the trips of a Vehicle: the time spent in and the time steps taken by every phase, the
+    calls to acc_ran by rule of the decision table (see compile_policy) and action picked, and how long the execution
+    of every kind of V2I comm takes. A Vehicle only records into its stats if it has any, so the instrumentation costs
+    a check per phase and per decision when it is disabled. Stats are plain data, so they can be returned from worker
+    processes and merged.
+    """
+
+    def __init__(self):
+        """
+        The constructor for empty stats.
+        """
+        self.trips = 0
+        self.cached = 0
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.steps = dict.fromkeys(PHASES, 0)
+        # decisions[rule, action] counts the calls to acc_ran under rule that picked action. The rule NOTHING, which
+        # does not call acc_ran, is counted as NO_ACC.
+        self.decisions = np.zeros((NOTHING + 1, NO_ACC + 1), dtype=np.int64)
+        # The number, time steps and seconds of the V2I comms executed, by kind.
+        self.messages = {kind: [0, 0, 0.0] for kind in KINDS}
+
+    def phase(self, phase, started, steps):
+        """
+        Records a phase of a trip.
+
+        :param phase: The phase, one of PHASES (str).
+        :param started: When the phase started, from time.perf_counter (float).
+        :param steps: The number of time steps of the phase (int).
+        :return: The time now, from time.perf_counter (float).
+        """
+        now = time.perf_counter()
+        self.seconds[phase] += now - started
+        self.steps[phase] += int(steps)
+        return now
+
+    def message(self, kind, started, steps):
+        """
+        Records the execution of a V2I comm, which is also a phase of the trip.
+
+        :param kind: The kind of the comm, 'RS' or 'S' (str).
+        :param started: When the execution started, from time.perf_counter (float).
+        :param steps: The number of time steps of the execution (int).
+        :return: The time now, from time.perf_counter (float).
+        """
+        now = time.perf_counter()
+        counts = self.messages[kind]
+        counts[0] += 1
+        counts[1] += int(steps)
+        counts[2] += now - started
+        self.seconds[kind] += now - started
+        self.steps[kind] += int(steps)
+        return now
+
+    def merge(self, other):
+        """
+        Adds the stats of other to these stats.
+
+        :param other: The stats to add (Stats).
+        :return: These stats (Stats).
+        """
+        self.trips += other.trips
+        self.cached += other.cached
+        for phase in PHASES:
+            self.seconds[phase] += other.seconds[phase]
+            self.steps[phase] += other.steps[phase]
+        self.decisions += other.decisions
+        for kind, counts in other.messages.items():
+            self.messages[kind] = [total + count for total, count in zip(self.messages[kind], counts)]
+        return self
+
+    @classmethod
+    def total(cls, stats):
+        """
+        Return the sum of many stats, such as the stats of the results of a campaign.
+
+        :param stats: The stats to add, where None is skipped (iterable).
+        :return: The total stats (Stats).
+        """
+        total = cls()
+        for other in stats:
+            if other is not None:
+                total.merge(other)
+        return total
+
+    def as_dict(self):
+        """
+        Return the stats as plain Python values.
+
+        :return: The stats (dict).
+        """
+        return {'trips': self.trips, 'cached': self.cached, 'seconds': dict(self.seconds), 'steps': dict(self.steps),
+                'decisions': self.decisions.tolist(),
+                'messages': {kind: dict(zip(('count', 'steps', 'seconds'), counts))
+                             for kind, counts in self.messages.items()}}
@@ -0,0 +1,271 @@
+import os
+
+import numpy as np
+
+# The index of a store holds a record per run: where its trajectories are and the job that produced them.
+RUN = np.dtype([('chunk', '<i8'), ('offset', '<i8'), ('length', '<i8'), ('scenario', '<i8'), ('seed', '<i8'),
+                ('v_init', '<f8'), ('timestep', '<f8'), ('duration', '<f8'), ('perturbed', '<f8', (3,))])
+
+# The columns of a trajectory by their short (Vehicle.cache) and long (Vehicle.report) names.
+COLUMNS = (('t', 'time'), ('x', 'position'), ('v', 'velocity'), ('a', 'acceleration'))
+
+
+class TrajectoryStore:
+    """
+    An append-only, columnar store of the benign/faulty trajectory pairs of a campaign. Every column of every kind of
+    trajectory is a raw float32 file, split in chunks of at most chunk_size values, and an index of offsets locates each
+    run. Reads are memory-mapped, so analysis can stream over millions of runs without loading them into memory.
+    """
+
+    kinds = ('benign', 'faulty')
+
+    def __init__(self, directory, chunk_size=1 << 24):
+        """
+        The constructor for the trajectory store. Opening an existing directory appends to it.
+
+        :param directory: The directory of the store, created if missing (str).
+        :param chunk_size: The maximum number of values per column file (int).
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.index_path = os.path.join(directory, 'index.bin')
+        self.index = []
+        if os.path.exists(self.index_path):
+            # A record cut short by a crash is dropped: the runs before it are whole, their columns being written first.
+            size = os.path.getsize(self.index_path)
+            if size % RUN.itemsize:
+                os.truncate(self.index_path, size - size % RUN.itemsize)
+            self.index = list(np.fromfile(self.index_path, dtype=RUN))
+        self.writers = {}
+        self.maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, k):
+        """
+        Return the trajectories of run k as memory-mapped views.
+
+        :param k: The index of the run (int).
+        :return: A dictionary of kind ('benign', 'faulty') to a dictionary of column ('t', 'x', 'v', 'a') to array.
+        """
+        run = self.index[k]
+        chunk, offset, length = int(run['chunk']), int(run['offset']), int(run['length'])
+        return {kind: {col: self.column(chunk, kind, col)[offset:offset + length] for col, _ in COLUMNS}
+                for kind in self.kinds}
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def path(self, chunk, kind, col):
+        """
+        Return the path of a column file.
+
+        :param chunk: The chunk of the column (int).
+        :param kind: The kind of trajectory, 'benign' or 'faulty' (str).
+        :param col: The column, 't', 'x', 'v' or 'a' (str).
+        :return: The path of the column file (str).
+        """
+        return os.path.join(self.directory, '%05d.%s.%s.f32' % (chunk, kind, col))
+
+    def column(self, chunk, kind, col):
+        """
+        Return a column file as a read-only memory map. Every column file is mapped once, and the map of a chunk is
+        dropped as runs are appended to it (see write), so that it is mapped again to cover the latest runs.
+
+        :param chunk: The chunk of the column (int).
+        :param kind: The kind of trajectory, 'benign' or 'faulty' (str).
+        :param col: The column, 't', 'x', 'v' or 'a' (str).
+        :return: The column (np.memmap).
+        """
+        key = (chunk, kind, col)
+        if key in self.maps:
+            return self.maps[key]
+        self.flush()
+        column = self.maps[key] = np.memmap(self.path(chunk, kind, col), dtype=np.float32, mode='r')
+        return column
+
+    def append(self, benign, faulty, job=None):
+        """
+        Append a pair of trajectories. The float32 arrays a Vehicle allocates are written as they are, without a copy.
+
+        :param benign: The benign trajectory, with columns t/x/v/a or time/position/velocity/acceleration.
+        :param faulty: The faulty trajectory of the same length as the benign trajectory.
+        :param job: The job that produced the pair (Job).
+        :return: The index of the run (int).
+        """
+        benign = [as_column(benign, short, long) for short, long in COLUMNS]
+        faulty = [as_column(faulty, short, long) for short, long in COLUMNS]
+        length = len(benign[0])
+        assert all(len(col) == length for col in benign + faulty), "Both trajectories must have the same length."
+
+        chunk, offset = self.tail()
+        if offset and offset + length > self.chunk_size:
+            self.close()
+            chunk, offset = chunk + 1, 0
+        self.truncate(chunk, offset)
+        try:
+            self.write(chunk, benign, faulty)
+        except BaseException:
+            self.truncate(chunk, offset)
+            raise
+        return self.record(chunk, offset, length, job)
+
+    def append_stream(self, pairs, job=None):
+        """
+        Append a pair of trajectories streamed in chunks, such as the chunks of two Streams, without ever holding the
+        whole pair. As its length is only known at the end, a streamed run starts a new chunk file if the current one
+        is full and may grow it past chunk_size.
+
+        :param pairs: (benign, faulty) tuples of chunks of the same length (iterable).
+        :param job: The job that produced the pair (Job).
+        :return: The index of the run (int).
+        """
+        chunk, offset = self.tail()
+        if offset >= self.chunk_size:
+            self.close()
+            chunk, offset = chunk + 1, 0
+        self.truncate(chunk, offset)
+        length = 0
+        try:
+            for benign, faulty in pairs:
+                benign = [as_column(benign, short, long) for short, long in COLUMNS]
+                faulty = [as_column(faulty, short, long) for short, long in COLUMNS]
+                assert all(len(col) == len(benign[0]) for col in benign + faulty), \
+                    "Both chunks must have the same length."
+                self.write(chunk, benign, faulty)
+                length += len(benign[0])
+        except BaseException:
+            self.truncate(chunk, offset)
+            raise
+        return self.record(chunk, offset, length, job)
+
+    def tail(self):
+        """
+        Return where the next run goes if it fits in the current chunk.
+
+        :return: Tuple containing the chunk and the offset within it.
+        """
+        if not self.index:
+            return 0, 0
+        last = self.index[-1]
+        return int(last['chunk']), int(last['offset'] + last['length'])
+
+    def truncate(self, chunk, offset):
+        """
+        Cut the column files of a chunk back to the given offset, dropping the values past the last run of the index,
+        such as those of a run that did not finish or whose record a crash did not let reach the index.
+
+        :param chunk: The chunk (int).
+        :param offset: The offset past the last run of the chunk (int).
+        """
+        size = offset * np.dtype(np.float32).itemsize
+        for kind in self.kinds:
+            for col, _ in COLUMNS:
+                key = (chunk, kind, col)
+                if key in self.writers:
+                    self.writers[key].flush()
+                path = self.path(chunk, kind, col)
+                if os.path.exists(path) and os.path.getsize(path) > size:
+                    self.maps.pop(key, None)
+                    os.truncate(path, size)
+
+    def write(self, chunk, benign, faulty):
+        """
+        Append the columns of a pair of trajectories to the column files of a chunk, dropping their maps.
+
+        :param chunk: The chunk (int).
+        :param benign: The columns of the benign trajectory (list).
+        :param faulty: The columns of the faulty trajectory (list).
+        """
+        for kind, cols in zip(self.kinds, (benign, faulty)):
+            for (col, _), values in zip(COLUMNS, cols):
+                key = (chunk, kind, col)
+                self.maps.pop(key, None)
+                if key not in self.writers:
+                    self.writers[key] = open(self.path(chunk, kind, col), 'ab')
+                self.writers[key].write(memoryview(values))
+
+    def record(self, chunk, offset, length, job):
+        """
+        Append the record of a run to the index, once its columns are flushed to the column files, so that the index
+        never locates values that are not on disk.
+
+        :param chunk: The chunk of the run (int).
+        :param offset: The offset of the run within its chunk (int).
+        :param length: The length of the run (int).
+        :param job: The job that produced the run (Job).
+        :return: The index of the run (int).
+        """
+        run = np.zeros(1, dtype=RUN)
+        run['chunk'], run['offset'], run['length'] = chunk, offset, length
+        run['perturbed'] = np.nan
+        if job is not None:
+            run['scenario'], run['seed'] = job.scenario, job.seed
+            run['v_init'], run['timestep'], run['duration'] = job.v_init, job.timestep, job.duration
+            if job.perturbed is not None:
+                perturbed = np.atleast_1d(job.perturbed)
+                run['perturbed'][0, :len(perturbed)] = perturbed
+        self.flush()
+        with open(self.index_path, 'ab') as f:
+            f.write(run.tobytes())
+        self.index.append(run[0])
+        return len(self.index) - 1
+
+    def extend(self, results):
+        """
+        Append the trajectories of every successful result of a campaign.
+
+        :param results: The results of a campaign (iterable).
+        :return: The number of runs appended (int).
+        """
+        appended = 0
+        for result in results:
+            if result.error is None:
+                self.append(result.benign, result.faulty, result.job)
+                appended += 1
+        return appended
+
+    def runs(self):
+        """
+        Return the index of the store.
+
+        :return: A structured array of RUN records.
+        """
+        return np.array(self.index, dtype=RUN)
+
+    def flush(self):
+        """
+        Flush the column files being appended to.
+        """
+        for writer in self.writers.values():
+            writer.flush()
+
+    def close(self):
+        """
+        Close the column files being appended to.
+        """
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def as_column(trajectory, short, long):
+    """
+    Return a column of a trajectory as a contiguous float32 array, which is the column itself if it already is one.
+
+    :param trajectory: A trajectory with columns t/x/v/a or time/position/velocity/acceleration.
+    :param short: The short name of the column (str).
+    :param long: The long name of the column (str).
+    :return: The column (np.ndarray).
+    """
+    column = trajectory[short] if short in trajectory else trajectory[long]
+    return np.ascontiguousarray(column, dtype=np.float32)
@@ -0,0 +1,332 @@
+import heapq
+import itertools
+
+import numpy as np
+
+from vehicle.message import RS, S, parse
+from vehicle.trajectory import Trajectory
+from vehicle.vehicle import NO_ACTION, _ACC, _RAN, _RS_DEC, _RS_ACC, _RS_CRUISE, _S_DEC, _S_HOLD, _DONE
+
+# The deceleration phase at the end of a stream of a given duration.
+_DEC = _DONE + 1
+
+
+class Stream:
+    """
+    A trip of a CAV generated as an iterator of fixed-size chunks, so that its memory stays bounded however long the
+    trip is. Every chunk is a Trajectory of chunk_size time steps, the last one of a trip of a given duration being
+    shorter. The CAV drives as in Vehicle.drive, one segment of constant acceleration at a time, with every phase
+    resumed across chunks from the previous time step. Without a duration, the trip never ends: the random trajectory
+    phase goes on for as long as chunks are taken.
+
+    V2I comms are passed in as the stream advances: the comms given up front at their drawn (or given) offsets, the
+    (time step, comm) events of an iterable sorted by time step, pulled as the stream reaches them, and the comms
+    injected with inject. The comms the CAV read are listed in self.comms as in Vehicle.comms.
+
+    With a duration and no events, a stream is the trip Vehicle.trajectory generates with the same arguments, chunk by
+    chunk, except that a comm still executing at the start of the deceleration phase is cut off there and not listed,
+    where Vehicle.trajectory would raise if it ran past the end of the trip and overwrites it otherwise. A vehicle
+    drives one stream at a time, as the stream draws from its generator and records its previous action.
+    """
+
+    def __init__(self, vehicle, v_init, timestep, chunk_size=4096, v2i_comms=(), seed=0, duration=None, offsets=None,
+                 events=None, horizon=500):
+        """
+        The constructor for the stream.
+
+        :param vehicle: The CAV (Vehicle).
+        :param v_init: The initial velocity of the vehicle, in m/s (int).
+        :param timestep: The timestep of the trip (int).
+        :param chunk_size: The number of time steps of a chunk (int).
+        :param v2i_comms: V2I communications passed in at random offsets, as in Vehicle.trajectory (list).
+        :param seed: The seed of the trip (int).
+        :param duration: The duration of the trip, in seconds, or None for a trip that never ends (int).
+        :param offsets: The time steps after the start of the random trajectory phase at which each comm of v2i_comms
+                        is passed in, drawn at random if None (list).
+        :param events: (time step, comm) tuples sorted by time step, where None is a comm the CAV ignores (iterable).
+        :param horizon: Without a duration, the duration the acceleration phase is drawn for and the time within which
+                        a CAV that speeds up must be able to traverse an RSWZ (see Vehicle.speed_up), in seconds
+                        (int).
+        """
+        assert chunk_size > 0, "A chunk needs at least one time step"
+        self.vehicle = vehicle
+        self.tau = tau = timestep
+        self.chunk_size = chunk_size
+        self.N = None if duration is None else int(duration / tau) + 1
+        # The number of time steps left in the trip when an RS comm is read stands in for N - i in Vehicle.drive.
+        self.horizon = int(horizon / tau)
+
+        vehicle.rng.seed(seed)
+        vehicle.prev_action = NO_ACTION
+        nominal = duration if duration is not None else horizon
+        acc_t_end, acc, arrivals = vehicle.plan(np.float32(v_init), tau, nominal, int(nominal / tau) + 1,
+                                                v2i_comms, offsets)
+        self.acc_t_end = acc_t_end
+        if acc_t_end > 1:
+            self.acc = (acc(1), acc(acc_t_end - 1))
+        self.ran_t_start = acc_t_end
+        self.ran_t_end = None if self.N is None else int((9 / 10) * self.N) + 1
+
+        # The V2I comms yet to be read as (time step, order, index, message), in the order they are passed in.
+        self.pending = [(int(arrivals[k]), k, k, parse(comm)) for k, comm in enumerate(v2i_comms)]
+        heapq.heapify(self.pending)
+        self.order = itertools.count(len(self.pending))
+        self.events = iter(events) if events is not None else None
+        self.frontier = None
+        self.pull()
+        self.comms = []
+
+        self.i = 0
+        self.mode = _ACC
+        self.counter = 0
+        self.prev = (np.float32(0), np.float32(0), np.float32(v_init), np.float32(0))  # (t, x, v, a) at step i - 1
+        self.executing = None
+
+    def __iter__(self):
+        return self
+
+    def inject(self, comm, step=None):
+        """
+        Passes a V2I comm into the CAV at a time step, by default the next time step of the stream. A comm passed in
+        before the next time step is dropped or queued according to the overlap policy of the vehicle.
+
+        :param comm: The V2I communication, where None is a comm the CAV ignores (str, RS, S or None).
+        :param step: The time step the comm is passed in at (int).
+        """
+        order = next(self.order)
+        heapq.heappush(self.pending, (self.i if step is None else int(step), order, order, parse(comm)))
+
+    def pull(self):
+        """
+        Pulls the next event of the events, so that the earliest pending comm is always known.
+        """
+        if self.events is None:
+            return
+        for step, comm in self.events:
+            order = next(self.order)
+            self.frontier = order
+            heapq.heappush(self.pending, (int(step), order, order, parse(comm)))
+            return
+        self.events = None
+
+    def pop(self):
+        """
+        Return the earliest pending V2I comm, pulling the next event if it was the last one pulled.
+
+        :return: The comm as (time step, order, index, message).
+        """
+        comm = heapq.heappop(self.pending)
+        if comm[1] == self.frontier:
+            self.pull()
+        return comm
+
+    def __next__(self):
+        """
+        Return the next chunk of the trip.
+
+        :return: The chunk (Trajectory).
+        """
+        N, i0 = self.N, self.i
+        if N is not None and i0 >= N:
+            raise StopIteration
+        n = self.chunk_size if N is None else min(self.chunk_size, N - i0)
+
+        # Index j of the arrays is time step i0 + j - 1: index 0 holds the last time step of the previous chunk.
+        t = np.empty(n + 1, dtype=np.float32)
+        x = np.empty(n + 1, dtype=np.float32)
+        v = np.empty(n + 1, dtype=np.float32)
+        a = np.empty(n + 1, dtype=np.float32)
+        t[0], x[0], v[0], a[0] = self.prev
+        t[1:] = self.tau
+        j = 1
+        if i0 == 0:
+            t[1], x[1], v[1], a[1] = 0, 0, v[0], 0
+            j = 2
+        np.add.accumulate(t[1:] if i0 == 0 else t, out=t[1:] if i0 == 0 else t)
+
+        while j <= n:
+            j = self.advance(x, v, a, j, n + 1, i0 - 1)
+
+        self.i = i0 + n
+        self.prev = (t[n], x[n], v[n], a[n])
+        return Trajectory(t[1:], x[1:], v[1:], a[1:])
+
+    def advance(self, x, v, a, j, end, base):
+        """
+        Drives the CAV from index j of the chunk for one segment of its current phase, at most up until index end.
+
+        :param x: The position array of the chunk (np.ndarray).
+        :param v: The velocity array of the chunk (np.ndarray).
+        :param a: The acceleration array of the chunk (np.ndarray).
+        :param j: The index to drive from (int).
+        :param end: The index after the last one of the chunk (int).
+        :param base: The time step of index 0 of the chunk (int).
+        :return: The first index that was not driven.
+        """
+        vehicle, tau, mode = self.vehicle, self.tau, self.mode
+        i = base + j
+        if mode == _ACC:
+            if i >= self.acc_t_end:
+                self.mode = _RAN
+                return j
+            stop = min(end, j + self.acc_t_end - i)
+            steps = np.arange(i, base + stop)
+            a[j:stop] = np.where(steps <= (self.acc_t_end - 1) / 2, self.acc[0], self.acc[1])
+            vehicle.integrate(x, v, a, j, stop, tau)
+            return stop
+
+        if mode == _DEC:
+            dec_t_end = self.N - 1
+            stop = min(end, j + dec_t_end + 1 - i)
+            a[j:stop] = self.dec
+            vehicle.integrate(x, v, a, j, stop, tau)
+            if base + stop - 1 == dec_t_end:
+                a[stop - 1] = 0
+                v[stop - 1] = 0
+            return stop
+
+        ran_t_end = self.ran_t_end
+        if ran_t_end is not None and i >= ran_t_end:
+            # DECELERATION PHASE: a comm still executing is cut off here (see Vehicle.drive).
+            self.mode, self.executing = _DEC, None
+            self.dec = - (v[j - 1] / ((self.N - ran_t_end) * tau))
+            return j
+        if ran_t_end is not None:
+            end = min(end, j + ran_t_end - i)
+
+        if mode == _RAN:
+            return self.random(x, v, a, j, end, i)
+        if mode == _S_HOLD:
+            stop = min(end, j + self.hold)
+            v[j:stop] = self.held[1]
+            x[j:stop] = self.held[0]
+            a[j:stop] = 0
+            self.hold -= stop - j
+            if self.hold == 0:
+                self.finish(base + stop)
+            return stop
+
+        # The phases that last for as long as a condition holds for the previous position and velocity, as in
+        # integrate_while.
+        acc, keep, clamp = self.segment
+        if not keep(x[j - 1], v[j - 1]):
+            self.transition(x, v, j, i)
+            return j
+        a[j:end] = acc
+        vehicle.integrate(x, v, a, j, end, tau, clamp=clamp)
+        stopped = np.flatnonzero(~keep(x[j:end], v[j:end]))
+        if stopped.size:
+            stop = j + int(stopped[0]) + 1
+            self.transition(x, v, stop, base + stop)
+            return stop
+        return end
+
+    def random(self, x, v, a, j, end, i):
+        """
+        Drives the CAV through the random trajectory phase from index j for one segment, reading the V2I comm passed in
+        at time step i, if any (see Vehicle.drive).
+
+        :param x: The position array of the chunk (np.ndarray).
+        :param v: The velocity array of the chunk (np.ndarray).
+        :param a: The acceleration array of the chunk (np.ndarray).
+        :param j: The index to drive from (int).
+        :param end: The index after the last one to drive (int).
+        :param i: The time step of index j (int).
+        :return: The first index that was not driven.
+        """
+        vehicle, tau, pending = self.vehicle, self.tau, self.pending
+        if vehicle.overlap == 'drop':
+            # V2I comms passed in while another comm was executing are never read.
+            while pending and pending[0][0] < i:
+                self.pop()
+
+        if pending and pending[0][0] <= i:
+            _, _, k, comm = self.pop()
+            if vehicle.overlap == 'drop':
+                # Of the V2I comms passed in at the same time step, only the last one is read.
+                while pending and pending[0][0] == i:
+                    _, _, k, comm = self.pop()
+            if comm is not None:
+                self.read(x, v, j, i, k, comm)
+            return j
+
+        if self.counter % 20 == 0:
+            a[j] = vehicle.ran_policy(v[j - 1], tau, i == self.ran_t_start)
+        else:
+            a[j] = a[j - 1]
+        stop = min(end, j + 20 - self.counter % 20)
+        if pending:
+            stop = min(stop, j + pending[0][0] - i)
+        a[j + 1:stop] = a[j]
+        vehicle.integrate(x, v, a, j, stop, tau, clamp=True)
+        self.counter += stop - j
+        return stop
+
+    def read(self, x, v, j, i, k, comm):
+        """
+        Starts executing a V2I comm read at time step i (see Vehicle.drive).
+
+        :param x: The position array of the chunk (np.ndarray).
+        :param v: The velocity array of the chunk (np.ndarray).
+        :param j: The index of time step i (int).
+        :param i: The time step the comm is read at (int).
+        :param k: The index of the comm (int).
+        :param comm: The V2I comm (RS or S).
+        """
+        vehicle, tau = self.vehicle, self.tau
+        curr_v = v[j - 1]
+        self.executing = [k, comm, i, None]
+        if isinstance(comm, RS):
+            des_v = comm.speed_limit
+            left = self.horizon if self.N is None else self.N - i
+            if curr_v > des_v:
+                dec = ((des_v ** 2) - (curr_v ** 2)) / (2 * comm.dist_to_WZ)
+                self.mode, self.segment = _RS_DEC, (dec, lambda x_prev, v_prev: v_prev > des_v, False)
+            elif vehicle.speed_up and float(curr_v) * tau * left < comm.len_of_WZ < float(des_v) * tau * left:
+                self.mode, self.segment = _RS_ACC, (vehicle.a_max, lambda x_prev, v_prev: v_prev < des_v, False)
+            else:
+                self.transition(x, v, j, i, mode=_RS_DEC)
+        elif isinstance(comm, S):
+            dec = -(curr_v ** 2) / (2 * comm.dist_to_WZ)
+            self.mode, self.segment = _S_DEC, (dec, lambda x_prev, v_prev: v_prev > 0, True)
+
+    def transition(self, x, v, j, i, mode=None):
+        """
+        Moves on from a phase of the execution of a V2I comm once its condition no longer holds at time step i.
+
+        :param x: The position array of the chunk (np.ndarray).
+        :param v: The velocity array of the chunk (np.ndarray).
+        :param j: The index of time step i (int).
+        :param i: The first time step not taken by the phase (int).
+        :param mode: The phase, by default the current one (int).
+        """
+        mode = self.mode if mode is None else mode
+        comm = self.executing[1]
+        if mode in (_RS_DEC, _RS_ACC):
+            # Whether our curr_v is above or below the RSWZ speed limit, we need to traverse the WZ.
+            self.executing[3] = i
+            des_x = x[j - 1] + comm.len_of_WZ
+            self.mode, self.segment = _RS_CRUISE, (0, lambda x_prev, v_prev: x_prev <= des_x, False)
+        elif mode == _S_DEC:
+            # Now we hold the stop over the duration of the stop
+            self.executing[3] = i
+            self.hold = int(comm.duration / self.tau)
+            if self.N is not None and i + self.hold > self.N:
+                raise IndexError("The stop at time step %d runs past the end of the trip." % i)
+            self.held = (x[j - 1], v[j - 1])
+            self.mode = _S_HOLD
+            if self.hold == 0:
+                self.finish(i)
+        else:
+            self.finish(i)
+
+    def finish(self, end):
+        """
+        Records the V2I comm that was executing as read and goes back to the random trajectory phase.
+
+        :param end: The time step the execution ended at (int).
+        """
+        k, comm, start, i_at_target = self.executing
+        self.comms.append((comm, (start, end, i_at_target)))
+        self.executing = None
+        self.mode = _RAN
@@ -0,0 +1,171 @@
+import itertools
+
+import numpy as np
+
+from vehicle.message import parse
+from vehicle.stream import Stream
+from vehicle.vehicle import Vehicle
+
+# The outcome of every vehicle of a traffic run: its lane and starting position, whether its trip could not be driven,
+# the time step it crashed at and the vehicle it crashed into (-1 if none), the speed it hit it at relative to it, the
+# number of time steps it drove closer to the vehicle ahead than the headway and the smallest gap to the vehicle ahead.
+VEHICLE = np.dtype([('lane', '<i4'), ('offset', '<f4'), ('failed', '?'), ('crash_step', '<i4'), ('hit', '<i4'),
+                    ('impact_speed', '<f4'), ('headway_steps', '<i4'), ('min_gap', '<f4')])
+
+# The outcome of a whole traffic run, or the difference the attack makes to it (see impact).
+TRAFFIC = np.dtype([('vehicles', '<i8'), ('failed', '<i8'), ('crashed', '<i8'), ('collisions', '<i8'),
+                    ('headway_time', '<f8'), ('min_gap', '<f4')])
+
+
+def trips(n_vehicles, v2i_comms, steps, v_max=70, a_max=4, v_init=1, timestep=0.1, duration=500, seed=0, platoon=False,
+          tamper=None, victims=None):
+    """
+    Generates the trips of the vehicles of a traffic run: every vehicle drives its own trip (see Stream), and the same
+    V2I comms are broadcast to every vehicle at the same time steps. Vehicles driving on their own soon run into each
+    other, whereas the vehicles of a platoon all drive the same trip, so that only an attack sets them apart. A man in
+    the middle may tamper with the comms of the victims. A vehicle whose trip cannot be driven is marked as failed.
+
+    :param n_vehicles: The number of vehicles (int).
+    :param v2i_comms: The V2I comms broadcast to the vehicles (list).
+    :param steps: The time step every comm is broadcast at (list).
+    :param v_max: The maximum velocity of the vehicles (int).
+    :param a_max: The maximum acceleration of the vehicles (int).
+    :param v_init: The initial velocity of the vehicles, in m/s (int).
+    :param timestep: The timestep of the trips (float).
+    :param duration: The duration of the trips, in seconds (int).
+    :param seed: The seed of the first vehicle, the others taking the next ones unless they drive as a platoon (int).
+    :param platoon: Whether every vehicle drives the trip of the first vehicle (bool).
+    :param tamper: A function of a comm to its tampered comm or None, such as feed.tampering (function).
+    :param victims: Which vehicles receive the tampered comms, all of them if None (np.ndarray of bool).
+    :return: Tuple containing the positions and the velocities of shape (vehicles, time steps), and whether the trip of
+             every vehicle failed.
+    """
+    assert len(v2i_comms) == len(steps), "Every V2I comm needs a time step."
+    N = int(duration / timestep) + 1
+    x = np.zeros((n_vehicles, N), dtype=np.float32)
+    v = np.zeros((n_vehicles, N), dtype=np.float32)
+    failed = np.zeros(n_vehicles, dtype=bool)
+    events = sorted(zip((int(step) for step in steps), itertools.count(), (parse(comm) for comm in v2i_comms)))
+    benign = [(step, comm) for step, _, comm in events]
+    faulty = benign if tamper is None else [(step, None if comm is None else tamper(comm)) for step, comm in benign]
+
+    vehicle = Vehicle(v_max, a_max)
+    driven = {}  # driven = {(seed, attacked): trip or None if it failed}
+    for k in range(n_vehicles):
+        key = (seed if platoon else seed + k, tamper is not None and (victims is None or bool(victims[k])))
+        if key not in driven:
+            try:
+                driven[key] = next(Stream(vehicle, v_init, timestep, N, seed=key[0], duration=duration,
+                                          events=faulty if key[1] else benign))
+            except (TypeError, IndexError):
+                # The acceleration scenario of some seeds cannot be drawn (see Vehicle.acc_acc) and a stop may run
+                # past the end of the trip.
+                driven[key] = None
+        trip = driven[key]
+        if trip is None:
+            failed[k] = True
+        else:
+            x[k], v[k] = trip.x, trip.v
+        if not platoon:
+            del driven[key]
+    return x, v, failed
+
+
+def simulate(x, v, failed=None, n_lanes=1, spacing=50, length=5, headway=1.0):
+    """
+    Runs the vehicles of a traffic run on a shared road. Vehicle k drives in lane k % n_lanes, starting spacing meters
+    behind the vehicle before it in its lane, along its own trip. A vehicle runs into the vehicle ahead of it when the
+    gap between them closes, and both of them then stand still where they crashed, so that the vehicles behind may run
+    into them in turn. A vehicle closer to the vehicle ahead than it drives in headway seconds violates the headway.
+
+    Every lane keeps its vehicles sorted by position, and the order is updated at every time step with a stable sort,
+    which takes linear time on the nearly sorted positions. Only vehicles next to each other in the order of the
+    previous time step are checked, which also catches a vehicle passing through the vehicle ahead within a time step,
+    so a time step takes O(N) time rather than O(N^2) for N vehicles.
+
+    :param x: The positions along their trips of the vehicles, of shape (vehicles, time steps) (np.ndarray).
+    :param v: The velocities of the vehicles, of the same shape (np.ndarray).
+    :param failed: Whether the trip of every vehicle failed, which keeps it off the road (np.ndarray of bool).
+    :param n_lanes: The number of lanes of the road (int).
+    :param spacing: The distance between consecutive vehicles of a lane at the start, in meters (float).
+    :param length: The length of the vehicles, in meters (float).
+    :param headway: The time headway the vehicles must keep, in seconds (float).
+    :return: A structured array of VEHICLE records, one per vehicle.
+    """
+    n_vehicles, n_steps = x.shape
+    failed = np.zeros(n_vehicles, dtype=bool) if failed is None else np.asarray(failed)
+    result = np.zeros(n_vehicles, dtype=VEHICLE)
+    ids = np.arange(n_vehicles)
+    result['lane'] = lane = ids % n_lanes
+    result['offset'] = offset = -(ids // n_lanes) * np.float32(spacing)
+    result['failed'] = failed
+    result['crash_step'] = result['hit'] = -1
+    result['min_gap'] = np.inf
+
+    crashed = np.zeros(n_vehicles, dtype=bool)
+    frozen = np.zeros(n_vehicles, dtype=np.float32)
+    # The vehicles of every lane from the back to the front, as they start.
+    orders = [ids[(lane == k) & ~failed][::-1] for k in range(n_lanes)]
+    for i in range(n_steps):
+        pos = np.where(crashed, frozen, offset + x[:, i])
+        vel = np.where(crashed, 0, v[:, i])
+        for k, order in enumerate(orders):
+            if len(order) < 2:
+                continue
+            follower, leader = order[:-1], order[1:]
+            gap = pos[leader] - pos[follower] - length
+            gap = np.where(crashed[follower] & crashed[leader], np.inf, gap)
+            min_gap = result['min_gap']
+            min_gap[follower] = np.minimum(min_gap[follower], gap)
+
+            hit = np.flatnonzero(gap < 0)
+            for j in hit:
+                # From the back to the front, so that a pile-up stays in order.
+                back, front = follower[j], leader[j]
+                if not crashed[back]:
+                    result['crash_step'][back], result['hit'][back] = i, front
+                    result['impact_speed'][back] = vel[back] - vel[front]
+                if not crashed[front]:
+                    result['crash_step'][front] = i
+                crashed[back] = crashed[front] = True
+                frozen[front] = pos[front]
+                frozen[back] = pos[back] = min(pos[back], pos[front] - length)
+
+            close = (gap >= 0) & (gap < headway * vel[follower]) & ~crashed[follower]
+            result['headway_steps'][follower[close]] += 1
+            orders[k] = order[np.argsort(pos[order], kind='stable')]
+    return result
+
+
+def summarize(outcome, timestep):
+    """
+    Return the outcome of a whole traffic run.
+
+    :param outcome: The outcome of every vehicle, as returned by simulate (np.ndarray).
+    :param timestep: The timestep of the run (float).
+    :return: A TRAFFIC record.
+    """
+    result = np.zeros((), dtype=TRAFFIC)
+    result['vehicles'] = len(outcome)
+    result['failed'] = outcome['failed'].sum()
+    result['crashed'] = (outcome['crash_step'] >= 0).sum()
+    result['collisions'] = (outcome['hit'] >= 0).sum()
+    result['headway_time'] = outcome['headway_steps'].sum() * timestep
+    result['min_gap'] = outcome['min_gap'].min() if len(outcome) else np.inf
+    return result
+
+
+def impact(benign, faulty, timestep):
+    """
+    Return the difference an attack makes to a traffic run: the faulty run minus the benign run of the same vehicles.
+
+    :param benign: The outcome of every vehicle of the benign run (np.ndarray).
+    :param faulty: The outcome of every vehicle of the faulty run (np.ndarray).
+    :param timestep: The timestep of the runs (float).
+    :return: A TRAFFIC record.
+    """
+    benign, faulty = summarize(benign, timestep), summarize(faulty, timestep)
+    result = np.zeros((), dtype=TRAFFIC)
+    for field in TRAFFIC.names:
+        result[field] = faulty[field] - benign[field]
+    return result
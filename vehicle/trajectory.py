@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+
+class Trajectory:
+    """
+    The trajectory of a CAV as views over its time, position, velocity and acceleration arrays. Columns can be looked up
+    by their short (t, x, v, a) or long (time, position, velocity, acceleration) names, and the trajectory is only
+    turned into a DataFrame on demand, for plotting or exporting.
+    """
+
+    __slots__ = ('t', 'x', 'v', 'a')
+
+    columns = (('t', 'time'), ('x', 'position'), ('v', 'velocity'), ('a', 'acceleration'))
+
+    def __init__(self, t, x, v, a):
+        """
+        The constructor for the trajectory.
+
+        :param t: The time at each time step, in seconds (np.ndarray).
+        :param x: The position at each time step, in meters (np.ndarray).
+        :param v: The velocity at each time step, in m/s (np.ndarray).
+        :param a: The acceleration at each time step, in m/s^2 (np.ndarray).
+        """
+        self.t = t
+        self.x = x
+        self.v = v
+        self.a = a
+
+    def __len__(self):
+        return len(self.t)
+
+    def __getitem__(self, name):
+        for short, long in self.columns:
+            if name == short or name == long:
+                return getattr(self, short)
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return any(name == short or name == long for short, long in self.columns)
+
+    def view(self):
+        """
+        Return a trajectory over the same arrays.
+
+        :return: The view of the trajectory (Trajectory).
+        """
+        return Trajectory(self.t, self.x, self.v, self.a)
+
+    def copy(self):
+        """
+        Return a trajectory over copies of the arrays.
+
+        :return: The copy of the trajectory (Trajectory).
+        """
+        return Trajectory(self.t.copy(), self.x.copy(), self.v.copy(), self.a.copy())
+
+    def crash(self, i, x_crash):
+        """
+        Truncate the trajectory in place with a crash at time step i: from then on, the CAV stands still at x_crash.
+
+        :param i: The time step of the crash (int).
+        :param x_crash: The position of the crash, in meters (np.float32).
+        """
+        self.v[i:] = 0
+        self.a[i:] = 0
+        self.x[i:] = x_crash
+
+    def to_frame(self):
+        """
+        Return the trajectory as a DataFrame.
+
+        :return: A pandas DataFrame with information on the CAV's position, velocity, and acceleration.
+        """
+        data = np.column_stack((self.t, self.x, self.v, self.a))
+        return pd.DataFrame(data, columns=[long for _, long in self.columns])
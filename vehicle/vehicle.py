@@ -1,6 +1,42 @@
 import numpy as np
-import pandas as pd
 import random as r
+import time
+import warnings
+
+from vehicle import jit
+from vehicle.message import RS, S, parse
+from vehicle.trajectory import Trajectory
+
+# Modes of a vehicle within a trip, as a Stream drives it.
+_ACC, _RAN, _RS_DEC, _RS_ACC, _RS_CRUISE, _S_DEC, _S_HOLD, _DONE, _FAILED = range(9)
+
+# Actions of the random trajectory phase and the acceleration each of them applies, in m/s^2. NO_ACTION stands for the
+# previous action of a CAV that has not taken any yet.
+ACC_FAST, ACC_SLOW, DEC_FAST, DEC_SLOW, NO_ACC, NO_ACTION = range(6)
+ACCELERATIONS = (2, 1, -3, -1, 0)
+# The previous action each action is recorded as: accelerating or decelerating slowly is recorded as doing it fast.
+RECORDED = (ACC_FAST, ACC_FAST, DEC_FAST, DEC_FAST, NO_ACC)
+
+# Option X of Vehicle.acc_ran means we select ANY random action from OPTIONS[X].
+OPTIONS = (
+    (ACC_FAST, ACC_SLOW, DEC_FAST, DEC_SLOW, NO_ACC),
+    (ACC_FAST, NO_ACC),
+    (ACC_SLOW, NO_ACC),
+    (DEC_SLOW, NO_ACC),
+    (DEC_SLOW, NO_ACC, ACC_FAST, ACC_FAST),
+    (NO_ACC, ACC_FAST, ACC_SLOW),
+    (DEC_FAST, DEC_SLOW),
+    (DEC_FAST, DEC_SLOW, NO_ACC),
+    (ACC_FAST, ACC_SLOW, NO_ACC),
+)
+# The rules of the decision table: a rule below FORCED selects from OPTIONS[rule], a rule below NOTHING forces action
+# rule - FORCED and NOTHING leaves the acceleration at 0 without recording an action.
+FORCED = len(OPTIONS)
+NOTHING = FORCED + NO_ACTION
+
+# The number of vehicles from which Vehicle.trajectories drives a fleet together rather than one vehicle at a time:
+# below 20 to 50 vehicles, depending on the timestep, the rounds of lockstep cost more than the trips they batch.
+FLEET_MIN = 48
 
 
 class Vehicle:
@@ -9,20 +45,51 @@ class Vehicle:
     based on various parameters.
     """
 
-    def __init__(self, v_max, a_max):
+    def __init__(self, v_max, a_max, disk_cache=None, backend='numpy', overlap='drop', stats=None, speed_up=False):
         """
         The constructor for the CAV.
 
         :param v_max: The maximum velocity of the vehicle, in m/s (int).
         :param a_max: The maximum acceleration of the vehicle, in m/s^2 (int).
+        :param disk_cache: An optional cache of trajectories on disk (TrajectoryCache).
+        :param backend: How trajectories are integrated, 'numpy' or 'numba' (str). Both give identical trajectories;
+                        'numba' falls back to 'numpy' if numba is not installed.
+        :param overlap: What happens to a V2I comm passed in while another one is executing or at the same time step
+                        as another one (str). With 'drop', it is never read and only the last of the comms passed in
+                        at the same time step is read. With 'queue', it is read as soon as the CAV is done with the
+                        comms passed in before it, in the order they were passed in.
+        :param stats: Optional instrumentation the trips of the CAV are recorded into (Stats).
+        :param speed_up: Whether a CAV that reads an RS comm while too slow to traverse the WZ before the end of the
+                         trip (say, a stopped one) first speeds up to the RSWZ speed limit at a_max (bool). Without it,
+                         such a trip cannot be generated and raises an IndexError.
         """
         self.v_max = v_max
         self.a_max = a_max
         self.cache = None
-        self.prev_action = None
+        self.prev_action = NO_ACTION
         self.comms = []
-
-    def trajectory(self, v_init, timestep, duration, v2i_comms, seed=0):
+        self.ids = {}
+        self.windows = {}
+        self.checkpoints = {}
+        self.trip = None
+        # Every trip reseeds this generator with the seed of the trip, which gives the same stream as
+        # random.seed(seed), without touching the global generator.
+        self.rng = r.Random()
+        self.disk_cache = disk_cache
+        if backend not in ('numpy', 'numba'):
+            raise ValueError("Unknown backend %r." % backend)
+        if backend == 'numba' and jit.numba is None:
+            warnings.warn("numba is not installed, falling back to the numpy backend.")
+            backend = 'numpy'
+        self.backend = backend
+        self.integrate = jit.integrate if backend == 'numba' else integrate
+        if overlap not in ('drop', 'queue'):
+            raise ValueError("Unknown overlap policy %r." % overlap)
+        self.overlap = overlap
+        self.stats = stats
+        self.speed_up = speed_up
+
+    def trajectory(self, v_init, timestep, duration, v2i_comms, seed=0, offsets=None):
         """
         Reports the velocity, position, and acceleration of the CAV at each timestep up until duration as a dictionary.
 
@@ -31,11 +98,25 @@ class Vehicle:
         :param duration: The duration of the trip, in seconds (int).
         :param seed: The seed of the trip (int).
         :param v2i_comms: V2I communications (list).
+        :param offsets: The time steps after the start of the random trajectory phase at which each V2I comm is passed
+                        in, drawn at random if None (list).
         """
+        # A trajectory found in the disk cache is restored without being generated.
+        key = None
+        if self.disk_cache is not None:
+            key = self.disk_cache.key(self, v_init, timestep, duration, v2i_comms, seed, offsets)
+            if self.disk_cache.load(self, key):
+                if self.stats is not None:
+                    self.stats.cached += 1
+                return
+
         # Clear cache from previous trajectory
-        self.prev_action = None
+        self.prev_action = NO_ACTION
         self.cache = None
-        self.comms = []  # self.comms = [( (v2i[i], [start, end, i where v = 0 or v = rs]))]
+        self.comms = []  # self.comms = [(message, (start, end, i where v = 0 or v = rs))]
+        self.ids = {}  # self.ids = {kind of message: [index within v2i_comms of each message read]}
+        self.windows = {}  # self.windows = {index within v2i_comms: (start, end, i where v = 0 or v = rs)}
+        self.checkpoints = {}  # self.checkpoints = {k: (i, counter, prev_action, rng state, len(self.comms), cursor)}
 
         # Initialize velocity (v), acceleration (a), position (x), and time (t) arrays,
         # and pseudorandom number generator.
@@ -45,7 +126,7 @@ class Vehicle:
         x = np.zeros(N, dtype=np.float32)
         v = np.zeros(N, dtype=np.float32)
         a = np.zeros(N, dtype=np.float32)
-        r.seed(seed)
+        self.rng.seed(seed)
 
         # Initialize entry 0 of velocity array with init_v
         v[0] = v_init
@@ -54,189 +135,121 @@ class Vehicle:
         # acceleration phase, random trajectory phase, and deceleration phase.
         # Our acceleration phase should be last from t = 1 up until t = [N/5, N/4]
         # At most, 25% of the trip is the vehicle accelerating
+        # Every phase is integrated in segments of constant acceleration (see integrate).
         # ACCELERATION PHASE:
+        if self.stats is not None:
+            self.stats.trips += 1
+            started = time.perf_counter()
         acc_t_start = 1
-        acc_t_end = (int(r.uniform((len(t) - 1) / 5, (len(t) - 1) / 4))) + 1
-        acc_duration = (duration / ((len(t) - 1) / (acc_t_end - 1)))
-        acc = self.acc_acc(int(r.uniform(0, 4)), v[0], acc_duration, acc_t_end - 1)
-        for i in range(acc_t_start, acc_t_end):
-            # Update trajectory information
-            a[i] = acc(i)
-            x[i] = x[i - 1] + tau * v[i - 1] + (0.5 * a[i] * (tau ** 2))
-            v[i] = v[i - 1] + tau * a[i]
-            t[i] = t[i - 1] + tau
+        acc_t_end, acc, arrivals = self.plan(v[0], tau, duration, N, v2i_comms, offsets)
+        # The acceleration scenarios switch value at most once, halfway through the acceleration phase.
+        steps = np.arange(acc_t_start, acc_t_end)
+        a[acc_t_start:acc_t_end] = np.where(steps <= (acc_t_end - 1) / 2, acc(acc_t_start), acc(acc_t_end - 1))
+        self.integrate(x, v, a, acc_t_start, acc_t_end, tau)
+        if self.stats is not None:
+            self.stats.phase('acceleration', started, acc_t_end - acc_t_start)
+
+        self.trip = dict({'v_init': v_init, 'timestep': timestep, 'duration': duration, 'seed': seed,
+                          'ran_t_start': acc_t_end, 'ran_t_end': int((9 / 10) * len(t)) + 1, 'arrivals': arrivals})
+        self.drive(t, x, v, a, v2i_comms, acc_t_end, 0, 0)
+
+        if key is not None:
+            self.disk_cache.save(self, key)
+
+    def drive(self, t, x, v, a, v2i_comms, i, counter, cursor):
+        """
+        Drives the CAV of the current trip through the random trajectory phase from time step i and then through the
+        deceleration phase. The V2I comms are consumed in the order they are passed in, following the overlap policy of
+        the CAV. The state of the CAV is saved in self.checkpoints as each V2I comm is passed in, so that the trip can
+        be resumed from there (see retrace).
+
+        :param t: The time array of the trip (np.ndarray).
+        :param x: The position array of the trip, filled in up until time step i (np.ndarray).
+        :param v: The velocity array of the trip, filled in up until time step i (np.ndarray).
+        :param a: The acceleration array of the trip, filled in up until time step i (np.ndarray).
+        :param v2i_comms: V2I communications, where None is a comm the CAV ignores (list).
+        :param i: The time step to drive from (int).
+        :param counter: The number of time steps of the random trajectory phase taken so far (int).
+        :param cursor: The number of V2I comms, in the order they are passed in, consumed so far (int).
+        """
+        tau = self.trip['timestep']
+        messages = [parse(comm) for comm in v2i_comms]
+        # The V2I comms sorted by the time step they are passed in at, consumed with a cursor.
+        order = np.argsort(self.trip['arrivals'], kind='stable')
+        arrivals = np.asarray(self.trip['arrivals'], dtype=np.int64)[order]
+        n_comms = len(order)
 
         # Moving in constant velocity now.
         # RANDOM TRAJECTORY PHASE:
-        ran_t_start = acc_t_end
-        ran_t_end = int((9 / 10) * len(t)) + 1
-        counter = 0
-        i = ran_t_start
-
-        # Lines 76-84 just represent the V2I comms that will be passed in the CAV during its trajectory.
-        increments = [r.randint(50, 150) for _ in range(len(v2i_comms))]
-        if v2i_comms:
-            v2i = \
-                {
-                    ran_t_start + increments[i]: v2i_comms[i] for i in range(len(v2i_comms))
-                }
-        else:
-            v2i = {}
+        ran_t_start = self.trip['ran_t_start']
+        ran_t_end = self.trip['ran_t_end']
+        stats = self.stats
+        if stats is not None:
+            started, counted = time.perf_counter(), counter
+        ramps = {}  # ramps = {acceleration: the change in velocity of each time step of a segment (see accelerate)}
 
         while i < ran_t_end:
-            if i in v2i:
+            if self.overlap == 'drop':
+                # V2I comms passed in while another comm was executing are never read.
+                while cursor < n_comms and arrivals[cursor] < i:
+                    cursor += 1
+
+            if cursor < n_comms and arrivals[cursor] <= i:
+                last = cursor
+                if self.overlap == 'drop':
+                    # Of the V2I comms passed in at the same time step, only the last one is read.
+                    while last + 1 < n_comms and arrivals[last + 1] == i:
+                        last += 1
+                for c in range(cursor, last + 1):
+                    # Save the state of the CAV as the V2I comm is passed in.
+                    self.checkpoints[int(order[c])] = (i, counter, self.prev_action, self.rng.getstate(),
+                                                       len(self.comms), cursor)
+                k = int(order[last])
+                cursor = last + 1
+                if messages[k] is None:
+                    continue
+
                 # Read in the V2I communication
-                # comm = ['RS', 'dist_to_WZ', 'speed_limit', 'len_of_WZ']
+                # comm = RS(dist_to_WZ, speed_limit, len_of_WZ)
                 # OR
-                # comm = ['S', 'dist_to_WZ', 'duration']
-                comm = v2i[i].split(",")
+                # comm = S(dist_to_WZ, duration)
+                comm = messages[k]
                 start = i
-
-                if comm[0] == 'RS':
-                    curr_v = v[i - 1]
-                    dist_to_WZ, des_v, dist_of_WZ = int(comm[1]), int(comm[2]), int(comm[3])
-
-                    # To calculate the appropriate deceleration, we use the following kinematic equation
-                    # a = (reduced_speed ** 2) - (speed ** 2) / ((2 * distance_to_WZ))
-                    if curr_v > des_v:
-                        dec = ((des_v ** 2) - (curr_v ** 2)) / (2 * dist_to_WZ)
-                        while v[i - 1] > des_v:
-                            a[i] = dec
-                            x[i] = x[i - 1] + tau * v[i - 1] + (0.5 * a[i] * (tau ** 2))
-                            v[i] = v[i - 1] + tau * a[i]
-                            t[i] = t[i - 1] + tau
-                            i += 1
-
-                    i_when_v_is_des_v = i
-
-                    # Whether our curr_v is above or below the RSWZ speed limit, we need to traverse the WZ.
-                    des_x = x[i - 1] + dist_of_WZ
-                    while x[i - 1] <= des_x:
-                        a[i] = 0
-                        x[i] = x[i - 1] + tau * v[i - 1] + (0.5 * a[i] * (tau ** 2))
-                        v[i] = v[i - 1] + tau * a[i]
-                        t[i] = t[i - 1] + tau
-                        i += 1
-                    end = i
-                    self.comms.append((v2i[start], (start, end, i_when_v_is_des_v)))
-
-                elif comm[0] == 'S':
-                    curr_v = v[i - 1]
-                    dist_to_WZ, stop_duration = int(comm[1]), int(int(comm[2]) / tau)
-                    # To calculate the appropriate deceleration, we use the following kinematic equation
-                    # a = (reduced_speed ** 2) - (speed ** 2) / ((2 * distance_to_WZ))
-                    dec = -(curr_v ** 2) / (2 * dist_to_WZ)
-                    while v[i - 1] > 0:
-                        a[i] = dec
-                        x[i] = x[i - 1] + tau * v[i - 1] + (0.5 * a[i] * (tau ** 2))
-                        v[i] = v[i - 1] + tau * a[i]
-                        if v[i] < 0:
-                            v[i] = 0
-                        t[i] = t[i - 1] + tau
-                        i += 1
-
-                    i_when_v_is_0 = i
-
-                    # Now we iterate over the duration of the stop
-                    for _ in range(stop_duration):
-                        v[i] = v[i - 1]
-                        x[i] = x[i - 1]
-                        a[i] = 0
-                        t[i] = t[i - 1] + tau
-                        i += 1
-
-                    end = i
-                    self.comms.append((v2i[start], (start, end, i_when_v_is_0)))
-            else:
+                if stats is not None:
+                    started = stats.phase('random', started, 0)
+
+                i, i_at_target = self.execute(x, v, a, i, comm, tau)
+                self.record(k, comm, (start, i, i_at_target))
+                if stats is not None:
+                    started = stats.message(comm.kind, started, i - start)
+                continue
+
+            # The decisions only depend on the velocity, so the run up until the next V2I comm or the end of the
+            # random trajectory phase is driven one decision point at a time integrating the velocity alone, and the
+            # positions of the whole run are integrated at once (see advance).
+            run_start = i
+            run_end = ran_t_end if cursor >= n_comms else min(ran_t_end, int(arrivals[cursor]))
+            while i < run_end:
                 if counter % 20 == 0:
-                    # 1st condition: is v[i] "far away" from v_max ?
-                    if self.is_v_far_from_v_max(v[i - 1]):
-                        # 2nd condition: is this our first iteration of the random trajectory phase?
-                        if i == ran_t_start:
-                            a[i] = self.acc_ran(v[i - 1], tau)
-                        else:
-                            # 3rd condition: what was our previous action?
-                            if self.prev_action == self.acc_fast or self.prev_action == self.acc_slow:
-                                # 4th condition: Were we accelerating fast or slow?
-                                if self.prev_action == self.acc_fast:
-                                    # 5th condition: Is our time step large? (Is our sampling rate big)
-                                    if tau >= 1:
-                                        a[i] = self.acc_ran(v[i - 1], tau, choice=4)
-                                    else:
-                                        a[i] = self.acc_ran(v[i - 1], tau, option=1)
-                                else:
-                                    a[i] = self.acc_ran(v[i - 1], tau, option=2)
-                            elif self.prev_action == self.dec_fast or self.prev_action == self.dec_fast:
-                                # 4th condition: Is v near zero?
-                                if self.is_v_near_zero(v[i - 1]):
-                                    # 5th condition: Were we decelerating fast or slow?
-                                    if self.prev_action == self.dec_fast:
-                                        # 6th condition: Is our time step large? (Is our sampling rate big)
-                                        if tau >= 1:
-                                            a[i] = self.acc_ran(v[i - 1], tau, choice=3)
-                                        else:
-                                            a[i] = self.acc_ran(v[i - 1], tau, option=3)
-                                    else:
-                                        a[i] = self.acc_ran(v[i - 1], tau, option=4)
-                                else:
-                                    a[i] = self.acc_ran(v[i - 1], tau)
-                            elif self.prev_action == self.no_acc:
-                                a[i] = self.acc_ran(v[i - 1], tau, option=5)
-                    else:
-                        # 2nd condition: is this our first iteration of the random trajectory phase?
-                        if i == ran_t_start:
-                            a[i] = self.acc_ran(v[i - 1], tau, option=6)
-                        else:
-                            # 3rd condition: What was the previous action?
-                            if self.prev_action == self.acc_fast or self.prev_action == self.acc_slow:
-                                # 4th condition: Were we accelerating fast or slow?
-                                if self.prev_action == self.acc_fast:
-                                    # 5th condition: Is v near v_max?
-                                    if self.is_v_near_v_max(v[i - 1]):
-                                        a[i] = self.acc_ran(v[i - 1], tau, option=6)
-                                    else:
-                                        # 6th condition: Is our time step large? (Is our sampling rate big)
-                                        if tau >= 1:
-                                            a[i] = self.acc_ran(v[i - 1], tau, option=7)
-                                        else:
-                                            a[i] = self.acc_ran(v[i - 1], tau, option=8)
-                                else:
-                                    # 5th condition: Is v near v_max?
-                                    if self.is_v_near_v_max(v[i - 1]):
-                                        a[i] = self.acc_ran(v[i - 1], tau, choice=3)
-                                    else:
-                                        # 6th condition: Is our time step large? (Is our sampling rate big)
-                                        if tau >= 1:
-                                            a[i] = self.acc_ran(v[i - 1], tau, option=3)
-                                        else:
-                                            a[i] = self.acc_ran(v[i - 1], tau)
-                            elif self.prev_action == self.dec_fast or self.prev_action == self.dec_slow:
-                                # 4th condition: Were we decelerating fast or slow?
-                                if self.prev_action == self.dec_fast:
-                                    # 5th condition: Is our time step large? (Is our sampling rate big)
-                                    if tau >= 1:
-                                        a[i] = self.acc_ran(v[i - 1], tau, option=7)
-                                    else:
-                                        a[i] = self.acc_ran(v[i - 1], tau, choice=4)
-                                else:
-                                    a[i] = self.acc_ran(v[i - 1], tau, option=7)
-                            elif self.prev_action == self.no_acc:
-                                # 4th condition: is v near v max?
-                                if self.is_v_near_v_max(v[i - 1]):
-                                    a[i] = self.acc_ran(v[i - 1], tau, option=6)
-                                else:
-                                    a[i] = self.acc_ran(v[i - 1], tau)
+                    acc = self.ran_policy(v[i - 1], tau, i == ran_t_start)
                 else:
-                    a[i] = a[i - 1]
-                # Update trajectory information
-                x[i] = x[i - 1] + tau * v[i - 1] + (0.5 * a[i] * (tau ** 2))
-                v[i] = v[i - 1] + tau * a[i]
+                    acc = float(a[i - 1])
+
+                # The acceleration stays constant up until the next decision point or the end of the run.
+                stop = min(i + 20 - counter % 20, run_end)
+                a[i:stop] = acc
+                ramp = ramps.get(acc)
+                if ramp is None:
+                    ramp = ramps[acc] = np.multiply(np.full(21, acc, dtype=np.float32), tau)
                 # If our updated velocity is less than 0, we set it to 0 to represent a stop.
-                v[i] = v[i] if v[i] > 0 else 0
-                t[i] = t[i - 1] + tau
+                accelerate(v, i, stop, ramp)
 
-                counter += 1
-                i += 1
+                counter += stop - i
+                i = stop
+            advance(x, v, a, run_start, i, tau)
+
+        if stats is not None:
+            started = stats.phase('random', started, counter - counted)
 
         # Given the current velocity we're traveling and the time remaining from the trip, we need to calculate
         # the value of acceleration to decelerate our current velocity such that it reaches 0 at the end.
@@ -247,17 +260,439 @@ class Vehicle:
         # Calculate appropriate deceleration value such that we make our vehicle come to a stop.
         dec_duration = (dec_t_end - dec_t_start + 1) * tau
         dec = - (v[dec_t_start - 1] / dec_duration)
-        for i in range(dec_t_start, dec_t_end + 1):
-            a[i] = dec
-            x[i] = x[i - 1] + tau * v[i - 1] + (0.5 * a[i] * (tau ** 2))
-            v[i] = v[i - 1] + tau * a[i]
-            t[i] = t[i - 1] + tau
+        a[dec_t_start:dec_t_end + 1] = dec
+        self.integrate(x, v, a, dec_t_start, dec_t_end + 1, tau)
 
         a[dec_t_end] = 0
         v[dec_t_end] = 0
+        if stats is not None:
+            stats.phase('deceleration', started, dec_t_end - dec_t_start + 1)
 
+        # Every phase advances the time by tau at each time step.
+        t[1:] = tau
+        np.add.accumulate(t, out=t)
         self.cache = dict({'t': t, 'x': x, 'v': v, 'a': a})
 
+    def execute(self, x, v, a, i, comm, tau):
+        """
+        Executes a V2I comm read at time step i of the current trip: an RS comm slows the CAV down to the RSWZ speed
+        limit and has it traverse the WZ, an S comm brings the CAV to a stop and holds it for the duration of the stop.
+
+        :param x: The position array of the trip, filled in up until time step i (np.ndarray).
+        :param v: The velocity array of the trip, filled in up until time step i (np.ndarray).
+        :param a: The acceleration array of the trip, filled in up until time step i (np.ndarray).
+        :param i: The time step the comm is read at (int).
+        :param comm: The V2I comm (RS or S).
+        :param tau: The timestep of the trip (int).
+        :return: Tuple containing the time step the execution ended at and the time step when v = 0 or v = rs.
+        """
+        N = len(x)
+        if isinstance(comm, RS):
+            curr_v = v[i - 1]
+            dist_to_WZ, des_v, dist_of_WZ = comm.dist_to_WZ, comm.speed_limit, comm.len_of_WZ
+
+            # To calculate the appropriate deceleration, we use the following kinematic equation
+            # a = (reduced_speed ** 2) - (speed ** 2) / ((2 * distance_to_WZ))
+            if curr_v > des_v:
+                dec = ((des_v ** 2) - (curr_v ** 2)) / (2 * dist_to_WZ)
+                i = integrate_while(x, v, a, i, dec, tau, lambda x_prev, v_prev: v_prev > des_v,
+                                    curr_v - des_v, -dec * tau, integrate=self.integrate)
+            elif self.speed_up and float(curr_v) * tau * (N - i) < dist_of_WZ < float(des_v) * tau * (N - i):
+                # A CAV too slow to traverse the WZ before the end of the trip (say, a stopped one) first speeds up
+                # to the RSWZ speed limit.
+                i = integrate_while(x, v, a, i, self.a_max, tau, lambda x_prev, v_prev: v_prev < des_v,
+                                    des_v, self.a_max * tau, integrate=self.integrate)
+
+            i_when_v_is_des_v = i
+
+            # Whether our curr_v is above or below the RSWZ speed limit, we need to traverse the WZ.
+            des_x = x[i - 1] + dist_of_WZ
+            i = integrate_while(x, v, a, i, 0, tau, lambda x_prev, v_prev: x_prev <= des_x,
+                                dist_of_WZ, v[i - 1] * tau, integrate=self.integrate)
+            return i, i_when_v_is_des_v
+
+        elif isinstance(comm, S):
+            curr_v = v[i - 1]
+            dist_to_WZ, stop_duration = comm.dist_to_WZ, int(comm.duration / tau)
+            # To calculate the appropriate deceleration, we use the following kinematic equation
+            # a = (reduced_speed ** 2) - (speed ** 2) / ((2 * distance_to_WZ))
+            dec = -(curr_v ** 2) / (2 * dist_to_WZ)
+            i = integrate_while(x, v, a, i, dec, tau, lambda x_prev, v_prev: v_prev > 0,
+                                curr_v, -dec * tau, clamp=True, integrate=self.integrate)
+
+            i_when_v_is_0 = i
+
+            # Now we hold the stop over the duration of the stop
+            if i + stop_duration > N:
+                raise IndexError("The stop at time step %d runs past the end of the trip." % i)
+            v[i:i + stop_duration] = v[i - 1]
+            x[i:i + stop_duration] = x[i - 1]
+            a[i:i + stop_duration] = 0
+            i += stop_duration
+            return i, i_when_v_is_0
+
+    def record(self, k, comm, window):
+        """
+        Records that the CAV read a V2I comm, indexing its window by the kind and the index of the comm.
+
+        :param k: The index of the comm within v2i_comms (int).
+        :param comm: The V2I comm (RS or S).
+        :param window: The start and end time step of the comm and the time step when v = 0 or v = rs (tuple).
+        """
+        window = tuple(int(i) for i in window)
+        self.comms.append((comm, window))
+        self.ids.setdefault(comm.kind, []).append(k)
+        self.windows[k] = window
+
+    def snapshot(self):
+        """
+        Returns the state of the CAV after its most recent trip, so that the trip can be retraced any number of times
+        with different tampered comms, each time from the same trip.
+
+        :return: The state of the CAV (tuple).
+        """
+        return (self.cache, list(self.comms), {kind: list(ids) for kind, ids in self.ids.items()}, dict(self.windows),
+                dict(self.checkpoints), self.prev_action, self.trip, self.rng.getstate())
+
+    def restore(self, snapshot):
+        """
+        Restores the state of the CAV saved by snapshot. The arrays of the trip are shared with the snapshot, which
+        retrace never writes to.
+
+        :param snapshot: The state of the CAV (tuple).
+        """
+        cache, comms, ids, windows, checkpoints, self.prev_action, self.trip, state = snapshot
+        self.cache = cache
+        self.comms = list(comms)
+        self.ids = {kind: list(k) for kind, k in ids.items()}
+        self.windows = dict(windows)
+        self.checkpoints = dict(checkpoints)
+        self.rng.setstate(state)
+
+    def retrace(self, k, v2i_comms):
+        """
+        Regenerates the most recent trip with tampered V2I communications, where only comm k differs from the comms the
+        trip was generated with. Everything before comm k is passed into the CAV stays the same, so the trip is resumed
+        from the checkpoint saved at that time step instead of being generated from the start. A comm that was never
+        read during the trip leaves it unchanged.
+
+        :param k: The index of the tampered comm within v2i_comms (int).
+        :param v2i_comms: V2I communications, where None is a comm the CAV ignores (list).
+        """
+        assert self.cache is not None, "Cannot retrace a trip as cache is empty."
+
+        checkpoint = self.checkpoints.get(k)
+        if checkpoint is None:
+            # The trip is unchanged, but it must not share memory with the benign trip.
+            self.cache = {col: values.copy() for col, values in self.cache.items()}
+            return
+
+        i, counter, prev_action, state, n_comms, cursor = checkpoint
+        N = len(self.cache['t'])
+        t = np.zeros(N, dtype=np.float32)
+        x = np.zeros(N, dtype=np.float32)
+        v = np.zeros(N, dtype=np.float32)
+        a = np.zeros(N, dtype=np.float32)
+        x[:i] = self.cache['x'][:i]
+        v[:i] = self.cache['v'][:i]
+        a[:i] = self.cache['a'][:i]
+
+        self.cache = None
+        comms, read = self.comms[:n_comms], list(self.windows)[:n_comms]
+        self.comms, self.ids, self.windows = [], {}, {}
+        for j, (comm, window) in zip(read, comms):
+            self.record(j, comm, window)
+        self.checkpoints = {j: saved for j, saved in self.checkpoints.items() if saved[5] < cursor}
+        self.prev_action = prev_action
+        self.rng.setstate(state)
+        self.drive(t, x, v, a, v2i_comms, i, counter, cursor)
+
+    def trajectories(self, v_inits, seeds, timestep, duration, v2i_comms, offsets=None):
+        """
+        Reports the velocity, position, and acceleration of a fleet of CAVs at each timestep up until duration. Every
+        vehicle draws from its own pseudorandom number generator seeded with its seed, so row k is the same trajectory
+        trajectory(v_inits[k], timestep, duration, v2i_comms, seed=seeds[k]) reports. Every vehicle is driven through
+        its acceleration phase on its own and the fleet through the rest of the trips together (see lockstep), unless
+        the fleet has fewer than FLEET_MIN vehicles, which are driven one at a time.
+
+        A vehicle whose trajectory cannot be generated (its acceleration scenario is invalid or a V2I comm is still
+        executing at the end of the trip) is reported as a row of NaN and a comms entry of None.
+
+        :param v_inits: The initial velocities of the vehicles, in m/s (list).
+        :param seeds: The seeds of the trips (list).
+        :param timestep: The timestep of the trips (int).
+        :param duration: The duration of the trips, in seconds (int).
+        :param v2i_comms: V2I communications passed into every vehicle (list).
+        :param offsets: The time steps after the start of the random trajectory phase at which each V2I comm is passed
+                        in, drawn at random for every vehicle if None (list).
+        :return: Tuple containing a dictionary of (n_vehicles, N) arrays and the comms of every vehicle (list).
+        """
+        tau = timestep
+        v2i_comms = [parse(comm) for comm in v2i_comms]
+        n = len(seeds)
+        N = int(duration / tau) + 1
+        t = np.zeros((n, N), dtype=np.float32)
+        x = np.zeros((n, N), dtype=np.float32)
+        v = np.zeros((n, N), dtype=np.float32)
+        a = np.zeros((n, N), dtype=np.float32)
+        v[:, 0] = v_inits
+        comms = [[] for _ in range(n)]
+
+        if n < FLEET_MIN:
+            # A small fleet is driven faster one vehicle at a time.
+            vehicle = Vehicle(self.v_max, self.a_max, backend=self.backend, overlap=self.overlap,
+                              speed_up=self.speed_up)
+            for k in range(n):
+                try:
+                    vehicle.trajectory(v_inits[k], timestep, duration, v2i_comms, seed=seeds[k], offsets=offsets)
+                except (TypeError, IndexError):
+                    t[k] = x[k] = v[k] = a[k] = np.nan
+                    comms[k] = None
+                    continue
+                t[k], x[k], v[k], a[k] = (vehicle.cache[col] for col in ('t', 'x', 'v', 'a'))
+                comms[k] = vehicle.comms
+            return dict({'t': t, 'x': x, 'v': v, 'a': a}), comms
+
+        # Per vehicle state: each vehicle draws from its own generator.
+        planner = Vehicle(self.v_max, self.a_max)
+        rngs = []
+        schedules = []
+        ran_t_start = np.zeros(n, dtype=np.int64)
+        failed = np.zeros(n, dtype=bool)
+
+        for k in range(n):
+            planner.rng = r.Random(seeds[k])
+            acc_t_end, acc, arrivals = planner.plan(v[k, 0], tau, duration, N, v2i_comms, offsets)
+            rngs.append(planner.rng)
+            schedules.append(self.schedule(arrivals, v2i_comms, range(len(v2i_comms))))
+            ran_t_start[k] = acc_t_end
+            if acc is None:
+                failed[k] = True
+                continue
+            # ACCELERATION PHASE: the acceleration scenarios switch value at most once, halfway through it.
+            steps = np.arange(1, acc_t_end)
+            a[k, 1:acc_t_end] = np.where(steps <= (acc_t_end - 1) / 2, acc(1), acc(acc_t_end - 1))
+            self.integrate(x[k], v[k], a[k], 1, acc_t_end, tau)
+
+        self.lockstep(t, x, v, a, ran_t_start, tau, schedules, rngs, np.full(n, NO_ACTION, dtype=np.intp),
+                      np.zeros(n, dtype=np.int64), ran_t_start, failed, comms)
+        return dict({'t': t, 'x': x, 'v': v, 'a': a}), comms
+
+    def retrace_many(self, k, fleet_comms):
+        """
+        Regenerates the most recent trip once for every list of tampered V2I comms of fleet_comms, where only comm k
+        differs from the comms the trip was generated with, as retrace does for each of them. Every trip is resumed
+        from the checkpoint of comm k, with the generator of the CAV in its state at that time step, and the whole
+        fleet is driven together (see lockstep), so trip j is the same trip retrace(k, fleet_comms[j]) drives.
+
+        A trip that cannot be generated (a V2I comm is still executing at the end of the trip) is reported as a row of
+        NaN and a comms entry of None.
+
+        :param k: The index of the tampered comm within the comms of every trip (int).
+        :param fleet_comms: The V2I comms of every trip, where None is a comm the CAV ignores (list).
+        :return: Tuple containing a dictionary of (n_trips, N) arrays, the comms of every trip (list) and the generator
+                 of every trip in its state at the end of the trip (list).
+        """
+        assert self.cache is not None, "Cannot retrace a trip as cache is empty."
+
+        n = len(fleet_comms)
+        checkpoint = self.checkpoints.get(k)
+        if checkpoint is None:
+            # Comm k was never read, so every trip is the most recent trip.
+            rngs = []
+            for _ in range(n):
+                rngs.append(r.Random())
+                rngs[-1].setstate(self.rng.getstate())
+            return ({col: np.tile(values, (n, 1)) for col, values in self.cache.items()},
+                    [list(self.comms) for _ in range(n)], rngs)
+
+        i, counter, prev_action, state, n_comms, cursor = checkpoint
+        tau = self.trip['timestep']
+        N = len(self.cache['t'])
+        fleet = {}
+        for col in ('t', 'x', 'v', 'a'):
+            fleet[col] = np.zeros((n, N), dtype=np.float32)
+            fleet[col][:, :i] = self.cache[col][:i]
+
+        # The V2I comms from the one passed in at the checkpoint on, in the order they are passed in.
+        arrivals = self.trip['arrivals']
+        order = np.argsort(arrivals, kind='stable')[cursor:]
+        schedules, rngs = [], []
+        for v2i_comms in fleet_comms:
+            schedules.append(self.schedule(arrivals, [parse(comm) for comm in v2i_comms], order))
+            rngs.append(r.Random())
+            rngs[-1].setstate(state)
+
+        comms = [list(self.comms[:n_comms]) for _ in range(n)]
+        self.lockstep(fleet['t'], fleet['x'], fleet['v'], fleet['a'], np.full(n, i, dtype=np.int64), tau, schedules,
+                      rngs, np.full(n, prev_action, dtype=np.intp), np.full(n, counter, dtype=np.int64),
+                      np.full(n, self.trip['ran_t_start'], dtype=np.int64), np.zeros(n, dtype=bool), comms)
+        return fleet, comms, rngs
+
+    def schedule(self, arrivals, v2i_comms, order):
+        """
+        Return the V2I comms a CAV of the fleet reads, following the overlap policy of the CAV: with 'drop', only the
+        last of the comms passed in at the same time step.
+
+        :param arrivals: The time step at which each V2I comm is passed in (list).
+        :param v2i_comms: V2I communications, where None is a comm the CAV ignores (list).
+        :param order: The indices of the comms within v2i_comms to schedule, in the order they are passed in (iterable).
+        :return: Sorted (time step, comm) tuples (list).
+        """
+        if self.overlap == 'drop':
+            return sorted({arrivals[j]: v2i_comms[j] for j in order}.items())
+        return sorted(((arrivals[j], v2i_comms[j]) for j in order), key=lambda item: item[0])
+
+    def lockstep(self, t, x, v, a, i, tau, schedules, rngs, prev_action, counter, ran_t_start, failed, comms):
+        """
+        Drives a fleet of CAVs through the random trajectory phase from time step i[k] of every vehicle k and then
+        through the deceleration phase, giving the trip drive gives every vehicle. Every vehicle keeps its own time step
+        and the fleet is driven in rounds: in each round, every vehicle in the random trajectory phase takes the segment
+        of constant acceleration up until its next decision point, V2I comm or the end of the phase, and the velocities
+        of the segments of the whole fleet are integrated together (see accelerate). Only the V2I comms are executed one
+        vehicle at a time (see execute), after which the positions of the run of the vehicle up until the comm are
+        integrated at once (see advance). The deceleration phase of the whole fleet is integrated at once too.
+
+        Row k of every array is the trip of vehicle k, and a vehicle whose trip cannot be generated is set to a row of
+        NaN and a comms entry of None.
+
+        :param t: The time arrays of the trips (np.ndarray).
+        :param x: The position arrays of the trips, filled in up until time step i[k] (np.ndarray).
+        :param v: The velocity arrays of the trips, filled in up until time step i[k] (np.ndarray).
+        :param a: The acceleration arrays of the trips, filled in up until time step i[k] (np.ndarray).
+        :param i: The time step every vehicle is driven from (np.ndarray).
+        :param tau: The timestep of the trips (int).
+        :param schedules: The V2I comms every vehicle is yet to be passed, as returned by schedule (list).
+        :param rngs: The pseudorandom number generator of every vehicle (list).
+        :param prev_action: The previous action of every vehicle (np.ndarray).
+        :param counter: The number of time steps of the random trajectory phase every vehicle took so far (np.ndarray).
+        :param ran_t_start: The time step every vehicle started its random trajectory phase at (np.ndarray).
+        :param failed: Whether the trip of every vehicle already cannot be generated (np.ndarray).
+        :param comms: The comms every vehicle read so far, appended to (list).
+        """
+        n, N = x.shape
+        ran_t_end = int((9 / 10) * N) + 1
+        i = np.array(i, dtype=np.int64)
+        run_start = i.copy()
+        cursor = np.zeros(n, dtype=np.int64)
+        next_arrival = np.array([schedule[0][0] if schedule else N + 1 for schedule in schedules], dtype=np.int64)
+        driving = ~failed
+        offsets = np.arange(20)
+
+        def settle(k):
+            """
+            Integrates the positions of the run of vehicle k up until its time step, then executes the V2I comms passed
+            in at that time step and ends the random trajectory phase of the vehicle once it is over.
+            """
+            advance(x[k], v[k], a[k], run_start[k], i[k], tau)
+            schedule = schedules[k]
+            while i[k] < ran_t_end:
+                if self.overlap == 'drop':
+                    # V2I comms passed in while another comm was executing are never read.
+                    while cursor[k] < len(schedule) and schedule[cursor[k]][0] < i[k]:
+                        cursor[k] += 1
+                if cursor[k] == len(schedule) or schedule[cursor[k]][0] > i[k]:
+                    break
+                comm = schedule[cursor[k]][1]
+                cursor[k] += 1
+                if comm is None:
+                    continue
+                start = int(i[k])
+                try:
+                    i[k], i_at_target = self.execute(x[k], v[k], a[k], start, comm, tau)
+                except IndexError:
+                    failed[k], driving[k] = True, False
+                    return
+                comms[k].append((comm, (start, int(i[k]), i_at_target)))
+            run_start[k] = i[k]
+            next_arrival[k] = schedule[cursor[k]][0] if cursor[k] < len(schedule) else N + 1
+            driving[k] = i[k] < ran_t_end
+
+        while True:
+            for k in np.flatnonzero(driving & ((next_arrival <= i) | (i >= ran_t_end))):
+                settle(k)
+            rows = np.flatnonzero(driving)
+            if not rows.size:
+                break
+
+            at = i[rows]
+            phase = counter[rows] % 20
+            acc = a[rows, at - 1]
+            deciding = np.flatnonzero(phase == 0)
+            if deciding.size:
+                d = rows[deciding]
+                acc[deciding], prev_action[d] = self.decide(v[d, at[deciding] - 1], tau, at[deciding] == ran_t_start[d],
+                                                            prev_action[d], [rngs[k] for k in d])
+
+            # The acceleration stays constant up until the next decision point, the next V2I comm or the end of the
+            # random trajectory phase, whichever comes first.
+            stop = np.minimum(np.minimum(at + 20 - phase, ran_t_end), next_arrival[rows])
+            ramp = np.empty((rows.size, 21), dtype=np.float32)
+            ramp[:, 0] = v[rows, at - 1]
+            ramp[:, 1:] = tau * acc[:, None]
+            np.add.accumulate(ramp, axis=1, out=ramp)
+            # If our updated velocity is less than 0, we set it to 0 to represent a stop.
+            ramp[:, 1:][np.logical_or.accumulate((acc < 0)[:, None] & ~(ramp[:, 1:] > 0), axis=1)] = 0
+
+            taken = offsets < (stop - at)[:, None]
+            cells = np.broadcast_to(rows[:, None], taken.shape)[taken], (at[:, None] + offsets)[taken]
+            v[cells] = ramp[:, 1:][taken]
+            a[cells] = np.broadcast_to(acc[:, None], taken.shape)[taken]
+            counter[rows] += stop - at
+            i[rows] = stop
+
+        # DECELERATION PHASE:
+        dec_t_start = ran_t_end
+        dec_t_end = N - 1
+        dec_duration = (dec_t_end - dec_t_start + 1) * tau
+        a[:, dec_t_start:] = - (v[:, dec_t_start - 1:dec_t_start] / dec_duration)
+        steps = np.empty((n, N - dec_t_start + 1), dtype=np.float32)
+        steps[:, 0] = v[:, dec_t_start - 1]
+        steps[:, 1:] = tau * a[:, dec_t_start:]
+        np.add.accumulate(steps, axis=1, out=steps)
+        v[:, dec_t_start:] = steps[:, 1:]
+        advance(x, v, a, dec_t_start, N, tau)
+
+        a[:, dec_t_end] = 0
+        v[:, dec_t_end] = 0
+
+        # Every phase advances the time by tau at each time step.
+        t[:, 1:] = tau
+        np.add.accumulate(t, axis=1, out=t)
+
+        for k in np.flatnonzero(failed):
+            t[k] = x[k] = v[k] = a[k] = np.nan
+            comms[k] = None
+
+    def plan(self, v_init, tau, duration, N, v2i_comms, offsets=None):
+        """
+        Draws the random parameters of a trip from the pseudorandom number generator of the CAV: the end of the
+        acceleration phase, the acceleration scenario of the acceleration phase and the time steps at which the V2I
+        comms are passed into the vehicle.
+
+        :param v_init: The initial velocity of the vehicle, in m/s (np.float32).
+        :param tau: The timestep of the trip (int).
+        :param duration: The duration of the trip, in seconds (int).
+        :param N: The number of time steps of the trip (int).
+        :param v2i_comms: V2I communications (list).
+        :param offsets: The time steps after the start of the random trajectory phase at which each V2I comm is passed
+                        in, drawn at random if None (list).
+        :return: Tuple containing the end of the acceleration phase, the acceleration function and the time step at
+                 which each V2I comm is passed into the vehicle.
+        """
+        acc_t_end = (int(self.rng.uniform((N - 1) / 5, (N - 1) / 4))) + 1
+        acc_duration = (duration / ((N - 1) / (acc_t_end - 1)))
+        acc = self.acc_acc(int(self.rng.uniform(0, 4)), v_init, acc_duration, acc_t_end - 1)
+
+        # The time steps at which the V2I comms will be passed in the CAV during its random trajectory phase.
+        if offsets is None:
+            increments = [self.rng.randint(50, 150) for _ in range(len(v2i_comms))]
+        else:
+            assert len(offsets) == len(v2i_comms), "Every V2I comm needs an offset."
+            increments = [int(offset) for offset in offsets]
+        arrivals = [acc_t_end + increments[k] for k in range(len(v2i_comms))]
+        return acc_t_end, acc, arrivals
+
     def acc_acc(self, choice, v_init, duration, acc_duration):
         """
         A HoF that will return the acceleration scenario for the CAV during the acceleration phase. With the given
@@ -271,8 +706,8 @@ class Vehicle:
         :return: A function representing the acceleration scenario for this trip's acceleration phase.
         """
 
-        v_des = int(r.uniform(v_init + 5, self.v_max))  # v_des = [init_v + 5, max_v]
-        v_fast = int(r.uniform((3 * v_des) / 4, (7 * v_des) / 8))  # v_fast = [(3/4) * v_des, (7/8) * v_des]
+        v_des = int(self.rng.uniform(v_init + 5, self.v_max))  # v_des = [init_v + 5, max_v]
+        v_fast = int(self.rng.uniform((3 * v_des) / 4, (7 * v_des) / 8))  # v_fast = [(3/4) * v_des, (7/8) * v_des]
 
         def acc_quickly_then_slowly(curr_t):
             """
@@ -371,6 +806,60 @@ class Vehicle:
         """
         return (v - self.v_max) <= 10
 
+    def ran_policy(self, v, tau, first):
+        """
+        Picks the acceleration of the CAV at a decision point of the random trajectory phase based on the previous
+        action and how close the velocity is to zero and v_max. The decision tree is looked up in RULES (see
+        compile_policy), so a decision costs a table lookup and at most one draw.
+
+        :param v: The previous velocity of the vehicle, in m/s (np.float64).
+        :param tau: The timestep of the current trip (int).
+        :param first: Whether this is the first decision of the random trajectory phase (bool).
+        :return: The new acceleration of the vehicle.
+        """
+        # The conditions hold for the velocity as a Python float exactly when they hold for it as a float32, and are
+        # much cheaper to check.
+        u = float(v)
+        rule = RULES[self.prev_action][int(self.is_v_far_from_v_max(u))][int(self.is_v_near_zero(u))][
+            int(self.is_v_near_v_max(u))][int(first)][int(tau >= 1)]
+        if rule < FORCED:
+            return self.acc_ran(v, tau, option=rule)
+        if rule < NOTHING:
+            return self.acc_ran(v, tau, choice=rule - FORCED)
+        if self.stats is not None:
+            self.stats.decisions[NOTHING, NO_ACC] += 1
+        return 0
+
+    def decide(self, v, tau, first, prev_action, rngs):
+        """
+        Takes the decision of ran_policy for many CAVs at once: the rules of every CAV are looked up in POLICY together
+        and only the draws from the options are taken one CAV at a time, each from the generator of its CAV.
+
+        :param v: The previous velocities of the vehicles, in m/s (np.ndarray).
+        :param tau: The timestep of the current trip (int).
+        :param first: Whether this is the first decision of the random trajectory phase of each vehicle (np.ndarray).
+        :param prev_action: The previous action of each vehicle (np.ndarray).
+        :param rngs: The pseudorandom number generator of each vehicle (list).
+        :return: Tuple containing the new accelerations and the new previous actions of the vehicles.
+        """
+        rules = POLICY[prev_action, self.is_v_far_from_v_max(v).astype(np.intp), self.is_v_near_zero(v).astype(np.intp),
+                       self.is_v_near_v_max(v).astype(np.intp), np.asarray(first, dtype=np.intp), int(tau >= 1)]
+        actions = np.minimum(rules - FORCED, NO_ACC)
+        for j in np.flatnonzero(rules < FORCED):
+            actions[j] = rngs[j].choice(OPTIONS[rules[j]])
+
+        acc = np.take(ACCELERATIONS, actions)
+        # Check whether v will go below zero, If it does, do not accelerate/decelerate.
+        stopped = (acc < 0) & ((v + np.array([tau * dv for dv in ACCELERATIONS], dtype=np.float32)[actions]) < 0)
+        actions[stopped] = NO_ACC
+        acc[stopped] = 0
+        recorded = np.take(RECORDED, actions)
+
+        nothing = rules == NOTHING
+        acc[nothing] = 0
+        recorded[nothing] = prev_action[nothing]
+        return acc, recorded
+
     def acc_ran(self, v, tau, option=0, choice=None):
         """
         A function that serves as the control panel for acceleration during the random trajectory phase. Returns the
@@ -378,53 +867,35 @@ class Vehicle:
 
         :param v: The previous velocity of the vehicle, in m/s (np.float64).
         :param tau: The timestep of the current trip (int).
-        :param option: An option that determines which pool of actions we will randomly select from (int).
+        :param option: An option that determines which pool of actions (OPTIONS) we will randomly select from (int).
         :param choice: An optional parameter such that we restrict ourselves to a single action (int).
         :return: The new acceleration of the vehicle.
         """
+        if choice is not None:  # We force a particular action
+            action = min(choice, NO_ACC)
+        else:
+            # Randomly choose action from the pool of the option
+            action = self.rng.choice(OPTIONS[option])
+        if self.stats is not None:
+            self.stats.decisions[option if choice is None else FORCED + choice, action] += 1
+        return self.act(action, v, tau)
 
-        all_actions = [self.acc_fast, self.acc_slow, self.dec_fast, self.dec_slow, self.no_acc]
-        subset_actions = []
+    def act(self, action, v, tau):
+        """
+        Takes an action of the random trajectory phase and records it as the previous action.
 
-        if choice is not None:  # We force a particular action
-            if choice == 0:
-                return self.acc_fast()
-            elif choice == 1:
-                return self.acc_slow()
-            elif choice == 2:
-                return self.dec_fast(v, tau)
-            elif choice == 3:
-                return self.dec_slow(v, tau)
-            else:
-                return self.no_acc()
-
-        # Option X means we select ANY random action from ...
-
-        if option == 0:  # all_actions
-            subset_actions = all_actions
-        elif option == 1:  # (acc fast, no acc)
-            subset_actions = [self.acc_fast, self.no_acc]
-        elif option == 2:  # (acc slow, no acc)
-            subset_actions = [self.acc_slow, self.no_acc]
-        elif option == 3:  # (dec slow, no acc)
-            subset_actions = [self.dec_slow, self.no_acc]
-        elif option == 4:  # (dec slow, no acc, acc fast, acc slow)
-            subset_actions = [self.dec_slow, self.no_acc, self.acc_fast, self.acc_fast]
-        elif option == 5:  # (no acc, acc fast, acc slow)
-            subset_actions = [self.no_acc, self.acc_fast, self.acc_slow]
-        elif option == 6:  # (dec fast, dec slow)
-            subset_actions = [self.dec_fast, self.dec_slow]
-        elif option == 7:  # (dec fast, dec slow, no acc)
-            subset_actions = [self.dec_fast, self.dec_slow, self.no_acc]
-        elif option == 8:  # (acc fast, acc slow, no acc)
-            subset_actions = [self.acc_fast, self.acc_slow, self.no_acc]
-
-        # Randomly choose action from subset_actions
-        action = r.choice(subset_actions)
-
-        if action == self.acc_fast or action == self.acc_slow or action == self.no_acc:
-            return action()
-        return action(v, tau)
+        :param action: The action to take, ACC_FAST, ACC_SLOW, DEC_FAST, DEC_SLOW or NO_ACC (int).
+        :param v: The previous velocity of the vehicle, in m/s (np.float64).
+        :param tau: The timestep of the current trip (int).
+        :return: The new acceleration of the vehicle.
+        """
+        acc = ACCELERATIONS[action]
+        # Check whether v will go below zero, If it does, do not accelerate/decelerate.
+        # v[i - 1] + tau * candidate_a = v[i]
+        if acc < 0 and (v + tau * acc) < 0:
+            action, acc = NO_ACC, 0
+        self.prev_action = RECORDED[action]
+        return acc
 
     # Control panel for accelerating and decelerating during the random trajectory phase.
 
@@ -434,8 +905,7 @@ class Vehicle:
 
         :return: The new acceleration of the vehicle.
         """
-        self.prev_action = self.acc_fast
-        return 2
+        return self.act(ACC_FAST, None, None)
 
     def acc_slow(self):
         """
@@ -443,8 +913,7 @@ class Vehicle:
 
         :return: The new acceleration of the vehicle.
         """
-        self.prev_action = self.acc_fast
-        return 1
+        return self.act(ACC_SLOW, None, None)
 
     def dec_fast(self, v, tau):
         """
@@ -454,13 +923,7 @@ class Vehicle:
         :param tau: The timestep of the current trip (int).
         :return: The new acceleration of the vehicle.
         """
-        # Check whether v will go below zero, If it does, do not accelerate/decelerate.
-        # v[i - 1] + tau * candidate_a = v[i]
-        if (v + tau * -3) < 0:
-            self.prev_action = self.no_acc
-            return self.no_acc()
-        self.prev_action = self.dec_fast
-        return -3
+        return self.act(DEC_FAST, v, tau)
 
     def dec_slow(self, v, tau):
         """
@@ -470,13 +933,7 @@ class Vehicle:
         :param tau: The timestep of the current trip (int).
         :return: The new acceleration of the vehicle.
         """
-        # Check whether v will go below zero. If it does, do not accelerate/decelerate.
-        # v[i - 1] + tau * candidate_a = v[i]
-        if (v + tau * -1) < 0:
-            self.prev_action = self.no_acc
-            return self.no_acc()
-        self.prev_action = self.dec_fast
-        return -1
+        return self.act(DEC_SLOW, v, tau)
 
     def no_acc(self):
         """
@@ -484,19 +941,203 @@ class Vehicle:
 
         :return: The new acceleration of the vehicle.
         """
-        self.prev_action = self.no_acc
-        return 0
+        return self.act(NO_ACC, None, None)
 
     # HELPER METHODS
 
     def report(self):
         """
-        Returns a DataFrame with information about the CAV's most recent trip.
+        Returns the CAV's most recent trip.
 
-        :return: A pandas DataFrame with information on the CAV's position, velocity, and acceleration.
+        :return: A Trajectory with views over the CAV's time, position, velocity, and acceleration arrays.
         """
         assert self.cache is not None, "Cannot print report as cache is empty."
 
-        data = np.column_stack((self.cache['t'], self.cache['x'], self.cache['v'], self.cache['a']))
-        dataframe = pd.DataFrame(data, columns=['time', 'position', 'velocity', 'acceleration'])
-        return dataframe
+        return Trajectory(self.cache['t'], self.cache['x'], self.cache['v'], self.cache['a'])
+
+
+def integrate(x, v, a, start, stop, tau, clamp=False):
+    """
+    Integrates the trajectory over time steps [start, stop) in one vectorized step given the accelerations
+    a[start:stop]. The running sums are accumulated in order and in float32, so the result is identical to updating
+    one time step at a time with x[i] = x[i - 1] + tau * v[i - 1] + (0.5 * a[i] * (tau ** 2)) and
+    v[i] = v[i - 1] + tau * a[i].
+
+    :param x: The position array of the trip (np.ndarray).
+    :param v: The velocity array of the trip (np.ndarray).
+    :param a: The acceleration array of the trip (np.ndarray).
+    :param start: The first time step to integrate (int).
+    :param stop: The time step after the last one to integrate (int).
+    :param tau: The timestep of the trip (int).
+    :param clamp: Whether a velocity that is not positive is set to 0 to represent a stop (bool).
+    """
+    while start < stop:
+        n = stop - start
+        acc = a[start:stop]
+
+        if clamp and v[start - 1] == 0 and acc.max() <= 0:
+            # A stopped vehicle that is not accelerating stays stopped.
+            v[start:stop] = 0
+            steps = np.empty(n + 1, dtype=x.dtype)
+            steps[0] = x[start - 1]
+            steps[1:] = 0.5 * acc * (tau ** 2)
+            np.add.accumulate(steps, out=steps)
+            x[start:stop] = steps[1:]
+            return
+
+        # v[i] = v[i - 1] + tau * a[i]
+        steps = np.empty(n + 1, dtype=v.dtype)
+        steps[0] = v[start - 1]
+        steps[1:] = tau * acc
+        np.add.accumulate(steps, out=steps)
+        if clamp and not steps[1:].min() > 0:
+            n = np.flatnonzero(~(steps[1:] > 0))[0] + 1
+            steps[n] = 0
+        v[start:start + n] = steps[1:n + 1]
+
+        advance(x, v, a, start, start + n, tau)
+        start += n
+
+
+def accelerate(v, start, stop, ramp):
+    """
+    Integrates the velocity alone over time steps [start, stop) at a constant acceleration, setting a velocity that is
+    not positive to 0 to represent a stop, so the velocity is identical to the one integrate with clamp gives and the
+    positions are left to advance. The acceleration is given as the change in velocity of each time step,
+    ramp[1:] = tau * acc in float32, with room for every time step; ramp[0] is overwritten.
+
+    :param v: The velocity array of the trip (np.ndarray).
+    :param start: The first time step to integrate (int).
+    :param stop: The time step after the last one to integrate (int).
+    :param ramp: The change in velocity of each time step, after a free entry (np.ndarray).
+    """
+    # v[i] = v[i - 1] + tau * a[i]
+    ramp[0] = v[start - 1]
+    np.add.accumulate(ramp[:stop - start + 1], out=v[start - 1:stop])
+    # A constant acceleration changes the velocity monotonically, so only the last one can tell of a stop.
+    if ramp[1] < 0 and not v[stop - 1] > 0:
+        v[start + np.flatnonzero(~(v[start:stop] > 0))[0]:stop] = 0
+
+
+def advance(x, v, a, start, stop, tau):
+    """
+    Integrates the position over time steps [start, stop) given the velocities up until time step stop - 1 and the
+    accelerations a[start:stop], in one accumulation whatever the accelerations. The arrays may also hold a trip per
+    row, the time steps being the last axis.
+
+    :param x: The position array of the trip (np.ndarray).
+    :param v: The velocity array of the trip (np.ndarray).
+    :param a: The acceleration array of the trip (np.ndarray).
+    :param start: The first time step to integrate (int).
+    :param stop: The time step after the last one to integrate (int).
+    :param tau: The timestep of the trip (int).
+    """
+    if start >= stop:
+        return
+    # x[i] = (x[i - 1] + tau * v[i - 1]) + (0.5 * a[i] * (tau ** 2)), interleaving both terms keeps the order of the
+    # additions.
+    steps = np.empty(x.shape[:-1] + (2 * (stop - start) + 1,), dtype=x.dtype)
+    steps[..., 0] = x[..., start - 1]
+    steps[..., 1::2] = tau * v[..., start - 1:stop - 1]
+    steps[..., 2::2] = 0.5 * a[..., start:stop] * (tau ** 2)
+    np.add.accumulate(steps, axis=-1, out=steps)
+    x[..., start:stop] = steps[..., 2::2]
+
+
+def integrate_while(x, v, a, start, acc, tau, keep, remaining, rate, clamp=False, integrate=integrate):
+    """
+    Integrates the trajectory from time step start with a constant acceleration for as long as keep holds for the
+    previous position and velocity, and returns the time step at which it no longer holds. The trajectory is integrated
+    in segments whose length starts from an estimate of the number of time steps (remaining / rate), so time steps past
+    the returned one may be written and are left to be overwritten.
+
+    :param x: The position array of the trip (np.ndarray).
+    :param v: The velocity array of the trip (np.ndarray).
+    :param a: The acceleration array of the trip (np.ndarray).
+    :param start: The first time step to integrate (int).
+    :param acc: The constant acceleration, in m/s^2 (np.float32).
+    :param tau: The timestep of the trip (int).
+    :param keep: A function of the previous positions and velocities that tells whether to take each time step.
+    :param remaining: The change in velocity or position left to cover (float).
+    :param rate: The change in velocity or position per time step (float).
+    :param clamp: Whether a velocity that is not positive is set to 0 to represent a stop (bool).
+    :param integrate: The function that integrates each segment, integrate or jit.integrate.
+    :return: The first time step that was not taken.
+    """
+    N = len(x)
+    length = int(min(float(remaining) / float(rate), N)) + 2 if rate > 0 else N
+    while True:
+        if not keep(x[start - 1], v[start - 1]):
+            return start
+        stop = min(start + max(length, 16), N)
+        a[start:stop] = acc
+        integrate(x, v, a, start, stop, tau, clamp=clamp)
+        taken = keep(x[start:stop], v[start:stop])
+        stopped = np.flatnonzero(~taken)
+        if stopped.size:
+            return start + int(stopped[0]) + 1
+        if stop == N:
+            raise IndexError("index %d is out of bounds for axis 0 with size %d" % (N, N))
+        start = stop
+        length *= 2
+
+
+def compile_policy():
+    """
+    Compiles the decision tree of the random trajectory phase into a table of rules indexed by
+    [previous action, v far from v_max, v near zero, v near v_max, first decision, tau >= 1].
+
+    :return: The rule of every combination of conditions (np.ndarray).
+    """
+    policy = np.full((NO_ACTION + 1, 2, 2, 2, 2, 2), NOTHING, dtype=np.int8)
+    for prev, far, near_zero, near_v_max, first, large_tau in np.ndindex(policy.shape):
+        # 1st condition: is v[i] "far away" from v_max ?
+        if far:
+            # 2nd condition: is this our first iteration of the random trajectory phase?
+            if first:
+                rule = 0
+            # 3rd condition: what was our previous action? Were we accelerating fast or slow?
+            elif prev == ACC_FAST:
+                # 5th condition: Is our time step large? (Is our sampling rate big)
+                rule = FORCED + NO_ACC if large_tau else 1
+            elif prev == ACC_SLOW:
+                rule = 2
+            elif prev == DEC_FAST:
+                # 4th condition: Is v near zero?
+                if near_zero:
+                    rule = FORCED + DEC_SLOW if large_tau else 3
+                else:
+                    rule = 0
+            elif prev == NO_ACC:
+                rule = 5
+            else:
+                rule = NOTHING
+        else:
+            if first:
+                rule = 6
+            elif prev == ACC_FAST:
+                # 5th condition: Is v near v_max?
+                if near_v_max:
+                    rule = 6
+                else:
+                    rule = 7 if large_tau else 8
+            elif prev == ACC_SLOW:
+                if near_v_max:
+                    rule = FORCED + DEC_SLOW
+                else:
+                    rule = 3 if large_tau else 0
+            elif prev == DEC_FAST:
+                rule = 7 if large_tau else FORCED + NO_ACC
+            elif prev == DEC_SLOW:
+                rule = 7
+            elif prev == NO_ACC:
+                rule = 6 if near_v_max else 0
+            else:
+                rule = NOTHING
+        policy[prev, far, near_zero, near_v_max, first, large_tau] = rule
+    return policy
+
+
+POLICY = compile_policy()
+# POLICY as nested lists, which a single decision looks up faster than an array.
+RULES = POLICY.tolist()